@@ -1,5 +1,5 @@
 import axios, { AxiosInstance } from 'axios';
-import {JWTTokens, SaveFileRequest, TranspileResponse} from '../types/index';
+import {File, FilePage, JWTTokens, SaveFileRequest, TranspileResponse, TranspileJobResponse, JobStatusResponse, JobState} from '../types/index';
 
 const api: AxiosInstance = axios.create({
   baseURL: import.meta.env.VITE_API_URL || 'http://localhost:8000',
@@ -70,8 +70,14 @@ export const createFile = async (fileData: Partial<File>): Promise<File> => {
   }
 };
 
-export const getFiles = async (): Promise<File[]> => {
-  const response = await api.get('/api/files/');
+// Pass the `next` URL of the previous page to continue the listing
+export const getFiles = async (next?: string | null): Promise<FilePage> => {
+  const response = await api.get<FilePage>(next || '/api/files/');
+  return response.data;
+};
+
+export const getFile = async (fileId: number): Promise<File> => {
+  const response = await api.get<File>(`/api/files/${fileId}/`);
   return response.data;
 };
 
@@ -86,7 +92,37 @@ export const deleteFile = async (fileId: number): Promise<void> => {
   await api.delete(`/api/files/${fileId}/`);
 };
 
-export const transpileCode = async (code: string): Promise<string> => {
-  const response = await api.post<TranspileResponse>('/transpiler/transpile/', { code });
-  return response.data.rust_code;
+export const transpileCode = async (
+  code: string,
+  onProgress?: (job: JobState) => void,
+  onSegment?: (segment: string, rustCode: string) => void
+): Promise<string> => {
+  const submitted = await api.post<TranspileJobResponse>('/transpiler/transpile/', { code });
+  const jobId = submitted.data.job_id;
+
+  // Long-poll the job until it finishes; each request waits server-side for the next event
+  let since = '0';
+  for (;;) {
+    const status = await api.get<JobStatusResponse>(`/transpiler/jobs/${jobId}/`, {
+      params: { since, wait: 25 }
+    });
+    since = status.data.last_event_id;
+    // Segments are published as soon as they are translated, before the merged result
+    for (const event of status.data.events) {
+      if (event.type === 'segment') {
+        onSegment?.(event.data.segment as string, event.data.rust_code as string);
+      }
+    }
+    const job = status.data.job;
+    onProgress?.(job);
+    if (job.status === 'failed') {
+      throw new Error(job.error || 'Transpilation failed');
+    }
+    if (job.status === 'done') {
+      break;
+    }
+  }
+
+  const result = await api.get<TranspileResponse>(`/transpiler/jobs/${jobId}/result/`);
+  return result.data.rust_code;
 };
\ No newline at end of file
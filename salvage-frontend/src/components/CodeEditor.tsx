@@ -29,7 +29,17 @@ const CodeEditor: React.FC<{
     if (!cCode.trim()) return;
     setIsTranspiling(true);
     try {
-      const result = await transpileCode(cCode);
+      // Show translated segments as they arrive; the merged result replaces them at the end
+      const partial: Record<string, string> = {};
+      const result = await transpileCode(cCode, undefined, (segment, code) => {
+        partial[segment] = code;
+        setRustCode(
+          Object.entries(partial)
+            .map(([name, rust]) => `// Segment: ${name}\n${rust}`)
+            .join('\n\n')
+        );
+        setActiveTab('rust');
+      });
       setRustCode(result);
       setIsTranspiled(true);
       setActiveTab('rust');
@@ -1,26 +1,40 @@
 import { useEffect, useState } from 'react';
-import { getFiles, deleteFile } from '../api';
-import { File } from '../types';
+import { getFiles, getFile, deleteFile } from '../api';
+import { File, FileSummary } from '../types';
 
 const FileDirectory: React.FC<{
   onFileSelect: (file: File) => void;
   refresh: number;
 }> = ({ onFileSelect, refresh }) => {
-  const [files, setFiles] = useState<File[]>([]);
+  const [files, setFiles] = useState<FileSummary[]>([]);
+  const [nextPage, setNextPage] = useState<string | null>(null);
   const [selectedId, setSelectedId] = useState<number | null>(null);
 
+  const loadFiles = async (next?: string | null) => {
+    try {
+      const page = await getFiles(next);
+      const loaded = page.results.filter(f => f.id > 0);
+      setFiles(current => (next ? [...current, ...loaded] : loaded));
+      setNextPage(page.next);
+    } catch (error) {
+      console.error('Error loading files:', error);
+    }
+  };
+
   useEffect(() => {
-    const loadFiles = async () => {
-      try {
-        const data = await getFiles();
-        setFiles(data.filter(f => f.id > 0));
-      } catch (error) {
-        console.error('Error loading files:', error);
-      }
-    };
     loadFiles();
   }, [refresh]);
 
+  // The listing carries no code, so the full file is fetched when it is opened
+  const handleSelect = async (fileId: number) => {
+    setSelectedId(fileId);
+    try {
+      onFileSelect(await getFile(fileId));
+    } catch (error) {
+      console.error('Error loading file:', error);
+    }
+  };
+
   const handleDelete = async (fileId: number) => {
     if (window.confirm('Are you sure you want to delete this file?')) {
       try {
@@ -36,7 +50,7 @@ const FileDirectory: React.FC<{
     <div className="space-y-2 h-full flex flex-col">
       <div className="flex justify-between items-center mb-4">
         <h2 className="text-lg font-semibold text-red-400">Workspace</h2>
-        <span className="text-sm text-gray-400">{files.length} files</span>
+        <span className="text-sm text-gray-400">{files.length}{nextPage ? '+' : ''} files</span>
       </div>
       <ul className="space-y-1 flex-1 overflow-y-auto">
         {files.map((file) => (
@@ -47,10 +61,7 @@ const FileDirectory: React.FC<{
                 ? 'bg-red-600/20 border border-red-500/30'
                 : 'hover:bg-gray-700/30 border border-transparent'}
               cursor-pointer`}
-            onClick={() => {
-              setSelectedId(file.id);
-              onFileSelect(file);
-            }}
+            onClick={() => handleSelect(file.id)}
           >
             <div className="flex items-center gap-3 truncate">
               <div className="w-5 h-5 bg-red-600/20 rounded-sm flex items-center justify-center">
@@ -74,6 +85,14 @@ const FileDirectory: React.FC<{
           </li>
         ))}
       </ul>
+      {nextPage && (
+        <button
+          onClick={() => loadFiles(nextPage)}
+          className="w-full p-2 text-sm text-gray-400 hover:text-red-300 hover:bg-gray-700/30 rounded-md transition-colors"
+        >
+          Load more
+        </button>
+      )}
     </div>
   );
 };
@@ -7,6 +7,21 @@ export interface File {
   user?: number;
 }
 
+// Listing entry: sizes are in bytes, the code itself is fetched per file
+export interface FileSummary {
+  id: number;
+  name: string;
+  created_at: string;
+  c_code_size: number;
+  rust_code_size: number;
+}
+
+export interface FilePage {
+  next: string | null;
+  previous: string | null;
+  results: FileSummary[];
+}
+
 export interface SaveFileRequest {
   id?: number;
   name: string;
@@ -23,6 +38,32 @@ export interface TranspileResponse {
   rust_code: string;
 }
 
+export interface TranspileJobResponse {
+  job_id: string;
+  task_id: string;
+}
+
+export interface JobState {
+  job_id: string;
+  status: 'queued' | 'running' | 'done' | 'failed';
+  stage: string;
+  done?: string;
+  total?: string;
+  error?: string;
+}
+
+export interface JobEvent {
+  id: string;
+  type: string;
+  data: Record<string, unknown>;
+}
+
+export interface JobStatusResponse {
+  job: JobState;
+  events: JobEvent[];
+  last_event_id: string;
+}
+
 export interface JWTTokens {
   access: string;
   refresh: string;
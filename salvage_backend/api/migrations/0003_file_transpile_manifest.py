@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_remove_file_content_remove_file_type_file_c_code_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='transpile_manifest',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_translationtask_translationresult_analysis_segmenttranslation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['user', 'created_at'], name='api_file_user_created_idx'),
+        ),
+    ]
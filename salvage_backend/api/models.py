@@ -12,8 +12,16 @@ class File(models.Model):
     name = models.CharField(max_length=255)
     c_code = models.TextField()
     rust_code = models.TextField()
+    # Per-segment fingerprints and Rust output of the last run, used for incremental re-runs
+    transpile_manifest = models.JSONField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Serves the per-user listing, newest first
+            models.Index(fields=['user', 'created_at'], name='api_file_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} - {self.user.username}"
     
@@ -49,3 +57,24 @@ class Analysis(models.Model):
 
     def __str__(self):
         return f"Analysis for Task {self.task.id}"
+
+
+class SegmentTranslation(models.Model):
+    """Rust translation of one C segment, shared by every user's files and jobs."""
+    # sha256 of the normalized segment and its prompt context (see translation_digest)
+    content_hash = models.CharField(max_length=64)
+    model_name = models.CharField(max_length=100)
+    prompt_version = models.CharField(max_length=32)
+    rust_code = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['content_hash', 'model_name', 'prompt_version'],
+                name='unique_segment_translation',
+            ),
+        ]
+
+    def __str__(self):
+        return f"SegmentTranslation {self.content_hash[:12]} ({self.model_name})"
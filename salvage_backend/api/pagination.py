@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class FileCursorPagination(CursorPagination):
+    """
+    Newest files first. A cursor seeks on (user, created_at) through the index instead of
+    counting and skipping rows, so deep pages cost the same as the first one.
+    """
+    ordering = '-created_at'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
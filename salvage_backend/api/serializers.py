@@ -18,10 +18,20 @@ class UserSerializer(serializers.ModelSerializer):
         )
         return user
 
+class FileSummarySerializer(serializers.ModelSerializer):
+    """File metadata for listings; the code bodies are fetched per file."""
+    c_code_size = serializers.IntegerField(read_only=True)
+    rust_code_size = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = File
+        fields = ('id', 'name', 'created_at', 'c_code_size', 'rust_code_size')
+
 class FileSerializer(serializers.ModelSerializer):
     class Meta:
         model = File
-        fields = '__all__'
+        # The manifest is the worker's record of the last run; clients neither see nor set it
+        exclude = ('transpile_manifest',)
         read_only_fields = ('user',)
 
     def create(self, validated_data):
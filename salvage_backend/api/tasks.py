@@ -1,33 +1,98 @@
-from celery import shared_task, chord
-import networkx as nx
+import os
+import json
+from celery import shared_task
+from celery.signals import worker_process_init, worker_process_shutdown, task_failure, task_prerun, task_postrun
 import logging
-from .models import TranslationTask, TranslationResult, Analysis
+from .models import File, TranslationTask, TranslationResult, Analysis
 
 logger = logging.getLogger(__name__)
 
+# Each prefork child builds its own Transpiler once; gRPC channels do not survive a fork.
+@worker_process_init.connect
+def init_worker_transpiler(**kwargs):
+    from transpiler.services.translator.translator import get_transpiler, reset_transpiler
+    from transpiler.services.translator.engine import reset_engine_runner
+    from transpiler.services import telemetry
+    reset_engine_runner()
+    reset_transpiler()
+    telemetry.setup_tracing("salvage-worker")
+    try:
+        get_transpiler()
+    except Exception as e:
+        # Tasks retry the initialization lazily on first use.
+        logger.warning(f"Transpiler initialization at worker start failed: {str(e)}")
+
+@worker_process_shutdown.connect
+def release_worker_metrics(pid=None, **kwargs):
+    from transpiler.services import telemetry
+    telemetry.mark_process_dead(pid or os.getpid())
+
+# A failure anywhere in a job's chain ends the job; every pipeline task receives job_id as a kwarg.
+@task_failure.connect
+def mark_job_failed(sender=None, exception=None, kwargs=None, **extra):
+    job_id = (kwargs or {}).get("job_id")
+    if not job_id:
+        return
+    from transpiler.services import jobs
+    from transpiler.services.workspace import JobWorkspace
+    try:
+        jobs.fail_job(job_id, f"{sender.name.rsplit('.', 1)[-1]}: {exception}")
+    except Exception as e:
+        logger.error(f"Could not mark job {job_id} as failed: {str(e)}")
+    JobWorkspace(job_id).cleanup()
+
+# Every task gets a span and a duration histogram entry; spans of one job share a trace.
+@task_prerun.connect
+def start_task_span(task_id=None, task=None, kwargs=None, **extra):
+    from transpiler.services import telemetry
+    telemetry.start_task_span(task_id, task.name.rsplit('.', 1)[-1], (kwargs or {}).get("job_id"))
+
+@task_postrun.connect
+def end_task_span(task_id=None, task=None, kwargs=None, state=None, retval=None, **extra):
+    from transpiler.services import telemetry
+    exception = retval if isinstance(retval, BaseException) else None
+    telemetry.end_task_span(task_id, task.name.rsplit('.', 1)[-1], (kwargs or {}).get("job_id"), state, exception)
+
 # Task for performing code translation from C to Rust
 @shared_task
 def translation_task(task_id):
     """
-    Perform code translation from C to Rust.
+    Translates the C code of a TranslationTask's file by running the pipeline stages in
+    this worker, and stores the merged Rust code as the task's TranslationResult.
+    Progress is published under the job id recorded in the task's logs.
     """
+    from transpiler.services import jobs
+    from transpiler.services.workspace import JobWorkspace
+    task = TranslationTask.objects.select_related('file').get(id=task_id)
+    workspace = JobWorkspace.create()
+    job_id = workspace.job_id
+    task.status = 'in_progress'
+    task.logs = f"Job {job_id}"
+    task.save(update_fields=['status', 'logs', 'updated_at'])
     try:
-        task = TranslationTask.objects.get(id=task_id)
-        c_code = task.file.c_code  
-        # Replace with actual translation logic when ready:
-        rust_code = "// Rust code"
-        logs = "Translation logs..."
-
-        TranslationResult.objects.update_or_create(
-            translation_task=task,
-            defaults={'output': rust_code, 'created_at': task.created_at}
-        )
+        jobs.create_job(job_id, task.file.user_id, task.file_id)
+        result = preprocess_task(task.file.c_code, job_id=job_id)
+        result = extract_and_build_task(result, job_id=job_id)
+        result = segmentation_task(result, job_id=job_id)
+        result = transpile_segments_task(result, job_id=job_id, file_id=task.file_id)
+        postprocess_task(result, job_id=job_id, file_id=task.file_id)
+
+        rust_code = File.objects.values_list('rust_code', flat=True).get(id=task.file_id)
+        TranslationResult.objects.update_or_create(task=task, defaults={'output': rust_code})
         task.status = 'completed'
-        task.save()
+        task.save(update_fields=['status', 'updated_at'])
         return f"Translation {task_id} completed."
     except Exception as e:
+        logger.error(f"Translation {task_id} failed: {str(e)}")
+        # The stages ran in-process, so task_failure never fires for them
+        try:
+            jobs.fail_job(job_id, str(e))
+        except Exception as redis_error:
+            logger.error(f"Could not mark job {job_id} as failed: {str(redis_error)}")
+        workspace.cleanup()
         task.status = 'failed'
-        task.save()
+        task.logs = f"Job {job_id}: {str(e)}"
+        task.save(update_fields=['status', 'logs', 'updated_at'])
         return f"Translation {task_id} failed: {str(e)}"
 
 # Task for analyzing performance comparing C and Rust binaries
@@ -45,82 +110,161 @@ def analysis_task(task_id, c_binary_path, rust_binary_path):
             "rust_memory_usage": 45.0,
             "result_summary": "Rust is slightly faster"
         }
-        Analysis.objects.update_or_create(
-            translation_task=task,
-            defaults={
-                'c_execution_time': results["c_execution_time"],
-                'rust_execution_time': results["rust_execution_time"],
-                'c_memory_usage': results["c_memory_usage"],
-                'rust_memory_usage': results["rust_memory_usage"],
-                'result_summary': results["result_summary"],
-            }
-        )
+        Analysis.objects.update_or_create(task=task, defaults={'insights': json.dumps(results)})
         return f"Analysis for {task_id} completed."
     except Exception as e:
         return f"Analysis for {task_id} failed: {str(e)}"
 
 # Task for preprocessing the C file
 @shared_task
-def preprocess_task(input_code):
-    from transpiler.services.preprocessor.preprocess import preprocess_c_file 
-    preprocessed_path = preprocess_c_file(input_code)
-    return preprocessed_path
+def preprocess_task(input_code, job_id):
+    """
+    Preprocesses the C code, given either as a string or as a reference to a source
+    uploaded into the job workspace (see transpiler.services.uploads.assemble_source).
+    Returns a payload reference to the preprocessed code (see JobWorkspace.put).
+    """
+    from transpiler.services.preprocessor.preprocess import preprocess_c_code, preprocess_c_upload
+    from transpiler.services.workspace import JobWorkspace
+    from transpiler.services import jobs
+    jobs.update_job(job_id, "preprocess")
+    if isinstance(input_code, dict):
+        preprocessed_code = preprocess_c_upload(input_code["upload"], input_code["sha256"])
+    else:
+        preprocessed_code = preprocess_c_code(input_code)
+    return JobWorkspace(job_id).put("preprocessed.c", preprocessed_code)
 
 # Task for extracting symbols and building a dependency graph
 @shared_task
-def extract_and_build_task(preprocessed_file):
+def extract_and_build_task(preprocessed, job_id):
     from transpiler.services.preprocessor.segmentation import extract_symbols, build_dependency_graph
-    symbols = extract_symbols(preprocessed_file)
-    graph = build_dependency_graph(symbols)
-    graph_data = nx.readwrite.json_graph.node_link_data(graph)
-    # Return a dict containing both the preprocessed file path and the symbols
-    return {"preprocessed_file": preprocessed_file, "symbols": symbols, "graph_data": graph_data}
+    from transpiler.services.workspace import JobWorkspace, load_blob
+    from transpiler.services import jobs
+    jobs.update_job(job_id, "extract")
+    workspace = JobWorkspace(job_id)
+    symbols = extract_symbols("preprocessed.c", source=load_blob(preprocessed))
+    graph_data = build_dependency_graph(symbols).to_dict()
+    # Return references to the preprocessed code, the symbols and the graph
+    return {
+        "preprocessed": preprocessed,
+        "symbols": workspace.put_data("symbols.msgpack", symbols),
+        "graph_data": workspace.put_data("graph.msgpack", graph_data),
+    }
 
 # Updated segmentation task: accepts a single dictionary argument.
 @shared_task
-def segmentation_task(data):
+def segmentation_task(data, job_id):
     """
-    Segments the preprocessed file using the extracted symbols.
-    Expects a dict with keys 'preprocessed_file' and 'symbols'.
+    Segments the preprocessed code using the extracted symbols.
+    Expects a dict with references under 'preprocessed', 'symbols' and 'graph_data'.
+    Returns segment references keyed by symbol name together with a metadata reference.
     """
-    from transpiler.services.preprocessor.segmentation import segment_code
-    from transpiler.services.preprocessor.metadata import generate_metadata
-    preprocessed_file = data["preprocessed_file"]
-    symbols = data["symbols"]
-    segments = segment_code(preprocessed_file, symbols)
-    metadata_file = generate_metadata(symbols, segments)
-    return {"segments": segments, "metadata": metadata_file}
-
-# Task for transpiling each segment individually
-@shared_task
-def transpile_segment(segment_file):
-    from transpiler.services.translator.translator import Transpiler
-    with open(segment_file, "r") as f:
-        c_code = f.read()
-    transpiler = Transpiler()
-    rust_code = transpiler.transpile(c_code)
-    rust_file = segment_file.replace(".c", ".rs")
-    with open(rust_file, "w") as f:
-        f.write(rust_code)
-    return rust_file
+    from transpiler.services.preprocessor.segmentation import split_segments
+    from transpiler.services.preprocessor.metadata import build_metadata
+    from transpiler.services.preprocessor.graph import DependencyGraph
+    from transpiler.services.workspace import JobWorkspace, load_blob, load_data
+    from transpiler.services import jobs
+    jobs.update_job(job_id, "segment")
+    workspace = JobWorkspace(job_id)
+    symbols = load_data(data["symbols"])
+    segments = split_segments(load_blob(data["preprocessed"]), symbols)
+    metadata = build_metadata(symbols, segments, graph=DependencyGraph.from_dict(load_data(data["graph_data"])))
+    segment_refs = workspace.put_many("segments.c.pack", segments)
+    return {"segments": segment_refs, "metadata": workspace.put_data("metadata.msgpack", metadata)}
 
-# Task for postprocessing: cleaning and merging all Rust segments into one final file
+# Task for transpiling every segment of a file on the worker's async translation engine
 @shared_task
-def postprocess_task(segment_files):
-    from transpiler.services.postprocessor.postprocess import clean_and_merge_segments
-    final_rust_code = clean_and_merge_segments(segment_dir='/tmp/output/segments/', metadata_path='/tmp/output/metadata.json', output_path='/tmp/output/final_output.rs')
-    output_file = "/tmp/output/final_transpiled.rs"
-    with open(output_file, "w") as f:
-        f.write(final_rust_code)
-    return output_file
+def transpile_segments_task(segmentation_result, job_id, file_id=None):
+    """
+    Translates all segments through the shared TranslationEngine, one dependency wave
+    at a time, feeding each caller the Rust signatures of its already translated callees.
+    When `file_id` is given, segments unchanged since that File's previous run
+    (including their dependencies) reuse the stored Rust instead of being retranslated.
+    Segments any earlier job translated are served from the SegmentTranslation table.
+    """
+    from transpiler.services.translator.scheduler import translate_in_waves
+    from transpiler.services.translator.incremental import compute_fingerprints, reusable_translations, build_manifest
+    from transpiler.services.translator.store import TranslationStore
+    from transpiler.services.workspace import JobWorkspace, load_blobs, load_data
+    from transpiler.services import jobs
+    workspace = JobWorkspace(job_id)
+    metadata = load_data(segmentation_result["metadata"])
+    segment_refs = segmentation_result["segments"]
+
+    c_codes = {}
+    dependencies = {}
+    loaded = load_blobs(segment_refs)
+    for segment in metadata["segments"]:
+        name = segment["segment_id"]
+        dependencies[name] = segment["dependencies"]
+        c_codes[name] = loaded[name]
 
+    waves = metadata.get("waves", [])
+    fingerprints = compute_fingerprints(c_codes, dependencies, waves)
+    file = File.objects.filter(id=file_id).first() if file_id else None
+    reuse = reusable_translations(fingerprints, file.transpile_manifest) if file else {}
+    if reuse:
+        logger.info(f"Reusing {len(reuse)}/{len(c_codes)} segments from the previous run of file {file_id}")
+
+    jobs.update_job(job_id, "translate", done=len(reuse), total=len(c_codes))
+    store = TranslationStore()
+    rust_codes = translate_in_waves(
+        c_codes, dependencies, waves, reuse=reuse,
+        on_progress=lambda done, total: jobs.update_job(job_id, "translate", done=done, total=total),
+        on_segment=lambda name, rust_code: jobs.publish_segment(job_id, name, rust_code),
+        units=metadata.get("units"),
+        store=store,
+    )
+    # New translations are persisted once per job, in a single bulk insert
+    stored = store.flush()
+    if stored:
+        logger.info(f"Stored {stored} new segment translations for job {job_id}")
+    if file:
+        file.transpile_manifest = build_manifest(fingerprints, rust_codes)
+        file.save(update_fields=["transpile_manifest"])
+
+    rust_refs = workspace.put_many("segments.rs.pack", rust_codes)
+    return {"rust": rust_refs, "metadata": segmentation_result["metadata"]}
+
+# Task for postprocessing: cleaning and merging all Rust segments into one final file
 @shared_task
-def create_transpile_chord(segmentation_result):
+def postprocess_task(translation_result, job_id, file_id=None, source=None):
     """
-    Given segmentation result (a dict with a 'segments' key mapping symbol names to file paths),
-    create a chord of transpile_segment tasks and trigger postprocess_task as callback.
+    Merges the translated segments in dependency order straight into the job's output
+    file, with a byte-offset index of the segments next to it, and completes the job.
+    The output and index are stored with the job (see jobs.complete_job), after which
+    the job's workspace is no longer needed and is removed.
+    With `file_id`, the File's Rust code is replaced together with its C code, taken from
+    `source` (the submitted C code or upload reference), so the two never drift apart.
     """
-    segments = segmentation_result.get("segments", {})
-    from api.tasks import transpile_segment, postprocess_task
-    transpile_tasks = [transpile_segment.s(segment_file) for segment_file in segments.values()]
-    return chord(transpile_tasks)(postprocess_task.s())
+    from transpiler.services.postprocessor.postprocess import write_rust_output
+    from transpiler.services.workspace import JobWorkspace, load_blobs, load_data
+    from transpiler.services import jobs
+    jobs.update_job(job_id, "postprocess")
+    workspace = JobWorkspace(job_id)
+    os.makedirs(workspace.path, exist_ok=True)
+    rust_codes = load_blobs(translation_result["rust"])
+    metadata = load_data(translation_result["metadata"])
+    index = write_rust_output(rust_codes, metadata["sorted_segments"], workspace.output_path)
+    if file_id:
+        fields = {}
+        with open(workspace.output_path, "r", encoding="utf-8") as f:
+            fields["rust_code"] = f.read()
+        if isinstance(source, dict):
+            with open(source["upload"], "r", encoding="utf-8", errors="replace") as f:
+                fields["c_code"] = f.read()
+        elif source is not None:
+            fields["c_code"] = source
+        File.objects.filter(id=file_id).update(**fields)
+    jobs.complete_job(job_id, workspace.output_path, index)
+    workspace.cleanup()
+    return {"job_id": job_id, "status": "done"}
+
+# Janitor task: sweep the workspaces of jobs that never completed or failed
+@shared_task
+def purge_stale_workspaces_task():
+    from transpiler.services.workspace import purge_stale_workspaces
+    from transpiler.services import jobs
+    # Long-running jobs keep their workspace even when it has not been written to lately
+    removed = purge_stale_workspaces(active=jobs.active_job_ids)
+    logger.info(f"Purged {removed} stale job workspaces")
+    return removed
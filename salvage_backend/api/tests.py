@@ -1,3 +1,221 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils import timezone
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .models import File, User
+
+
+class FileListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="alice", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        now = timezone.now()
+        self.files = []
+        for i in range(5):
+            file = File.objects.create(user=self.user, name=f"f{i}.c", c_code="é" * i, rust_code="x" * (10 * i))
+            File.objects.filter(id=file.id).update(created_at=now - timedelta(minutes=5 - i))
+            self.files.append(file)
+        other = User.objects.create_user(username="bob", password="pw")
+        File.objects.create(user=other, name="theirs.c", c_code="int x;", rust_code="")
+
+    def test_cursor_pages_cover_every_file_newest_first(self):
+        ids = []
+        url = '/api/files/?page_size=2'
+        pages = 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data["results"]), 2)
+            ids += [entry["id"] for entry in response.data["results"]]
+            url = response.data["next"]
+            pages += 1
+        self.assertEqual(pages, 3)
+        self.assertEqual(ids, [file.id for file in reversed(self.files)])
+
+    def test_summaries_carry_sizes_instead_of_code(self):
+        entry = self.client.get('/api/files/').data["results"][1]
+        self.assertEqual(entry["name"], "f3.c")
+        self.assertNotIn("c_code", entry)
+        # Sizes are in bytes: "é" takes two
+        self.assertEqual(entry["c_code_size"], 6)
+        self.assertEqual(entry["rust_code_size"], 30)
+
+
+class FileCodeViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="alice", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.file = File.objects.create(user=self.user, name="a.c", c_code="héllo world", rust_code="")
+        self.url = f'/api/files/{self.file.id}/code/'
+
+    def test_ranges_are_in_characters(self):
+        response = self.client.get(self.url, {"offset": 1, "length": 4})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["content"], "éllo")
+        self.assertEqual(response.data["total"], 11)
+        self.assertEqual(response.data["next_offset"], 5)
+
+    def test_last_range_has_no_next_offset(self):
+        response = self.client.get(self.url, {"offset": 6, "length": 100})
+        self.assertEqual(response.data["content"], "world")
+        self.assertIsNone(response.data["next_offset"])
+
+        past_end = self.client.get(self.url, {"offset": 50})
+        self.assertEqual(past_end.data["content"], "")
+        self.assertIsNone(past_end.data["next_offset"])
+
+    def test_empty_field(self):
+        response = self.client.get(self.url, {"field": "rust_code"})
+        self.assertEqual((response.data["content"], response.data["total"]), ("", 0))
+
+    def test_invalid_parameters(self):
+        for params in ({"field": "name"}, {"offset": "x"}, {"offset": -1}, {"length": 0}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400, params)
+
+    def test_files_of_other_users_are_not_found(self):
+        other = User.objects.create_user(username="bob", password="pw")
+        theirs = File.objects.create(user=other, name="b.c", c_code="int b;", rust_code="")
+        self.assertEqual(self.client.get(f'/api/files/{theirs.id}/code/').status_code, 404)
+
+
+class FileDetailViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="alice", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.manifest = {"model": "m", "prompt_version": "p", "segments": {}}
+        self.file = File.objects.create(user=self.user, name="a.c", c_code="int a;", rust_code="",
+                                        transpile_manifest=self.manifest)
+        self.url = f'/api/files/{self.file.id}/'
+
+    def test_manifest_is_not_exposed(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["name"], "a.c")
+        self.assertNotIn("transpile_manifest", response.data)
+
+    def test_manifest_cannot_be_written(self):
+        forged = {"model": "m", "prompt_version": "p", "segments": {"a": {"fingerprint": "x", "rust": "fn a() {}"}}}
+        response = self.client.patch(self.url, {"name": "b.c", "transpile_manifest": forged}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.file.refresh_from_db()
+        self.assertEqual(self.file.name, "b.c")
+        self.assertEqual(self.file.transpile_manifest, self.manifest)
+
+
+class TranspileAPIViewTests(TestCase):
+    urls = ('/api/transpile/', '/transpiler/transpile/')
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="alice", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.file = File.objects.create(user=self.user, name="a.c", c_code="int a;", rust_code="")
+        # Jobs are not started; both endpoints submit through the same mock
+        self.submit_job = mock.Mock(return_value=("job-1", mock.Mock(id="task-1")))
+        for module in ('api.views', 'transpiler.urls'):
+            patcher = mock.patch(f'{module}.submit_transpilation_job', self.submit_job)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_jobs_are_submitted(self):
+        for url in self.urls:
+            response = self.client.post(url, {"code": "int main(void) { return 0; }", "file_id": str(self.file.id)},
+                                        format='json')
+            self.assertEqual(response.status_code, 202, url)
+            self.assertEqual(response.data["job_id"], "job-1")
+            self.assertEqual(self.submit_job.call_args.kwargs["file_id"], self.file.id)
+
+    def test_invalid_input_is_rejected(self):
+        bodies = (
+            {},
+            {"code": ""},
+            {"code": ["int a;"]},
+            {"code": "int a;", "file_id": "abc"},
+            {"code": "int a;", "file_id": 1.5},
+        )
+        for url in self.urls:
+            for body in bodies:
+                self.assertEqual(self.client.post(url, body, format='json').status_code, 400, (url, body))
+        self.submit_job.assert_not_called()
+
+    def test_files_of_other_users_are_not_found(self):
+        other = User.objects.create_user(username="bob", password="pw")
+        theirs = File.objects.create(user=other, name="b.c", c_code="int b;", rust_code="")
+        for url in self.urls:
+            response = self.client.post(url, {"code": "int a;", "file_id": theirs.id}, format='json')
+            self.assertEqual(response.status_code, 404, url)
+        self.submit_job.assert_not_called()
+
+    def test_task_results_are_not_served(self):
+        self.assertEqual(self.client.get('/transpiler/task-status/task-1/').status_code, 404)
+
+
+class TranspileUploadViewTests(TestCase):
+    url = '/api/transpile/upload/'
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="salvage-test-")
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        settings_override = override_settings(TRANSPILER_WORKSPACE_ROOT=self.root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username="alice", password="pw"))
+        # Jobs are not started; the view's answer only depends on what submission returns
+        patcher = mock.patch('api.views.submit_transpilation_job', side_effect=self.submit)
+        self.submit_job = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def submit(source, user_id, file_id=None, workspace=None):
+        return workspace.job_id, mock.Mock(id="task-1")
+
+    def test_multipart_source_is_accepted(self):
+        upload = SimpleUploadedFile("a.c", b"int main(void) { return 0; }\n")
+        response = self.client.post(self.url, {"file": upload}, format='multipart')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["files"], ["a.c"])
+        self.assertEqual(response.data["size"], 29)
+        source = self.submit_job.call_args.args[0]
+        self.assertEqual(source["sha256"], response.data["sha256"])
+
+    def test_raw_archive_body_is_accepted(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as z:
+            z.writestr("lib.h", "int twice(int);\n")
+            z.writestr("lib.c", "int twice(int x) { return 2 * x; }\n")
+        response = self.client.generic(
+            'POST', self.url + '?filename=lib.zip', archive.getvalue(), content_type='application/zip'
+        )
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["files"], ["lib.h", "lib.c"])
+
+    def test_missing_file_is_rejected(self):
+        response = self.client.post(self.url, {}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.submit_job.assert_not_called()
+
+    def test_corrupt_archive_is_rejected(self):
+        upload = SimpleUploadedFile("broken.zip", b"not a zip file")
+        response = self.client.post(self.url, {"file": upload}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.submit_job.assert_not_called()
+
+    @override_settings(UPLOAD_MAX_BYTES=16)
+    def test_oversized_body_is_rejected(self):
+        response = self.client.generic('POST', self.url + '?filename=big.c', b"x" * 64, content_type='text/x-c')
+        self.assertEqual(response.status_code, 413)
+        self.submit_job.assert_not_called()
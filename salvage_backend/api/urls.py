@@ -2,11 +2,17 @@ from django.urls import path
 from .views import (
     SignupView,
     FileListCreateView,
-    FileDetailView
+    FileDetailView,
+    FileCodeView,
+    TranspileAPIView,
+    TranspileUploadView,
 )
 
 urlpatterns = [
     path('signup/', SignupView.as_view(), name='signup'),
     path('files/', FileListCreateView.as_view(), name='file-list'),
     path('files/<int:pk>/', FileDetailView.as_view(), name='file-detail'),
+    path('files/<int:pk>/code/', FileCodeView.as_view(), name='file-code'),
+    path('transpile/', TranspileAPIView.as_view(), name='transpile-job'),
+    path('transpile/upload/', TranspileUploadView.as_view(), name='transpile-upload'),
 ]
\ No newline at end of file
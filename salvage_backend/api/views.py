@@ -1,19 +1,43 @@
-import os
 import logging
-from django.core.files.base import ContentFile
-from django.core.files.storage import default_storage
+import tarfile
+import zipfile
+from django.db.models import Func, IntegerField
+from django.db.models.functions import Coalesce, Length, Substr
+from django.urls import reverse
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from django.contrib.auth import get_user_model
 from .models import File
-from .serializers import UserSerializer, FileSerializer
-from services.transpiler_workflow import run_transpilation_workflow
+from .serializers import UserSerializer, FileSerializer, FileSummarySerializer
+from .pagination import FileCursorPagination
+from services.transpiler_workflow import submit_transpilation_job
+from transpiler.services.workspace import JobWorkspace
+from transpiler.services.uploads import (
+    UploadError,
+    UploadTooLarge,
+    WorkspaceUploadHandler,
+    assemble_source,
+    receive_stream,
+)
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
+CODE_FIELDS = ('c_code', 'rust_code')
+# Upper bound on the characters returned by one FileCodeView request.
+MAX_CODE_CHUNK = 1024 * 1024
+
+
+class OctetLength(Func):
+    """Size of a text column in bytes; Postgres reads it from the TOAST header without loading the value."""
+    function = 'OCTET_LENGTH'
+    output_field = IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='LENGTH(CAST(%(expressions)s AS BLOB))', **extra_context)
+
 class SignupView(APIView):
     def post(self, request):
         serializer = UserSerializer(data=request.data)
@@ -33,12 +57,30 @@ class SignupView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class FileListCreateView(generics.ListCreateAPIView):
+    """
+    Lists the user's files newest first, one cursor page at a time, with the sizes of
+    their code instead of the code itself. The bodies are served by FileDetailView
+    and FileCodeView.
+    """
     serializer_class = FileSerializer
     authentication_classes = [JWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FileCursorPagination
+
+    def get_serializer_class(self):
+        if self.request.method == 'GET':
+            return FileSummarySerializer
+        return FileSerializer
 
     def get_queryset(self):
-        return File.objects.filter(user=self.request.user)
+        return (
+            File.objects.filter(user=self.request.user)
+            .only('id', 'name', 'created_at')
+            .annotate(
+                c_code_size=Coalesce(OctetLength('c_code'), 0),
+                rust_code_size=Coalesce(OctetLength('rust_code'), 0),
+            )
+        )
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -54,45 +96,160 @@ class FileDetailView(generics.RetrieveUpdateDestroyAPIView):
     def perform_destroy(self, instance):
         instance.delete()
 
+class FileCodeView(APIView):
+    """
+    Returns a character range of one code field of a file, cut out by the database:
+    GET ?field=c_code|rust_code&offset=<chars>&length=<chars>.
+    `next_offset` is null once the end of the field is reached.
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        field = request.query_params.get('field', 'c_code')
+        if field not in CODE_FIELDS:
+            return Response(
+                {"error": f"field must be one of: {', '.join(CODE_FIELDS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            offset = int(request.query_params.get('offset', 0))
+            length = int(request.query_params.get('length', MAX_CODE_CHUNK))
+        except ValueError:
+            return Response(
+                {"error": "offset and length must be integers"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if offset < 0 or length <= 0:
+            return Response(
+                {"error": "offset must be >= 0 and length > 0"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        length = min(length, MAX_CODE_CHUNK)
+
+        row = (
+            File.objects.filter(id=pk, user=request.user)
+            .annotate(total=Length(field), content=Substr(field, offset + 1, length))
+            .values('total', 'content')
+            .first()
+        )
+        if row is None:
+            return Response({"error": "File not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        content = row['content'] or ''
+        total = row['total'] or 0
+        end = offset + len(content)
+        return Response({
+            "id": pk,
+            "field": field,
+            "offset": offset,
+            "length": len(content),
+            "total": total,
+            "next_offset": end if end < total else None,
+            "content": content,
+        })
+
 class TranspileAPIView(APIView):
+    """
+    Submits a transpilation job and returns its id without waiting for it.
+    Progress and results are served by the job endpoints in transpiler/urls.py.
+    """
     authentication_classes = [JWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request):
         input_code = request.data.get('code')
-        if not input_code:
+        if not input_code or not isinstance(input_code, str):
             return Response(
                 {"error": "No input code provided"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Save the input code to a temporary file
-        temp_file_path = default_storage.save(
-            f'temp/{request.FILES.get("input_file", "input")}.txt',  # You may adjust the file naming as needed
-            ContentFile(input_code)
-        )
-        absolute_file_path = os.path.join(default_storage.location, temp_file_path)
+        file_id, error = owned_file_id(request, request.data.get('file_id'))
+        if error:
+            return error
 
         try:
-            # Initiate the transpilation workflow
-            result = run_transpilation_workflow(absolute_file_path)
-            # Wait for the Celery workflow to complete (adjust the timeout as needed)
-            final_output_path = result.get(timeout=300)  # e.g., wait up to 5 minutes
-            if os.path.exists(final_output_path):
-                with open(final_output_path, "r", encoding="utf-8") as f:
-                    final_rust_code = f.read()
-                return Response(
-                    {"rust_code": final_rust_code},
-                    status=status.HTTP_200_OK
-                )
+            # A saved file is re-run incrementally
+            job_id, result = submit_transpilation_job(input_code, request.user.id, file_id=file_id)
+        except Exception as e:
+            logger.error(f"Transpilation error: {str(e)}")
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        return Response(_job_links(job_id, result), status=status.HTTP_202_ACCEPTED)
+
+class TranspileUploadView(APIView):
+    """
+    Streams large C sources into a new job's workspace and submits the job. Accepts
+    multipart/form-data with one or more file parts (.c, .h or archives such as .zip and
+    .tar.gz), or a single file as the raw request body, chunked or not, named by
+    ?filename=. Files are hashed as they are written and never held in memory whole.
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        file_id, error = owned_file_id(request, request.query_params.get('file_id'))
+        if error:
+            return error
+
+        workspace = JobWorkspace.create()
+        # Read the underlying Django request directly so nothing parses the body first
+        http_request = request._request
+        try:
+            if http_request.content_type == 'multipart/form-data':
+                handler = WorkspaceUploadHandler(workspace, http_request)
+                http_request.upload_handlers = [handler]
+                uploads = [upload for key in http_request.FILES for upload in http_request.FILES.getlist(key)]
+                if handler.error:
+                    raise handler.error
             else:
-                return Response(
-                    {"error": "Final output file not found."},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
+                uploads = [receive_stream(workspace, http_request, request.query_params.get('filename', 'upload.c'))]
+            if not uploads or not any(upload.size for upload in uploads):
+                raise UploadError("No file uploaded")
+            source = assemble_source(workspace, uploads)
+        except UploadTooLarge as e:
+            workspace.cleanup()
+            return Response({"error": str(e)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        except (UploadError, zipfile.BadZipFile, tarfile.TarError) as e:
+            workspace.cleanup()
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            job_id, result = submit_transpilation_job(source, request.user.id, file_id=file_id, workspace=workspace)
         except Exception as e:
             logger.error(f"Transpilation error: {str(e)}")
+            workspace.cleanup()
             return Response(
                 {"error": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+            )
+        response = _job_links(job_id, result)
+        response.update({"sha256": source["sha256"], "size": source["size"], "files": source["files"]})
+        return Response(response, status=status.HTTP_202_ACCEPTED)
+
+def owned_file_id(request, file_id):
+    """
+    Validates the optional file_id of a transpilation request against the user's files.
+    Returns (file_id, error_response); both are None when no file id was given.
+    """
+    if file_id in (None, ''):
+        return None, None
+    try:
+        file_id = int(str(file_id))
+    except ValueError:
+        return None, Response({"error": "file_id must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+    if not File.objects.filter(id=file_id, user=request.user).exists():
+        return None, Response({"error": "File not found"}, status=status.HTTP_404_NOT_FOUND)
+    return file_id, None
+
+def _job_links(job_id, result):
+    return {
+        "job_id": job_id,
+        "task_id": result.id,
+        "status_url": reverse('job_status', args=[job_id]),
+        "events_url": reverse('job_events', args=[job_id]),
+        "result_url": reverse('job_result', args=[job_id]),
+    }
@@ -38,6 +38,8 @@ CORS_ALLOW_CREDENTIALS = True
 # Application definition
 
 INSTALLED_APPS = [
+    # Serves runserver over ASGI so job progress views can wait without holding a thread
+    'daphne',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -95,6 +97,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'salvage_backend.wsgi.application'
+ASGI_APPLICATION = 'salvage_backend.asgi.application'
 
 
 # Database
@@ -166,7 +169,75 @@ SIMPLE_JWT = {
 # Celery settings
 CELERY_BROKER_URL = 'redis://redis:6379/0'
 CELERY_RESULT_BACKEND = 'redis://redis:6379/0'
-CELERY_ACCEPT_CONTENT = ['json']
-CELERY_TASK_SERIALIZER = 'json'
-CELERY_RESULT_SERIALIZER = 'json'
+# Pipeline payloads are msgpack-encoded; JSON is still accepted from older producers.
+CELERY_ACCEPT_CONTENT = ['msgpack', 'json']
+CELERY_TASK_SERIALIZER = 'msgpack'
+CELERY_RESULT_SERIALIZER = 'msgpack'
+CELERY_RESULT_ACCEPT_CONTENT = ['msgpack', 'json']
 CELERY_TIMEZONE = 'UTC'
+CELERY_BEAT_SCHEDULE = {
+    'purge-stale-workspaces': {
+        'task': 'api.tasks.purge_stale_workspaces_task',
+        'schedule': 60 * 60,
+    },
+}
+
+# Transpilation jobs
+# Job state, progress events and final results live in Redis for JOB_TTL seconds.
+JOB_REDIS_URL = os.getenv('JOB_REDIS_URL', CELERY_BROKER_URL)
+JOB_TTL = int(os.getenv('JOB_TTL', 60 * 60 * 24))
+JOB_EVENTS_MAXLEN = int(os.getenv('JOB_EVENTS_MAXLEN', 10000))
+# Upper bounds on how long a long-poll request and an event stream stay open.
+JOB_LONG_POLL_MAX_WAIT = int(os.getenv('JOB_LONG_POLL_MAX_WAIT', 30))
+JOB_EVENT_STREAM_MAX_DURATION = int(os.getenv('JOB_EVENT_STREAM_MAX_DURATION', 300))
+
+# Transpiler job workspaces
+# Every workflow run gets its own directory under this root; leftovers are purged after the TTL.
+# Uploads are written here by the web process and read by the workers, so both must see the
+# same directory (the workspace_data volume in docker-compose.yml).
+TRANSPILER_WORKSPACE_ROOT = os.getenv('TRANSPILER_WORKSPACE_ROOT', '/tmp/output/jobs')
+TRANSPILER_WORKSPACE_TTL = int(os.getenv('TRANSPILER_WORKSPACE_TTL', 60 * 60 * 6))
+# Pipeline payloads (preprocessed code, segments, Rust output) up to this size travel
+# inline through the broker; larger ones are written to the job workspace.
+PIPELINE_INLINE_MAX_BYTES = int(os.getenv('PIPELINE_INLINE_MAX_BYTES', 256 * 1024))
+
+# Streaming uploads
+# Uploaded files are written straight into the job workspace; these bound a single file
+# and the source assembled from several files or archive members.
+UPLOAD_MAX_BYTES = int(os.getenv('UPLOAD_MAX_BYTES', 200 * 1024 * 1024))
+UPLOAD_ARCHIVE_MAX_BYTES = int(os.getenv('UPLOAD_ARCHIVE_MAX_BYTES', 200 * 1024 * 1024))
+UPLOAD_ARCHIVE_MAX_MEMBERS = int(os.getenv('UPLOAD_ARCHIVE_MAX_MEMBERS', 10000))
+
+# Metrics
+# Bearer token the Prometheus scraper sends to /transpiler/metrics/; the endpoint is disabled without one.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Caches
+# Translated segments are cached on disk, keyed by segment content, model and prompt version.
+# TIMEOUT bounds the age of an entry and MAX_ENTRIES bounds the size of the cache.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'translations': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('TRANSLATION_CACHE_DIR', str(BASE_DIR / 'output' / 'translation_cache')),
+        'TIMEOUT': int(os.getenv('TRANSLATION_CACHE_TTL', 60 * 60 * 24 * 30)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('TRANSLATION_CACHE_MAX_ENTRIES', 50000)),
+            'CULL_FREQUENCY': 4,
+        },
+    },
+    # Preprocessor output keyed by source hash and gcc flags, so repeated uploads skip gcc
+    'preprocessed': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('PREPROCESS_CACHE_DIR', str(BASE_DIR / 'output' / 'preprocess_cache')),
+        'TIMEOUT': int(os.getenv('PREPROCESS_CACHE_TTL', 60 * 60 * 24 * 7)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('PREPROCESS_CACHE_MAX_ENTRIES', 5000)),
+            'CULL_FREQUENCY': 4,
+        },
+    },
+}
+
+TRANSLATION_CACHE_MAX_ENTRY_BYTES = int(os.getenv('TRANSLATION_CACHE_MAX_ENTRY_BYTES', 256 * 1024))
@@ -1,50 +1,44 @@
 # salvage_backend/services/transpiler_workflow.py
-import re
-from celery import chain, group, chord, Celery
+from celery import chain
 from api.tasks import (
     preprocess_task,
     extract_and_build_task,
     segmentation_task,
-    # create_transpile_chord,
-    transpile_segment,
+    transpile_segments_task,
     postprocess_task,
 )
+from transpiler.services import jobs
+from transpiler.services.workspace import JobWorkspace
 
-app = Celery('salvage_backend')
-@app.task
-def create_transpile_chord(segmentation_result):
-    """
-    Given the segmentation result (a dict with a 'segments' key mapping segment names to file paths),
-    sorts the segments in chronological (numerical) order and creates a chord of transpile_segment tasks.
-    """
-    segment_files = segmentation_result['segments']
-    
-    # Sort the segments by the numeric prefix in the key.
-    # Assumes keys are in the format "segment_<number>_<name>.c"
-    sorted_segments = sorted(
-        segment_files.items(),
-        key=lambda item: int(re.search(r'segment_(\d+)_', item[0]).group(1)) if re.search(r'segment_(\d+)_', item[0]) else 0
-    )
-    
-    # For debugging/logging:
-    for key, path in sorted_segments:
-        print(f"Segment {key}: '{path}'")
-    
-    # Create a list of task signatures for each segment (using the sorted order)
-    transpile_tasks = [transpile_segment.s(path) for _, path in sorted_segments]
-    
-    # Create a chord: all transpile tasks run in parallel, then postprocess_task is called on the results
-    return chord(transpile_tasks)(postprocess_task.s())
-
-def run_transpilation_workflow(input_file_path):
+def run_transpilation_workflow(input_file_path, job_id, file_id=None):
     """
     Orchestrates the full transpilation workflow as a Celery chain.
+    All segments of a file are translated by a single task that keeps many
+    model requests in flight on the worker's async translation engine.
+    Passing the id of a saved File re-translates only the segments that changed
+    since its previous run and stores the submitted C code and the merged result on it.
+    Every task works inside the job's own workspace (see JobWorkspace).
     """
     workflow = chain(
-        preprocess_task.s(input_file_path),
-        extract_and_build_task.s(),
-        segmentation_task.s(),
-        create_transpile_chord.s()
+        preprocess_task.s(input_file_path, job_id=job_id),
+        extract_and_build_task.s(job_id=job_id),
+        segmentation_task.s(job_id=job_id),
+        transpile_segments_task.s(job_id=job_id, file_id=file_id),
+        postprocess_task.s(job_id=job_id, file_id=file_id, source=input_file_path if file_id else None)
     )
     result = workflow.apply_async()
-    return result
\ No newline at end of file
+    return result
+
+def submit_transpilation_job(input_code, user_id, file_id=None, workspace=None):
+    """
+    Registers a new job and starts its workflow without waiting for it.
+    Progress and the final Rust code are published through the job's Redis stream
+    (see transpiler.services.jobs), so callers return the job id immediately.
+    `input_code` is the C code or a reference to a source uploaded into `workspace`.
+    Returns a (job_id, AsyncResult) tuple.
+    """
+    workspace = workspace or JobWorkspace.create()
+    jobs.create_job(workspace.job_id, user_id, file_id)
+    result = run_transpilation_workflow(input_code, workspace.job_id, file_id=file_id)
+    jobs.set_task_id(workspace.job_id, result.id)
+    return workspace.job_id, result
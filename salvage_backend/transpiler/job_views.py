@@ -0,0 +1,180 @@
+import re
+import json
+import time
+import logging
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from .services import jobs
+
+logger = logging.getLogger(__name__)
+
+# Comment line sent while a stream is idle so proxies keep the connection open.
+KEEPALIVE_INTERVAL_MS = 15000
+
+# Redis stream ids, "<ms>-<seq>", or "0" to read from the start.
+EVENT_ID_PATTERN = re.compile(r"\d+(-\d+)?")
+
+# These views are async and never touch the database: a pending request only waits
+# on Redis, so one ASGI worker can hold thousands of them.
+
+
+def _request_user_id(request, allow_query_token=False):
+    """
+    Returns the user id from the request's JWT access token, or None.
+    EventSource cannot set headers, so the event stream alone also accepts the token as
+    ?token=; everywhere else it would only end up in proxy and access logs.
+    """
+    header = request.headers.get("Authorization", "")
+    if header.startswith("Bearer "):
+        raw_token = header[len("Bearer "):]
+    else:
+        raw_token = request.GET.get("token") if allow_query_token else None
+    if not raw_token:
+        return None
+    try:
+        token = AccessToken(raw_token)
+    except TokenError:
+        return None
+    return str(token.get(api_settings.USER_ID_CLAIM))
+
+
+def _invalid_event_id(event_id):
+    if EVENT_ID_PATTERN.fullmatch(event_id):
+        return None
+    return JsonResponse({"error": "since must be an event id"}, status=400)
+
+
+async def _owned_job(client, request, job_id, allow_query_token=False):
+    """Returns (job, error_response); jobs of other users are reported as missing."""
+    user_id = _request_user_id(request, allow_query_token)
+    if user_id is None:
+        return None, JsonResponse({"error": "Authentication credentials were not provided."}, status=401)
+    job = await jobs.aget_job(client, job_id)
+    if job is None or job.get("user_id") != user_id:
+        return None, JsonResponse({"error": "Job not found"}, status=404)
+    return job, None
+
+
+async def job_status(request, job_id):
+    """
+    Returns the job's state and the events after ?since=<event id>.
+    With ?wait=<seconds> the request long-polls until a new event arrives.
+    """
+    client = jobs.get_async_redis()
+    try:
+        job, error = await _owned_job(client, request, job_id)
+        if error:
+            return error
+
+        since = request.GET.get("since", "0")
+        error = _invalid_event_id(since)
+        if error:
+            return error
+        try:
+            wait = min(max(int(request.GET.get("wait", 0)), 0), settings.JOB_LONG_POLL_MAX_WAIT)
+        except ValueError:
+            wait = 0
+        # A finished job gets no further events, so there is nothing to wait for
+        if job.get("status") in jobs.TERMINAL_EVENTS:
+            wait = 0
+        events = await jobs.aread_events(client, job_id, since, block_ms=wait * 1000 or None)
+        if events:
+            job = await jobs.aget_job(client, job_id) or job
+        return JsonResponse({
+            "job": job,
+            "events": events,
+            "last_event_id": events[-1]["id"] if events else since,
+        })
+    finally:
+        await client.aclose()
+
+
+async def _result_body(job_id):
+    """The {"job_id", "rust_code"} JSON of job_result, with the code escaped chunk by chunk."""
+    yield '{"job_id": %s, "rust_code": "' % json.dumps(job_id)
+    async for text in jobs.aiter_result(job_id):
+        yield json.dumps(text)[1:-1]
+    yield '"}'
+
+
+async def job_result(request, job_id):
+    """
+    Returns the merged Rust code once the job is done; 202 with the job state until then.
+    The code is streamed from Redis in chunks rather than loaded into one response.
+    """
+    client = jobs.get_async_redis()
+    try:
+        job, error = await _owned_job(client, request, job_id)
+        if error:
+            return error
+        if job.get("status") == "failed":
+            return JsonResponse({"job": job, "error": job.get("error")}, status=500)
+        if job.get("status") != "done":
+            return JsonResponse({"job": job}, status=202)
+        if not await jobs.ahas_result(client, job_id):
+            return JsonResponse({"error": "Result has expired"}, status=410)
+        return StreamingHttpResponse(_result_body(job_id), content_type="application/json")
+    finally:
+        await client.aclose()
+
+
+async def job_segment(request, job_id, segment):
+    """Returns a single segment of a finished job's merged output, read via its offset index."""
+    client = jobs.get_async_redis()
+    try:
+        job, error = await _owned_job(client, request, job_id)
+        if error:
+            return error
+        if job.get("status") != "done":
+            return JsonResponse({"job": job}, status=202)
+        rust_code = await jobs.aget_segment(client, job_id, segment)
+        if rust_code is None:
+            return JsonResponse({"error": "Segment not found"}, status=404)
+        return JsonResponse({"job_id": job_id, "segment": segment, "rust_code": rust_code})
+    finally:
+        await client.aclose()
+
+
+def _sse(event: dict) -> str:
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+async def _event_stream(client, job_id, last_id):
+    deadline = time.monotonic() + settings.JOB_EVENT_STREAM_MAX_DURATION
+    try:
+        while time.monotonic() < deadline:
+            events = await jobs.aread_events(client, job_id, last_id, block_ms=KEEPALIVE_INTERVAL_MS)
+            if not events:
+                yield ": keepalive\n\n"
+                continue
+            for event in events:
+                last_id = event["id"]
+                yield _sse(event)
+                if event["type"] in jobs.TERMINAL_EVENTS:
+                    return
+        # The client reconnects with Last-Event-ID and resumes where it left off.
+        yield "retry: 1000\n\n"
+    finally:
+        await client.aclose()
+
+
+async def job_events(request, job_id):
+    """Streams the job's events as server-sent events until the job finishes."""
+    client = jobs.get_async_redis()
+    job, error = await _owned_job(client, request, job_id, allow_query_token=True)
+    if error:
+        await client.aclose()
+        return error
+
+    last_id = request.headers.get("Last-Event-ID") or request.GET.get("since", "0")
+    error = _invalid_event_id(last_id)
+    if error:
+        await client.aclose()
+        return error
+    response = StreamingHttpResponse(_event_stream(client, job_id, last_id), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,110 @@
+import time
+import platform
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from transpiler.services import benchmark
+from transpiler.services.translator.engine import start_engine_runner, reset_engine_runner
+
+# Reference report of the default run, made with
+#   python manage.py benchmark_pipeline --save-baseline benchmarks/baseline.json
+# Timings depend on the machine: regenerate it there before checking with --baseline.
+REFERENCE_BASELINE = 'benchmarks/baseline.json'
+
+# Both pipeline caches are disabled so every run does the full work.
+UNCACHED = {
+    alias: {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+    for alias in ('default', 'translations', 'preprocessed')
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the preprocess -> extract -> segment -> translate -> postprocess pipeline on a "
+        "synthetic corpus (and optional C files) against a local stub model, reports per-stage "
+        "wall time, peak RSS and throughput, and fails on regressions against a saved baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='*', help="Additional C files to include in the corpus.")
+        parser.add_argument('--sizes', type=int, nargs='*', default=list(benchmark.DEFAULT_SIZES),
+                            help="Function counts of the synthetic files.")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per file; the median time is reported.")
+        parser.add_argument('--latency', type=float, default=0.05, help="Seconds the stub model takes per request.")
+        parser.add_argument('--max-in-flight', type=int, default=64, help="Concurrent stub requests.")
+        parser.add_argument('--baseline',
+                            help=f"Report to compare against, e.g. {REFERENCE_BASELINE}; regressions fail the command.")
+        parser.add_argument('--save-baseline', help="Write this run's report to the given path.")
+        parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed relative slowdown per stage.")
+        parser.add_argument('--min-seconds', type=float, default=0.05,
+                            help="Ignore stages faster than this in the baseline.")
+        parser.add_argument('--use-cache', action='store_true',
+                            help="Keep the configured preprocessing and translation caches.")
+
+    def handle(self, *args, **options):
+        stub = benchmark.StubTranspiler(latency=options['latency'])
+        # No rate limiting: the stub answers as fast as its latency allows.
+        start_engine_runner(
+            stub,
+            max_in_flight=options['max_in_flight'],
+            requests_per_minute=10 ** 9,
+            tokens_per_minute=10 ** 12,
+        )
+        try:
+            corpus = benchmark.build_corpus(options['sizes'], options['files'])
+            if options['use_cache']:
+                results = self._run(corpus, options['repeat'])
+            else:
+                with override_settings(CACHES=UNCACHED):
+                    results = self._run(corpus, options['repeat'])
+        finally:
+            reset_engine_runner()
+
+        report = {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "latency": options['latency'],
+            "results": results,
+        }
+        self._print(results, stub.requests)
+
+        if options['save_baseline']:
+            benchmark.save_report(options['save_baseline'], report)
+            self.stdout.write(f"Saved baseline to {options['save_baseline']}")
+
+        if options['baseline']:
+            try:
+                baseline = benchmark.load_report(options['baseline'])
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read baseline {options['baseline']}: {str(e)}")
+            regressions = benchmark.compare_to_baseline(
+                results, baseline, options['tolerance'], options['min_seconds']
+            )
+            if regressions:
+                raise CommandError("Performance regressions:\n  " + "\n  ".join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+
+    def _run(self, corpus, repeat):
+        results = []
+        for entry in corpus:
+            runs = []
+            for _ in range(max(1, repeat)):
+                try:
+                    runs.append(benchmark.run_pipeline(entry["source"]))
+                except Exception as e:
+                    raise CommandError(f"Pipeline failed on {entry['name']}: {str(e)}")
+            results.append(benchmark.summarize(entry["name"], runs))
+        return results
+
+    def _print(self, results, requests):
+        header = f"{'file':<24}{'bytes':>10}{'segs':>7}" + "".join(f"{stage:>13}" for stage in benchmark.STAGES)
+        header += f"{'total':>10}{'seg/s':>10}{'KiB/s':>10}{'rss MiB':>10}"
+        self.stdout.write(header)
+        for entry in results:
+            line = f"{entry['name'][:23]:<24}{entry['bytes']:>10}{entry['segments']:>7}"
+            line += "".join(f"{entry['stages'][stage]:>13.3f}" for stage in benchmark.STAGES)
+            line += f"{entry['total_seconds']:>10.3f}{entry['segments_per_second'] or 0:>10.1f}"
+            line += f"{(entry['bytes_per_second'] or 0) / 1024:>10.1f}{entry['peak_rss_mb']:>10.1f}"
+            self.stdout.write(line)
+        self.stdout.write(f"Stub model requests: {requests}")
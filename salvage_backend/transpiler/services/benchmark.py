@@ -0,0 +1,247 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import resource
+from hashlib import blake2b
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from .translator.batching import MARKER_PATTERN
+from .translator.translator import Transpiler
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("preprocess", "extract", "segment", "translate", "postprocess")
+
+# Synthetic corpus sizes, in functions per file.
+DEFAULT_SIZES = (50, 200, 1000)
+
+
+class StubTranspiler(Transpiler):
+    """
+    Deterministic stand-in for the Gemini-backed Transpiler. Every request sleeps for
+    `latency` seconds and answers each segment of the prompt with a Rust function whose
+    name is derived from the segment, so identical input always gives identical output.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.requests = 0
+
+    def _verify_model(self):
+        pass
+
+    @staticmethod
+    def _rust_for(c_code: str) -> str:
+        name = blake2b(c_code.encode("utf-8"), digest_size=8).hexdigest()
+        body = "\n".join(f"    let _v{i} = {i};" for i in range(c_code.count("\n")))
+        return f"fn stub_{name}() {{\n{body}\n}}"
+
+    async def generate_async(self, prompt: str):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        code = prompt.split("STRICT REQUIREMENTS:")[0]
+        markers = list(MARKER_PATTERN.finditer(code))
+        if not markers:
+            return SimpleNamespace(text=self._rust_for(code), usage_metadata=None)
+        pieces = []
+        for i, marker in enumerate(markers):
+            end = markers[i + 1].start() if i + 1 < len(markers) else len(code)
+            pieces.append(marker.group(0).strip())
+            pieces.append(self._rust_for(code[marker.end():end]))
+        return SimpleNamespace(text="\n".join(pieces), usage_metadata=None)
+
+    def transpile(self, c_code: str, context: Optional[List[str]] = None) -> str:
+        return asyncio.run(self.generate_async(self._create_prompt(c_code, context))).text
+
+
+def generate_c_source(functions: int, seed: int = 0) -> str:
+    """
+    Builds a self-contained C file (no #include, so it preprocesses with -nostdinc)
+    with `functions` functions, a struct for every ten of them, calls to earlier
+    functions and a mutually recursive pair in every fifty.
+
+    :param functions: Number of functions to generate.
+    :param seed: Seed for the call structure, so a size always yields the same file.
+    :return: The C source.
+    """
+    rng = random.Random(seed)
+    lines = ["#define SCALE 3", ""]
+    structs = max(1, functions // 10)
+    for s in range(structs):
+        lines += [f"struct record_{s} {{", "    int id;", "    long total;", f"    struct record_{s} *next;", "};", ""]
+
+    # Prototypes let any function call any other, which is how the cycles arise.
+    lines += [f"int fn_{i}(int x, struct record_{i % structs} *r);" for i in range(functions)]
+    lines.append("")
+    for i in range(functions):
+        callees = rng.sample(range(i), min(i, 3))
+        if i % 50 == 48 and i + 1 < functions:
+            callees.append(i + 1)  # fn_{i+1} calls back into fn_i
+        if i % 50 == 49:
+            callees.append(i - 1)
+        lines.append(f"int fn_{i}(int x, struct record_{i % structs} *r) {{")
+        lines.append("    int acc = x * SCALE;")
+        lines.append("    for (int k = 0; k < x; k++) {")
+        lines.append("        acc += k ^ r->id;")
+        lines.append("    }")
+        for callee in callees:
+            lines.append(f"    if (acc > {callee}) acc -= fn_{callee}(acc / 2, (struct record_{callee % structs} *)0);")
+        lines.append("    r->total += acc;")
+        lines.append("    return acc;")
+        lines.append("}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def build_corpus(sizes=DEFAULT_SIZES, files: Optional[List[str]] = None) -> List[Dict[str, str]]:
+    """Returns [{"name", "source"}] for the synthetic sizes followed by the given C files."""
+    corpus = [{"name": f"synthetic-{size}", "source": generate_c_source(size, seed=size)} for size in sizes]
+    for path in files or []:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            corpus.append({"name": os.path.basename(path), "source": f.read()})
+    return corpus
+
+
+def peak_rss_mb() -> float:
+    """High-water mark of this process's resident set size, in MiB."""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in KiB on Linux and in bytes on macOS
+    return usage / (1024 * 1024) if os.uname().sysname == "Darwin" else usage / 1024
+
+
+class _StageTimer:
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+
+    def run(self, stage: str, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.stages[stage] = {"seconds": time.perf_counter() - start, "peak_rss_mb": peak_rss_mb()}
+        return result
+
+
+def run_pipeline(source: str) -> Dict[str, Any]:
+    """
+    Runs preprocess -> extract -> segment -> translate -> postprocess on `source` the way
+    the Celery chain does, inside a throwaway job workspace but without a broker or Redis.
+    The translation engine must already be running (see start_engine_runner).
+
+    :return: {"stages": {stage: {"seconds", "peak_rss_mb"}}, "bytes", "segments", "output_bytes"}.
+    """
+    from .preprocessor.preprocess import preprocess_c_code
+    from .preprocessor.segmentation import extract_symbols, build_dependency_graph, split_segments
+    from .preprocessor.metadata import build_metadata
+    from .translator.scheduler import translate_in_waves
+    from .postprocessor.postprocess import write_rust_output
+    from .workspace import JobWorkspace, load_blob, load_blobs, load_data
+
+    timer = _StageTimer()
+    workspace = JobWorkspace.create()
+    try:
+        def preprocess():
+            return workspace.put("preprocessed.c", preprocess_c_code(source))
+
+        def extract(preprocessed):
+            symbols = extract_symbols("preprocessed.c", source=load_blob(preprocessed))
+            return symbols, build_dependency_graph(symbols)
+
+        def segment(preprocessed, symbols, graph):
+            segments = split_segments(load_blob(preprocessed), symbols)
+            metadata = build_metadata(symbols, segments, graph=graph)
+            return workspace.put_many("segments.c.pack", segments), workspace.put_data("metadata.msgpack", metadata)
+
+        def translate(segment_refs, metadata_ref):
+            metadata = load_data(metadata_ref)
+            c_codes = load_blobs(segment_refs)
+            dependencies = {segment["segment_id"]: segment["dependencies"] for segment in metadata["segments"]}
+            rust_codes = translate_in_waves(c_codes, dependencies, metadata["waves"], units=metadata.get("units"))
+            return workspace.put_many("segments.rs.pack", rust_codes), len(c_codes)
+
+        def postprocess(rust_refs, metadata_ref):
+            os.makedirs(workspace.path, exist_ok=True)
+            metadata = load_data(metadata_ref)
+            return write_rust_output(load_blobs(rust_refs), metadata["sorted_segments"], workspace.output_path)
+
+        preprocessed = timer.run("preprocess", preprocess)
+        symbols, graph = timer.run("extract", extract, preprocessed)
+        segment_refs, metadata_ref = timer.run("segment", segment, preprocessed, symbols, graph)
+        rust_refs, segment_count = timer.run("translate", translate, segment_refs, metadata_ref)
+        index = timer.run("postprocess", postprocess, rust_refs, metadata_ref)
+    finally:
+        workspace.cleanup()
+
+    return {
+        "stages": timer.stages,
+        "bytes": len(source.encode("utf-8")),
+        "segments": segment_count,
+        "output_bytes": index["size"],
+    }
+
+
+def summarize(name: str, runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Reduces repeated runs of one corpus entry to the median time per stage, the peak
+    RSS and the end-to-end throughput.
+    """
+    def median(values):
+        values = sorted(values)
+        return values[len(values) // 2]
+
+    stages = {stage: round(median([run["stages"][stage]["seconds"] for run in runs]), 6) for stage in STAGES}
+    total = sum(stages.values())
+    first = runs[0]
+    return {
+        "name": name,
+        "bytes": first["bytes"],
+        "segments": first["segments"],
+        "output_bytes": first["output_bytes"],
+        "stages": stages,
+        "total_seconds": round(total, 6),
+        "peak_rss_mb": round(max(run["stages"][stage]["peak_rss_mb"] for run in runs for stage in STAGES), 1),
+        "bytes_per_second": round(first["bytes"] / total, 1) if total else None,
+        "segments_per_second": round(first["segments"] / total, 1) if total else None,
+    }
+
+
+def compare_to_baseline(results: List[Dict[str, Any]], baseline: Dict[str, Any], tolerance: float, min_seconds: float) -> List[str]:
+    """
+    Compares stage times with a stored baseline.
+
+    :param results: Summaries produced by summarize().
+    :param baseline: A previously saved report ({"results": [...]}).
+    :param tolerance: Allowed relative slowdown, e.g. 0.25 for 25%.
+    :param min_seconds: Stages faster than this in the baseline are ignored, since their timing is mostly noise.
+    :return: A description of every regression; empty if there are none.
+    """
+    previous = {entry["name"]: entry for entry in baseline.get("results", [])}
+    regressions = []
+    for entry in results:
+        old = previous.get(entry["name"])
+        if old is None:
+            continue
+        for stage, seconds in entry["stages"].items():
+            old_seconds = old["stages"].get(stage)
+            if old_seconds is None or old_seconds < min_seconds:
+                continue
+            if seconds > old_seconds * (1 + tolerance):
+                regressions.append(
+                    f"{entry['name']} {stage}: {seconds:.3f}s vs {old_seconds:.3f}s baseline "
+                    f"(+{(seconds / old_seconds - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def load_report(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_report(path: str, report: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
@@ -0,0 +1,218 @@
+import json
+import time
+import codecs
+import logging
+from typing import AsyncIterator, List, Optional, Tuple
+import redis
+import redis.asyncio as aredis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+JOB_KEY = "salvage:job:{job_id}"
+EVENTS_KEY = "salvage:job:{job_id}:events"
+RESULT_KEY = "salvage:job:{job_id}:result"
+INDEX_KEY = "salvage:job:{job_id}:index"
+
+# The merged output is copied into Redis in chunks of this size.
+RESULT_CHUNK_BYTES = 1024 * 1024
+
+# Event types that end a job's event stream.
+TERMINAL_EVENTS = ("done", "failed")
+
+_client = None
+
+
+def get_redis() -> redis.Redis:
+    """Returns the process-wide Redis client used for job state; redis-py reconnects after a fork."""
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.JOB_REDIS_URL, decode_responses=True)
+    return _client
+
+
+def get_async_redis(decode_responses: bool = True) -> aredis.Redis:
+    """
+    Returns a new asyncio Redis client; it is bound to the calling event loop and must be closed.
+    Clients reading the stored result in chunks must not decode, since a chunk can end
+    inside a multi-byte character.
+    """
+    return aredis.Redis.from_url(settings.JOB_REDIS_URL, decode_responses=decode_responses)
+
+
+def _event_fields(event_type: str, data: Optional[dict]) -> dict:
+    return {"type": event_type, "data": json.dumps(data or {})}
+
+
+def decode_event(event_id: str, fields: dict) -> dict:
+    """Turns a raw stream entry into {"id", "type", "data"}."""
+    return {"id": event_id, "type": fields.get("type"), "data": json.loads(fields.get("data") or "{}")}
+
+
+def publish_event(job_id: str, event_type: str, data: Optional[dict] = None) -> str:
+    """
+    Appends an event to the job's Redis stream. Readers resume from the id of the last
+    event they saw, so a reconnecting client never misses or repeats an event.
+
+    :return: The stream id of the new event.
+    """
+    client = get_redis()
+    key = EVENTS_KEY.format(job_id=job_id)
+    pipe = client.pipeline()
+    pipe.xadd(key, _event_fields(event_type, data), maxlen=settings.JOB_EVENTS_MAXLEN, approximate=True)
+    pipe.expire(key, settings.JOB_TTL)
+    return pipe.execute()[0]
+
+
+def create_job(job_id: str, user_id, file_id=None) -> None:
+    """Records a newly submitted job so its owner can poll it right away."""
+    client = get_redis()
+    key = JOB_KEY.format(job_id=job_id)
+    pipe = client.pipeline()
+    pipe.hset(key, mapping={
+        "job_id": job_id,
+        "user_id": str(user_id),
+        "file_id": str(file_id or ""),
+        "status": "queued",
+        "stage": "",
+        "created_at": str(time.time()),
+    })
+    pipe.expire(key, settings.JOB_TTL)
+    pipe.execute()
+    publish_event(job_id, "status", {"status": "queued"})
+
+
+def set_task_id(job_id: str, task_id: str) -> None:
+    get_redis().hset(JOB_KEY.format(job_id=job_id), "task_id", task_id)
+
+
+def update_job(job_id: str, stage: str, **progress) -> None:
+    """Marks the job as running `stage` and publishes the change with any progress counters."""
+    fields = {"status": "running", "stage": stage}
+    fields.update({name: str(value) for name, value in progress.items()})
+    get_redis().hset(JOB_KEY.format(job_id=job_id), mapping=fields)
+    publish_event(job_id, "status", {"status": "running", "stage": stage, **progress})
+
+
+def publish_segment(job_id: str, segment: str, rust_code: str) -> None:
+    """Publishes one translated segment so clients can render it before the job finishes."""
+    publish_event(job_id, "segment", {"segment": segment, "rust_code": rust_code})
+
+
+def complete_job(job_id: str, output_path: str, index: dict) -> None:
+    """
+    Copies the merged output file into Redis chunk by chunk, stores its offset index,
+    publishes a "result" event and then the terminal "done" event. The result event
+    carries the Rust code itself only when it is small enough to travel inline; it is
+    taken from the same single pass over the file.
+    """
+    client = get_redis()
+    result_key = RESULT_KEY.format(job_id=job_id)
+    inline = index["size"] <= settings.PIPELINE_INLINE_MAX_BYTES
+    inline_chunks = []
+    client.delete(result_key)
+    with open(output_path, "rb") as f:
+        for chunk in iter(lambda: f.read(RESULT_CHUNK_BYTES), b""):
+            client.append(result_key, chunk)
+            if inline:
+                inline_chunks.append(chunk)
+
+    pipe = client.pipeline()
+    pipe.expire(result_key, settings.JOB_TTL)
+    pipe.set(INDEX_KEY.format(job_id=job_id), json.dumps(index), ex=settings.JOB_TTL)
+    pipe.hset(JOB_KEY.format(job_id=job_id), mapping={"status": "done", "stage": "", "finished_at": str(time.time())})
+    pipe.execute()
+
+    result = {"size": index["size"], "segments": list(index["segments"])}
+    if inline:
+        result["rust_code"] = b"".join(inline_chunks).decode("utf-8")
+    publish_event(job_id, "result", result)
+    publish_event(job_id, "done", {"status": "done"})
+
+
+def fail_job(job_id: str, error: str) -> None:
+    """Marks the job as failed and publishes the terminal "failed" event."""
+    get_redis().hset(JOB_KEY.format(job_id=job_id), mapping={
+        "status": "failed",
+        "error": error,
+        "finished_at": str(time.time()),
+    })
+    publish_event(job_id, "failed", {"status": "failed", "error": error})
+
+
+def active_job_ids(job_ids: List[str]) -> set:
+    """Returns those of `job_ids` whose job is still queued or running."""
+    pipe = get_redis().pipeline()
+    for job_id in job_ids:
+        pipe.hget(JOB_KEY.format(job_id=job_id), "status")
+    return {job_id for job_id, status in zip(job_ids, pipe.execute()) if status in ("queued", "running")}
+
+
+async def aget_job(client: aredis.Redis, job_id: str) -> Optional[dict]:
+    """Returns the job's state, or None if it does not exist or has expired."""
+    job = await client.hgetall(JOB_KEY.format(job_id=job_id))
+    return job or None
+
+
+async def ahas_result(client: aredis.Redis, job_id: str) -> bool:
+    return bool(await client.exists(RESULT_KEY.format(job_id=job_id)))
+
+
+async def aiter_result(job_id: str, chunk_bytes: int = RESULT_CHUNK_BYTES) -> AsyncIterator[str]:
+    """
+    Yields the stored result as text, read with GETRANGE one chunk at a time so the
+    whole output is never held in memory. Uses its own client, which it closes.
+    """
+    client = get_async_redis(decode_responses=False)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    key = RESULT_KEY.format(job_id=job_id)
+    try:
+        start = 0
+        while True:
+            # GETRANGE takes an inclusive end offset and returns nothing past the end
+            chunk = await client.getrange(key, start, start + chunk_bytes - 1)
+            if not chunk:
+                break
+            start += len(chunk)
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+    finally:
+        await client.aclose()
+
+
+async def aget_segment(client: aredis.Redis, job_id: str, segment: str) -> Optional[str]:
+    """Returns one segment of the merged result using its offset index, or None."""
+    index = await client.get(INDEX_KEY.format(job_id=job_id))
+    if index is None:
+        return None
+    span = json.loads(index)["segments"].get(segment)
+    if span is None:
+        return None
+    start, end = span
+    if start == end:
+        return ""
+    # GETRANGE takes an inclusive end offset
+    return await client.getrange(RESULT_KEY.format(job_id=job_id), start, end - 1)
+
+
+async def aread_events(
+    client: aredis.Redis,
+    job_id: str,
+    last_id: str = "0",
+    block_ms: Optional[int] = None,
+    count: int = 100,
+) -> List[dict]:
+    """
+    Reads the job's events after `last_id`, waiting up to `block_ms` for new ones.
+    Waiting happens in Redis, so a pending request costs the web server no thread.
+    """
+    response: List[Tuple[str, list]] = await client.xread(
+        {EVENTS_KEY.format(job_id=job_id): last_id or "0"}, count=count, block=block_ms
+    )
+    if not response:
+        return []
+    return [decode_event(event_id, fields) for event_id, fields in response[0][1]]
@@ -1,130 +1,238 @@
-import os
-import re
 import json
-from hashlib import md5
+import threading
+from hashlib import blake2b
 from collections import OrderedDict
 from tree_sitter import Language, Parser
 import tree_sitter_rust as tsrust
 
 RUST_LANGUAGE = Language(tsrust.language())
 
-def parse_rust_code(code: str):
-    """Parse Rust code using tree-sitter and return the parse tree."""
+CLOSING_TOKENS = (')', ']', '}', '>')
+
+# Parsers are not thread-safe, so every thread keeps its own and reuses it across calls.
+_local = threading.local()
+
+def get_parser() -> Parser:
+    """Return this thread's tree-sitter Rust parser, creating it on first use."""
     if RUST_LANGUAGE is None:
         raise RuntimeError("Rust language library not initialized")
-    
-    parser = Parser(RUST_LANGUAGE)
-    return parser.parse(code.encode('utf8'))
+    parser = getattr(_local, "parser", None)
+    if parser is None:
+        parser = _local.parser = Parser(RUST_LANGUAGE)
+    return parser
+
+def parse_rust_code(code: str):
+    """Parse Rust code using tree-sitter and return the parse tree."""
+    return get_parser().parse(code.encode('utf8'))
+
+def analyze_segment(code: str) -> dict:
+    """
+    Parse a Rust segment once and collect everything the postprocessor needs in a
+    single TreeCursor walk.
+
+    Returns a dict with:
+        signatures: function signatures (the item up to its body), in source order
+        imports: text of the top-level `use` declarations
+        import_spans: (start, end) byte spans of those declarations
+        items: (kind, start, end, digest) of every top-level item, where digest hashes
+               the item's tokens without whitespace or comments. The span covers the
+               comments directly above the item and a comment trailing its last line.
+    """
+    source = code.encode('utf8')
+    cursor = get_parser().parse(source).walk()
+    signatures, imports, import_spans, items = [], [], [], []
+    current = None  # token hash of the top-level item being walked
+    attributes = None  # (start, hash) of outer attributes waiting for their item
+    leading = None  # (start, last row) of the comments directly above the next item
+    previous_row = -1  # last row of the previous top-level item
+
+    depth = 0
+    visited_children = False
+    while True:
+        if not visited_children:
+            node = cursor.node
+            is_comment = node.type.endswith('comment')
+            if depth == 1 and is_comment:
+                row = node.start_point[0]
+                if row == previous_row and items:
+                    # A comment after an item on its last line goes with that item
+                    kind, start, _, digest = items[-1]
+                    items[-1] = (kind, start, node.end_byte, digest)
+                elif leading is None or row > leading[1] + 1:
+                    leading = (node.start_byte, _last_row(node))
+                else:
+                    leading = (leading[0], _last_row(node))
+            if depth == 1 and node.is_named and not is_comment:
+                # Comments separated from the item by a blank line are not about it
+                if leading and not attributes and node.start_point[0] > leading[1] + 1:
+                    leading = None
+                # Outer attributes belong to the item that follows them
+                if node.type == 'attribute_item':
+                    attributes = attributes or (leading[0] if leading else node.start_byte, blake2b(digest_size=16))
+                    current = attributes[1]
+                    leading = (attributes[0], _last_row(node))
+                else:
+                    start, current = attributes or (leading[0] if leading else node.start_byte, blake2b(digest_size=16))
+                    attributes = leading = None
+                    previous_row = _last_row(node)
+                    items.append((node.type, start, node.end_byte, current))
+                    if node.type == 'use_declaration':
+                        imports.append(source[node.start_byte:node.end_byte].decode('utf8'))
+                        import_spans.append((node.start_byte, node.end_byte))
+            if not is_comment:
+                if node.type == 'function_item':
+                    body = node.child_by_field_name('body')
+                    end = body.start_byte if body is not None else node.end_byte
+                    signatures.append(source[node.start_byte:end].decode('utf8').strip())
+                if node.child_count == 0:
+                    # Trailing commas do not change an item
+                    trailing = node.type == ',' and (node.next_sibling is None or node.next_sibling.type in CLOSING_TOKENS)
+                    if current is not None and not trailing:
+                        current.update(source[node.start_byte:node.end_byte])
+                        current.update(b"\0")
+                elif cursor.goto_first_child():
+                    depth += 1
+                    continue
+        if cursor.goto_next_sibling():
+            visited_children = False
+        elif cursor.goto_parent():
+            depth -= 1
+            visited_children = True
+        else:
+            break
+
+    if attributes:
+        items.append(('attribute_item', attributes[0], len(source), attributes[1]))
+    items = [(kind, start, end, digest.hexdigest()) for kind, start, end, digest in items]
+    return {"signatures": signatures, "imports": imports, "import_spans": import_spans, "items": items}
+
+def _last_row(node) -> int:
+    """Row of a node's last character; line comments end at column 0 of the next row."""
+    row, column = node.end_point
+    return row - 1 if column == 0 and row > node.start_point[0] else row
 
 def extract_function_signatures(code: str) -> list:
     """Extract function signatures using tree-sitter AST."""
-    tree = parse_rust_code(code)
-    root_node = tree.root_node
-    signatures = []
-
-    def traverse(node):
-        if node.type == 'function_item':
-            body_node = None
-            for child in node.children:
-                if child.type == 'block':
-                    body_node = child
-                    break
-            if body_node:
-                start = node.start_byte
-                end = body_node.start_byte
-                signature = code[start:end].strip()
-            else:
-                signature = code[node.start_byte:node.end_byte].strip()
-            signatures.append(signature)
-        for child in node.children:
-            traverse(child)
-    traverse(root_node)
-    return signatures
-
-def compute_segment_hash(segment: str) -> str:
-    """Compute MD5 hash based on function signatures."""
-    signatures = extract_function_signatures(segment)
-    concatenated = ''.join(sorted(signatures))
-    return md5(concatenated.encode('utf8')).hexdigest()
-
-def remove_duplicate_segments(segments: dict) -> dict:
-    """Remove segments with duplicate function signatures."""
-    unique_segments = OrderedDict()
-    seen_hashes = set()
-
-    for name, code in segments.items():
-        sig_hash = compute_segment_hash(code)
-        if sig_hash not in seen_hashes:
-            seen_hashes.add(sig_hash)
-            unique_segments[name] = code
-    return unique_segments
-
-def extract_import_statements(segment: str) -> list:
-    """Extract Rust imports using regex (handles multi-line)."""
-    import_pattern = re.compile(r'^\s*use\b.*?;', re.MULTILINE | re.DOTALL)
-    return import_pattern.findall(segment)
-
-def deduplicate_imports(segments: list) -> tuple:
-    """Deduplicate imports and remove them from segments."""
-    all_imports = []
-    cleaned_segments = []
-    import_pattern = re.compile(r'^\s*use\b.*?;', re.MULTILINE | re.DOTALL)
-
-    for seg in segments:
-        imports = extract_import_statements(seg)
-        all_imports.extend(imports)
-        cleaned = import_pattern.sub('', seg).strip()
-        cleaned_segments.append(cleaned)
-    
-    unique_imports = list(OrderedDict.fromkeys(all_imports))
-    return unique_imports, cleaned_segments
-
-def load_dependency_metadata(metadata_path: str) -> list:
-    """Load sorted segment order from metadata."""
-    with open(metadata_path, 'r') as f:
-        metadata = json.load(f)
-    return metadata.get("sorted_segments", [])
-
-def merge_segments(segments: dict, sorted_order: list, imports: list) -> str:
-    """Merge segments with consolidated imports and in specified order."""
-    merged_code = "// Merged Rust Code\n\n"
+    return analyze_segment(code)["signatures"]
+
+def remove_spans(code: str, spans: list) -> str:
+    """Cut the given (start, end) byte spans out of `code` in one pass."""
+    source = code.encode('utf8')
+    parts = []
+    position = 0
+    for start, end in sorted(spans):
+        parts.append(source[position:start])
+        position = max(position, end)
+    parts.append(source[position:])
+    return b"".join(parts).decode('utf8')
+
+def remove_duplicate_items(segments: dict, sorted_order: list, analyses: dict) -> tuple:
+    """
+    Keep one copy of every top-level item (fn, struct, enum, impl, use, ...), comparing
+    items by the hash of their tokens. Segments are visited in merge order, so the first
+    copy in the output wins. `use` declarations are moved into a single import list.
+
+    Returns (cleaned_segments, imports); segments left without code are dropped.
+    """
+    seen = set()
+    imports = []
+    cleaned = OrderedDict()
+
+    for name in sorted_order:
+        if name not in segments:
+            continue
+        removed = []
+        use_declarations = iter(analyses[name]["imports"])
+        for kind, start, end, digest in analyses[name]["items"]:
+            if kind == 'use_declaration':
+                # The import list gets the declaration alone, without its comments
+                declaration = next(use_declarations)
+                removed.append((start, end))
+                if digest not in seen:
+                    imports.append(declaration)
+            elif digest in seen:
+                removed.append((start, end))
+            seen.add(digest)
+        code = remove_spans(segments[name], removed).strip() if removed else segments[name].strip()
+        if code:
+            cleaned[name] = code
+    return cleaned, imports
+
+# The offset index of a merged file is stored next to it under this suffix.
+INDEX_SUFFIX = ".index.json"
+
+def _merged_chunks(segments: dict, sorted_order: list, imports: list):
+    """
+    Yield the merged file as (segment_name, bytes) chunks, in output order.
+    segment_name is set only for the chunk holding a segment's code.
+    """
+    yield None, b"// Merged Rust Code"
     if imports:
-        merged_code += "// Imports\n" + "\n".join(imports) + "\n\n"
+        yield None, ("\n\n// Imports\n" + "\n".join(imports)).encode('utf8')
     for seg_name in sorted_order:
         if seg_name in segments:
-            merged_code += f"// Segment: {seg_name}\n{segments[seg_name]}\n\n"
-    return merged_code.strip()
-
-def clean_and_merge_segments(segment_dir: str, metadata_path: str, output_path: str) -> str:
-    # Load all segments
-    segments = {}
-    for filename in os.listdir(segment_dir):
-        if filename.endswith('.rs'):
-            with open(os.path.join(segment_dir, filename), 'r', encoding='utf8') as f:
-                segments[filename] = f.read()
-
-    # Remove duplicates
-    unique_segments = remove_duplicate_segments(segments)
-    segment_codes = list(unique_segments.values())
-
-    # Deduplicate imports
-    unique_imports, cleaned_segments = deduplicate_imports(segment_codes)
-
-    # Rebuild cleaned mapping preserving order
-    cleaned_mapping = OrderedDict()
-    for (name, _), cleaned_code in zip(unique_segments.items(), cleaned_segments):
-        cleaned_mapping[name] = cleaned_code
+            yield None, f"\n\n// Segment: {seg_name}\n".encode('utf8')
+            yield seg_name, segments[seg_name].encode('utf8')
+
+def write_merged_segments(segments: dict, sorted_order: list, imports: list, out) -> dict:
+    """
+    Stream the merged file to the binary file-like `out` without building it in memory.
+
+    Returns an offset index {"size": n, "segments": {name: [start, end]}} giving the
+    byte range of each segment's code, so single segments can be served without
+    reading the whole output.
+    """
+    offsets = OrderedDict()
+    position = 0
+    for seg_name, chunk in _merged_chunks(segments, sorted_order, imports):
+        out.write(chunk)
+        if seg_name is not None:
+            offsets[seg_name] = [position, position + len(chunk)]
+        position += len(chunk)
+    return {"size": position, "segments": offsets}
+
+def prepare_rust_segments(segments: dict, sorted_order: list) -> tuple:
+    """
+    Deduplicate segments and imports and work out the merge order.
+    Returns (cleaned_segments, sorted_order, imports) ready for merging.
+    """
+    # Parse every segment exactly once
+    analyses = {name: analyze_segment(code) for name, code in segments.items()}
 
     # Determine merge order
-    sorted_order = load_dependency_metadata(metadata_path)
-    missing = [name for name in cleaned_mapping if name not in sorted_order]
+    sorted_order = [name for name in sorted_order if name in segments]
+    ordered = set(sorted_order)
+    missing = [name for name in segments if name not in ordered]
     sorted_order += missing  # Append missing segments
 
-    # Merge and save
-    final_code = merge_segments(cleaned_mapping, sorted_order, unique_imports)
-    with open(output_path, 'w', encoding='utf8') as f:
-        f.write(final_code)
-    return output_path
-
-# Example usage:
-# final_file = clean_and_merge_segments("segments_dir", "metadata.json", "output.rs")
\ No newline at end of file
+    # Keep one copy of every item and collect the imports
+    cleaned_mapping, unique_imports = remove_duplicate_items(segments, sorted_order, analyses)
+    sorted_order = [name for name in sorted_order if name in cleaned_mapping]
+
+    return cleaned_mapping, sorted_order, unique_imports
+
+def write_rust_output(segments: dict, sorted_order: list, output_path: str) -> dict:
+    """
+    Deduplicate and merge segments straight into `output_path`, and store the offset
+    index alongside it (output_path + INDEX_SUFFIX).
+
+    Returns the offset index.
+    """
+    cleaned_mapping, sorted_order, imports = prepare_rust_segments(segments, sorted_order)
+    with open(output_path, 'wb') as f:
+        index = write_merged_segments(cleaned_mapping, sorted_order, imports, f)
+    with open(output_path + INDEX_SUFFIX, 'w', encoding='utf8') as f:
+        json.dump(index, f)
+    return index
+
+def read_segment(output_path: str, seg_name: str, index: dict = None):
+    """Read one segment's code from a merged file using its offset index; None if absent."""
+    if index is None:
+        with open(output_path + INDEX_SUFFIX, 'r', encoding='utf8') as f:
+            index = json.load(f)
+    span = index["segments"].get(seg_name)
+    if span is None:
+        return None
+    with open(output_path, 'rb') as f:
+        f.seek(span[0])
+        return f.read(span[1] - span[0]).decode('utf8')
@@ -0,0 +1,222 @@
+import sys
+import base64
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def _encode(values: array) -> str:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return base64.b64encode(values.tobytes()).decode("ascii")
+
+
+def _decode(data: str) -> array:
+    values = array("i")
+    values.frombytes(base64.b64decode(data))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+class DependencyGraph:
+    """
+    Directed dependency graph stored in CSR form: node i's successors are
+    targets[offsets[i]:offsets[i + 1]]. An edge u -> v means u depends on v.
+    Nodes are integer ids; `names` maps ids to symbol names and `ids` the reverse.
+    """
+
+    __slots__ = ("names", "ids", "offsets", "targets", "_reverse")
+
+    def __init__(self, names: List[str], offsets: array, targets: array):
+        self.names = names
+        self.ids = {name: i for i, name in enumerate(names)}
+        self.offsets = offsets
+        self.targets = targets
+        self._reverse: Optional["DependencyGraph"] = None
+
+    @classmethod
+    def from_adjacency(cls, names: List[str], adjacency: List[List[int]]) -> "DependencyGraph":
+        offsets = array("i", [0])
+        targets = array("i")
+        for successors in adjacency:
+            targets.extend(successors)
+            offsets.append(len(targets))
+        return cls(names, offsets, targets)
+
+    @classmethod
+    def from_symbols(cls, symbols: List[Dict[str, Any]]) -> "DependencyGraph":
+        """
+        Builds the graph from extracted symbols. Symbols seen more than once (e.g. a
+        prototype and its definition) share a node, and duplicate edges are dropped.
+        """
+        ids: Dict[str, int] = {}
+        names: List[str] = []
+        adjacency: List[Dict[int, None]] = []
+
+        def node(name: str) -> int:
+            if name not in ids:
+                ids[name] = len(names)
+                names.append(name)
+                adjacency.append({})
+            return ids[name]
+
+        for symbol in symbols:
+            source = node(symbol["name"])
+            for dependency in symbol["dependencies"]:
+                adjacency[source][node(dependency)] = None
+        return cls.from_adjacency(names, [list(successors) for successors in adjacency])
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.targets)
+
+    def successor_ids(self, node: int) -> array:
+        return self.targets[self.offsets[node]:self.offsets[node + 1]]
+
+    def successors(self, name: str) -> List[str]:
+        """Names of the symbols `name` depends on."""
+        return [self.names[target] for target in self.successor_ids(self.ids[name])]
+
+    def reverse(self) -> "DependencyGraph":
+        """The graph with every edge flipped, built once and cached."""
+        if self._reverse is None:
+            counts = array("i", [0]) * (len(self.names) + 1)
+            for target in self.targets:
+                counts[target + 1] += 1
+            offsets = array("i", counts)
+            for i in range(len(self.names)):
+                offsets[i + 1] += offsets[i]
+            targets = array("i", [0]) * len(self.targets)
+            fill = array("i", offsets)
+            for source in range(len(self.names)):
+                for target in self.successor_ids(source):
+                    targets[fill[target]] = source
+                    fill[target] += 1
+            self._reverse = DependencyGraph(self.names, offsets, targets)
+        return self._reverse
+
+    def dependents(self, name: str) -> List[str]:
+        """Names of the symbols that depend on `name`."""
+        return self.reverse().successors(name)
+
+    def topological_order(self) -> List[int]:
+        """
+        Kahn's algorithm: every node comes before the nodes it depends on.
+
+        :raises ValueError: If the graph contains a cycle.
+        """
+        indegree = array("i", [0]) * len(self.names)
+        for target in self.targets:
+            indegree[target] += 1
+        ready = [node for node in range(len(self.names)) if indegree[node] == 0]
+        order = []
+        while ready:
+            node = ready.pop()
+            order.append(node)
+            for target in self.successor_ids(node):
+                indegree[target] -= 1
+                if indegree[target] == 0:
+                    ready.append(target)
+        if len(order) != len(self.names):
+            raise ValueError("Dependency graph contains cycles!")
+        return order
+
+    def strongly_connected_components(self) -> List[List[int]]:
+        """
+        Iterative Tarjan. Components are returned dependencies-first: a component
+        always comes after every component it depends on.
+        """
+        count = len(self.names)
+        index = array("i", [-1]) * count
+        low = array("i", [0]) * count
+        on_stack = bytearray(count)
+        stack: List[int] = []
+        components: List[List[int]] = []
+        counter = 0
+        offsets, targets = self.offsets, self.targets
+
+        for root in range(count):
+            if index[root] != -1:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            work = [[root, offsets[root]]]
+            while work:
+                frame = work[-1]
+                node, edge = frame
+                if edge < offsets[node + 1]:
+                    frame[1] += 1
+                    target = targets[edge]
+                    if index[target] == -1:
+                        index[target] = low[target] = counter
+                        counter += 1
+                        stack.append(target)
+                        on_stack[target] = 1
+                        work.append([target, offsets[target]])
+                    elif on_stack[target] and index[target] < low[node]:
+                        low[node] = index[target]
+                    continue
+
+                work.pop()
+                if work and low[node] < low[work[-1][0]]:
+                    low[work[-1][0]] = low[node]
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = 0
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+        return components
+
+    def condense(self) -> Tuple["DependencyGraph", List[List[int]]]:
+        """
+        Collapses every strongly connected component into one node.
+
+        :return: The condensed DAG, whose node i stands for components[i], and the
+                 components as lists of node ids of this graph, dependencies-first.
+        """
+        components = self.strongly_connected_components()
+        component_of = array("i", [0]) * len(self.names)
+        for i, component in enumerate(components):
+            for node in component:
+                component_of[node] = i
+
+        adjacency: List[Dict[int, None]] = [{} for _ in components]
+        for source in range(len(self.names)):
+            for target in self.successor_ids(source):
+                if component_of[source] != component_of[target]:
+                    adjacency[component_of[source]][component_of[target]] = None
+        condensed = DependencyGraph.from_adjacency(
+            [str(i) for i in range(len(components))],
+            [list(successors) for successors in adjacency],
+        )
+        return condensed, components
+
+    def dependency_levels(self) -> List[int]:
+        """
+        For an acyclic graph, the level of every node: 0 without dependencies, otherwise
+        one more than its deepest dependency. Nodes on one level are independent.
+        """
+        levels = array("i", [0]) * len(self.names)
+        for node in reversed(self.topological_order()):
+            for target in self.successor_ids(node):
+                if levels[target] + 1 > levels[node]:
+                    levels[node] = levels[target] + 1
+        return list(levels)
+
+    def to_dict(self) -> dict:
+        """Compact JSON-safe form: the CSR arrays travel as base64-encoded int32 buffers."""
+        return {"names": self.names, "offsets": _encode(self.offsets), "targets": _encode(self.targets)}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "DependencyGraph":
+        return cls(list(data["names"]), _decode(data["offsets"]), _decode(data["targets"]))
@@ -1,37 +1,77 @@
-import os
-import json
-import networkx as nx
+import logging
+from typing import List, Optional, Tuple
+from .graph import DependencyGraph
 
-def generate_metadata(symbols, segment_files, output_dir: str = "/tmp/output"):
-    """Generates metadata linking segments with extracted symbols."""
-    os.makedirs(output_dir, exist_ok=True)
+def condense_dependency_graph(graph: DependencyGraph) -> Tuple[DependencyGraph, List[List[str]]]:
+    """
+    Condenses every strongly connected component (mutual recursion, mutually referencing
+    structs) into a single node, which makes the graph acyclic.
+
+    :param graph: The dependency graph (caller -> callee edges), may contain cycles.
+    :return: The condensed DAG and, for each of its nodes, the sorted symbol names it contains.
+    """
+    condensed, components = graph.condense()
+    members = [sorted(graph.names[node] for node in component) for component in components]
+    return condensed, members
+
+def compute_translation_units(condensed: DependencyGraph, members: List[List[str]], segment_names) -> list:
+    """
+    Groups the components of the condensed graph into levels that can be translated
+    concurrently. Every component lands in a later level than the components it depends
+    on, and the segments of one component are translated together as a single unit.
+
+    :param condensed: The condensed dependency graph, see condense_dependency_graph.
+    :param members: The symbol names of each condensed node.
+    :param segment_names: Names of the symbols that have a segment.
+    :return: A list of levels, each a list of units, each a list of segment names.
+    """
+    levels: List[list] = []
+    for node, level in enumerate(condensed.dependency_levels()):
+        unit = [name for name in members[node] if name in segment_names]
+        if not unit:
+            continue
+        while len(levels) <= level:
+            levels.append([])
+        levels[level].append(unit)
+    return [sorted(units) for units in levels if units]
+
+def build_metadata(symbols, segment_names, graph: Optional[DependencyGraph] = None) -> dict:
+    """
+    Builds the metadata linking segments with extracted symbols.
+    Cycles are allowed: each strongly connected component becomes one scheduling unit.
+
+    :param symbols: List of symbol dictionaries.
+    :param segment_names: Names of the symbols that have a segment.
+    :param graph: The dependency graph of `symbols`, if already built.
+    :return: A dict with the ordered segments, their merge order, the translation
+             waves and units, and the number of independent units per level.
+    """
     metadata = {"segments": []}
 
     # Build dependency graph
-    graph = nx.DiGraph()
-    for symbol in symbols:
-        graph.add_node(symbol["name"])
-        for dependency in symbol["dependencies"]:
-            graph.add_edge(symbol["name"], dependency)
-
-    # Topological sorting (ensuring dependency order)
-    try:
-        sorted_symbols = list(nx.topological_sort(graph))
-    except nx.NetworkXUnfeasible:
-        raise ValueError("Dependency graph contains cycles!")
+    if graph is None:
+        graph = DependencyGraph.from_symbols(symbols)
+
+    # Topological sorting of the condensed graph (ensuring dependency order)
+    condensed, members = condense_dependency_graph(graph)
+    cycles = [names for names in members if len(names) > 1]
+    if cycles:
+        logging.info(f"Dependency graph contains {len(cycles)} cycle(s), each translated as one unit")
+    sorted_symbols = [name for node in condensed.topological_order() for name in members[node]]
 
     for name in sorted_symbols:
-        if name in segment_files:
+        if name in segment_names:
             metadata["segments"].append({
                 "segment_id": name,
-                "file": segment_files[name],
                 "rust_file": f"{name}.rs",
                 "contained_symbols": [name],
-                "dependencies": list(graph.successors(name))
+                "dependencies": graph.successors(name)
             })
 
-    metadata_file = os.path.join(output_dir, "metadata.json")
-    with open(metadata_file, "w") as f:
-        json.dump(metadata, f, indent=4)
-
-    return metadata_file
\ No newline at end of file
+    units = compute_translation_units(condensed, members, segment_names)
+    metadata["sorted_segments"] = [segment["segment_id"] for segment in metadata["segments"]]
+    metadata["units"] = units
+    metadata["waves"] = [sorted(name for unit in level for name in unit) for level in units]
+    metadata["level_widths"] = [len(level) for level in units]
+    metadata["cycles"] = [[name for name in cycle if name in segment_names] for cycle in cycles]
+    return metadata
@@ -1,73 +1,88 @@
-import os
+import re
+import hashlib
 import subprocess
-import tempfile
 import logging
-import re
+from typing import List, Optional
+from django.core.cache import caches
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-def preprocess_c_file(input_code: str) -> str:
-    """
-    Preprocesses the C code using GCC's preprocessor, removing includes and system headers.
-    Expands macros and omits system includes using -nostdinc and -ffreestanding.
-    
-    Args:
-        input_code (str): The C source code to preprocess.
-    
-    Returns:
-        str: Path to the preprocessed file.
-    """
-    if not input_code:
-        raise ValueError("Input code was not provided.")
-    
-    # Define problematic macros to neutralize them
-    flags_to_ignore = [
-        "-D__attribute__(x)=",
-        "-D__filename=",
-        "-D__modes=",
-        "-D__stream=",
-        "-D__buf=",
-        "-D__has_feature(x)=0"
-    ]
-    
-    # Create a temporary directory for output
-    output_dir = tempfile.mkdtemp(prefix="preprocessed_")
-    os.chmod(output_dir, 0o755)
-    preprocessed_file = os.path.join(output_dir, "preprocessed.c")
-    
-    # Remove all #include directives from the input code
-    processed_code = re.sub(
-        r'^\s*#\s*include\s*[<"].*?[>"]\s*$', 
-        '', 
-        input_code, 
+# Define problematic macros to neutralize them
+FLAGS_TO_IGNORE = [
+    "-D__attribute__(x)=",
+    "-D__filename=",
+    "-D__modes=",
+    "-D__stream=",
+    "-D__buf=",
+    "-D__has_feature(x)=0"
+]
+
+# Build the GCC preprocessor command with adjusted flags
+PREPROCESSOR_FLAGS = [
+    "-E",             # Preprocess only
+    "-std=c99",
+    "-nostdinc",      # Exclude system includes
+    "-ffreestanding", # Assume no standard library
+    "-dD"             # Output macro definitions
+] + FLAGS_TO_IGNORE
+
+CACHE_ALIAS = "preprocessed"
+
+def preprocess_cache_key(code: str, flags: List[str]) -> str:
+    """Cache key covering the include-stripped source and the exact preprocessor flags."""
+    digest = hashlib.sha256()
+    digest.update("\0".join(flags).encode("utf-8"))
+    digest.update(b"\0\0")
+    digest.update(code.encode("utf-8"))
+    return f"cpp:{digest.hexdigest()}"
+
+def preprocess_upload_cache_key(digest: str, flags: List[str]) -> str:
+    """Cache key of an uploaded source, from the sha256 computed while it was received."""
+    key = hashlib.sha256()
+    key.update("\0".join(flags).encode("utf-8"))
+    key.update(b"\0\0")
+    key.update(digest.encode("ascii"))
+    return f"cpp:upload:{key.hexdigest()}"
+
+def strip_includes(code: str) -> str:
+    """Removes all #include directives; their targets are not available to the preprocessor."""
+    return re.sub(
+        r'^\s*#\s*include\s*[<"].*?[>"]\s*$',
+        '',
+        code,
         flags=re.MULTILINE
     )
-    
-    # Write the processed code (without includes) to a temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".c") as temp_file:
-        temp_file.write(processed_code.encode())
-        temp_file_path = temp_file.name
-    
-    # Build the GCC preprocessor command with adjusted flags
-    cmd = [
-        "gcc",
-        "-E",             # Preprocess only
-        "-std=c99",
-        "-nostdinc",      # Exclude system includes
-        "-ffreestanding", # Assume no standard library
-        "-dD"             # Output macro definitions
-    ]
-    cmd.extend(flags_to_ignore)
-    cmd.extend([temp_file_path, "-o", preprocessed_file])
-    
+
+def _memoized(cache_key: str, compute) -> str:
+    cache = caches[CACHE_ALIAS]
+    try:
+        cached = cache.get(cache_key)
+    except Exception as e:
+        logging.warning(f"Preprocessing cache lookup failed: {e}")
+        cached = None
+    if cached is not None:
+        logging.info("Preprocessing cache hit")
+        return cached
+
+    result = compute()
+    try:
+        cache.set(cache_key, result)
+    except Exception as e:
+        logging.warning(f"Preprocessing cache store failed: {e}")
+    return result
+
+def _run_preprocessor(code: str, flags: List[str]) -> str:
+    cmd = ["gcc"] + list(flags) + ["-x", "c", "-"]  # Read the source from stdin
+
     logging.info("Running command: %s", " ".join(cmd))
-    
+
     try:
-        subprocess.run(
-            cmd, 
-            check=True, 
-            stderr=subprocess.PIPE, 
-            stdout=subprocess.PIPE, 
+        completed = subprocess.run(
+            cmd,
+            input=code,
+            check=True,
+            stderr=subprocess.PIPE,
+            stdout=subprocess.PIPE,
             text=True
         )
     except subprocess.CalledProcessError as e:
@@ -76,10 +91,52 @@ def preprocess_c_file(input_code: str) -> str:
             f"Preprocessing failed:\nCommand: {' '.join(e.cmd)}\nError: {error_output}"
         )
         raise RuntimeError(f"Preprocessing failed: {error_output}") from e
-    finally:
-        os.remove(temp_file_path)
-    
-    if not os.path.isfile(preprocessed_file):
-        raise RuntimeError("Preprocessing completed but the output file was not found.")
-    
-    return preprocessed_file
\ No newline at end of file
+    return completed.stdout
+
+def preprocess_c_code(input_code: str, flags: Optional[List[str]] = None) -> str:
+    """
+    Preprocesses the C code using GCC's preprocessor, removing includes and system headers.
+    Expands macros and omits system includes using -nostdinc and -ffreestanding.
+    The source is piped through GCC's stdin and stdout, so no files are written.
+    Results are memoized by content hash and flag set, so repeated uploads (including
+    ones differing only in their #include lines) skip the gcc fork/exec.
+
+    Args:
+        input_code (str): The C source code to preprocess.
+        flags (list): Preprocessor flags, defaults to PREPROCESSOR_FLAGS.
+
+    Returns:
+        str: The preprocessed source code.
+    """
+    if not input_code:
+        raise ValueError("Input code was not provided.")
+
+    # Remove all #include directives from the input code
+    processed_code = strip_includes(input_code)
+
+    flags = PREPROCESSOR_FLAGS if flags is None else flags
+    return _memoized(preprocess_cache_key(processed_code, flags), lambda: _run_preprocessor(processed_code, flags))
+
+def preprocess_c_upload(path: str, digest: str, flags: Optional[List[str]] = None) -> str:
+    """
+    Preprocesses an uploaded source file like preprocess_c_code. The cache is keyed by
+    the digest computed during the upload, so a cache hit never reads the file.
+
+    Args:
+        path (str): The uploaded source in the job workspace.
+        digest (str): sha256 hex digest of the file's content.
+        flags (list): Preprocessor flags, defaults to PREPROCESSOR_FLAGS.
+
+    Returns:
+        str: The preprocessed source code.
+    """
+    flags = PREPROCESSOR_FLAGS if flags is None else flags
+
+    def run():
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            code = f.read()
+        if not code:
+            raise ValueError("Uploaded source is empty.")
+        return _run_preprocessor(strip_includes(code), flags)
+
+    return _memoized(preprocess_upload_cache_key(digest, flags), run)
@@ -1,42 +1,51 @@
 import os
 import logging
-from typing import List, Dict, Any
-import networkx as nx
+import threading
+from typing import List, Dict, Any, Optional
 import clang.cindex
 from clang.cindex import Config
+from .graph import DependencyGraph
 
 Config.set_library_file('/usr/lib/x86_64-linux-gnu/libclang-14.so.1')
 
-def segment_code(file: str, symbols: List[Dict[str, Any]], output_dir: str = "/tmp/output/segments/") -> Dict[str, str]:
+SYMBOL_KINDS = {
+    clang.cindex.CursorKind.FUNCTION_DECL,
+    clang.cindex.CursorKind.STRUCT_DECL,
+    clang.cindex.CursorKind.UNION_DECL,
+    # clang.cindex.CursorKind.MACRO_DEFINITION,
+}
+
+# Cursors that can make a symbol depend on another one: calls, references and type uses
+REFERENCE_KINDS = {
+    clang.cindex.CursorKind.CALL_EXPR,
+    clang.cindex.CursorKind.DECL_REF_EXPR,
+    clang.cindex.CursorKind.TYPE_REF,
+}
+
+# Per-symbol and per-segment INFO lines are costly on files with thousands of symbols,
+# so by default only a summary is logged.
+LOG_EACH_SEGMENT = os.getenv("TRANSPILER_LOG_EACH_SEGMENT", "0") == "1"
+
+# One libclang Index per worker thread, reused across jobs
+_index_local = threading.local()
+
+def get_index() -> clang.cindex.Index:
+    """Returns the calling thread's libclang Index, creating it on first use."""
+    index = getattr(_index_local, "index", None)
+    if index is None:
+        index = clang.cindex.Index.create()
+        _index_local.index = index
+    return index
+
+def split_segments(source: str, symbols: List[Dict[str, Any]]) -> Dict[str, str]:
     """
-    Segments code based on extracted symbols ensuring each segment's boundaries are within file limits.
-    Writes each segment to a separate file and returns a mapping of symbol names to file paths.
+    Cuts the source text of each symbol out of the preprocessed code.
     
-    :param file: The path to the preprocessed C file.
+    :param source: The preprocessed C code.
     :param symbols: List of symbol dictionaries.
-    :param output_dir: Directory where segments will be saved.
-    :return: A dictionary mapping symbol names to segment file paths.
+    :return: A dictionary mapping symbol names to their source text.
     """
-    # Use an absolute path to avoid potential permission issues
-    output_dir = os.path.abspath(output_dir)
-    
-    # Try to create directory with full permissions
-    try:
-        os.makedirs(output_dir, mode=0o777, exist_ok=True)
-    except Exception as e:
-        logging.error(f"Failed to create output directory {output_dir}: {e}")
-        # Fallback to using a temporary directory if directory creation fails
-        import tempfile
-        output_dir = tempfile.mkdtemp(prefix="code_segments_")
-        logging.warning(f"Using temporary directory: {output_dir}")
-
-    try:
-        with open(file, "r") as f:
-            lines = f.readlines()
-    except IOError as e:
-        logging.error(f"Error reading file {file}: {e}")
-        return {}
-
+    lines = source.splitlines(keepends=True)
     segments: Dict[str, str] = {}
     for symbol in symbols:
         start = symbol["start_line"] - 1  # Convert to 0-based index
@@ -47,82 +56,91 @@ def segment_code(file: str, symbols: List[Dict[str, Any]], output_dir: str = "/t
 
         segment_text = "".join(lines[start:end])
         segments[symbol["name"]] = segment_text
+    return segments
 
-    # Save segments to individual files
-    segment_files: Dict[str, str] = {}
-    for idx, (name, code) in enumerate(segments.items()):
-        segment_file = os.path.join(output_dir, f"segment_{idx}_{name}.c")
-        try:
-            with open(segment_file, "w") as f:
-                f.write(code)
-            segment_files[name] = segment_file
-            logging.info(f"Wrote segment for symbol {name} to {segment_file}")
-        except IOError as e:
-            logging.error(f"Failed to write segment for {name} to {segment_file}: {e}")
-
-    return segment_files
-
-def extract_symbols(file: str) -> List[Dict[str, Any]]:
+def extract_symbols(file: str, source: Optional[str] = None, declarations_only: bool = False) -> List[Dict[str, Any]]:
     """
     Extracts function definitions, structs, unions, and optionally macros from a C file using Clang AST.
     Only symbols defined in the target file are extracted.
+    The AST is walked once, iteratively. Every call, reference or type use at any depth
+    below a symbol is recorded as a dependency of its innermost enclosing symbol.
     
-    :param file: The path to the preprocessed C file.
+    :param file: The path to the preprocessed C file, or a virtual name when `source` is given.
+    :param source: The preprocessed C code; parsed from memory instead of reading `file`.
+    :param declarations_only: Skip function bodies while parsing. Much faster, but no
+                              dependencies are found inside the skipped bodies.
     :return: A list of dictionaries with symbol information.
     """
-    index = clang.cindex.Index.create()
+    unsaved_files = [(file, source)] if source is not None else None
+    options = clang.cindex.TranslationUnit.PARSE_SKIP_FUNCTION_BODIES if declarations_only else 0
     try:
-        translation_unit = index.parse(file)
+        translation_unit = get_index().parse(file, unsaved_files=unsaved_files, options=options)
     except clang.cindex.TranslationUnitLoadError as e:
         logging.error(f"Failed to parse {file}: {e}")
         return []
     
     symbols: List[Dict[str, Any]] = []
+    seen_dependencies: List[set] = []
+    main_file = os.path.abspath(file)
+    in_main_file: Dict[str, bool] = {}
+
+    # Iterative pre-order walk; each stack entry carries the index of the innermost
+    # enclosing symbol, which owns every reference found below it.
+    stack = [(child, None) for child in reversed(list(translation_unit.cursor.get_children()))]
+    while stack:
+        cursor, owner = stack.pop()
+
+        if owner is None:
+            # Process only top-level nodes that are defined in our file; their children are too
+            location_file = cursor.location.file
+            if location_file:
+                name = location_file.name
+                if name not in in_main_file:
+                    in_main_file[name] = os.path.abspath(name) == main_file
+                if not in_main_file[name]:
+                    continue
 
-    def traverse(cursor: clang.cindex.Cursor) -> None:
-        # Process only nodes that are defined in our file
-        if cursor.location.file and os.path.abspath(cursor.location.file.name) != os.path.abspath(file):
-            return
-
-        if cursor.kind in (
-            clang.cindex.CursorKind.FUNCTION_DECL,
-            clang.cindex.CursorKind.STRUCT_DECL,
-            clang.cindex.CursorKind.UNION_DECL,
-            # clang.cindex.CursorKind.MACRO_DEFINITION,
-        ):
-            symbol = {
+        kind = cursor.kind
+        if kind in SYMBOL_KINDS:
+            symbols.append({
                 "name": cursor.spelling,
-                "kind": cursor.kind.name,
+                "kind": kind.name,
                 "start_line": cursor.extent.start.line,
                 "end_line": cursor.extent.end.line,
                 "dependencies": []
-            }
-            # Extract dependencies: Filter for call expressions and declaration references
-            for child in cursor.get_children():
-                if child.kind in (clang.cindex.CursorKind.CALL_EXPR, clang.cindex.CursorKind.DECL_REF_EXPR):
-                    dep = child.spelling
-                    if dep and dep not in symbol["dependencies"]:
-                        symbol["dependencies"].append(dep)
-            
-            logging.info(f"Extracted symbol: {symbol['name']} ({symbol['kind']}) from lines {symbol['start_line']}-{symbol['end_line']}")
-            symbols.append(symbol)
-
-        for child in cursor.get_children():
-            traverse(child)
-
-    traverse(translation_unit.cursor)
+            })
+            seen_dependencies.append({cursor.spelling})
+            owner = len(symbols) - 1
+            symbol = symbols[owner]
+            if LOG_EACH_SEGMENT:
+                logging.info(f"Extracted symbol: {symbol['name']} ({symbol['kind']}) from lines {symbol['start_line']}-{symbol['end_line']}")
+        elif owner is not None and kind in REFERENCE_KINDS:
+            dep = _dependency_name(cursor)
+            if dep and dep not in seen_dependencies[owner]:
+                seen_dependencies[owner].add(dep)
+                symbols[owner]["dependencies"].append(dep)
+
+        children = list(cursor.get_children())
+        stack.extend((child, owner) for child in reversed(children))
+
+    logging.info(f"Extracted {len(symbols)} symbols from {file}")
     return symbols
 
-def build_dependency_graph(symbols: List[Dict[str, Any]]) -> nx.DiGraph:
+def _dependency_name(cursor: clang.cindex.Cursor) -> Optional[str]:
+    """Resolves a reference cursor to the name of the function, struct or union it uses."""
+    referenced = cursor.referenced
+    if referenced is None:
+        # Calls to undeclared functions have no referenced declaration
+        return cursor.spelling if cursor.kind == clang.cindex.CursorKind.CALL_EXPR else None
+    if referenced.kind in SYMBOL_KINDS:
+        return referenced.spelling
+    return None
+
+def build_dependency_graph(symbols: List[Dict[str, Any]]) -> DependencyGraph:
     """
     Builds a dependency graph using function calls and struct references.
     
     :param symbols: List of symbol dictionaries.
     :return: A directed graph representing dependencies.
     """
-    graph = nx.DiGraph()
-    for symbol in symbols:
-        graph.add_node(symbol["name"])
-        for dependency in symbol["dependencies"]:
-            graph.add_edge(symbol["name"], dependency)
-    return graph
+    return DependencyGraph.from_symbols(symbols)
@@ -0,0 +1,172 @@
+"""
+Tracing and metrics for the transpilation pipeline.
+
+Both backends are optional:
+- opentelemetry-api records spans; with opentelemetry-sdk and the OTLP exporter installed
+  and OTEL_EXPORTER_OTLP_ENDPOINT set, setup_tracing() exports them.
+- prometheus_client records histograms, served at /transpiler/metrics/ to callers holding
+  METRICS_TOKEN. Stages run in the Celery workers while the endpoint is served by the web
+  process, so both set PROMETHEUS_MULTIPROC_DIR to the same directory (a shared volume in
+  docker-compose.yml) and the endpoint aggregates the files every process writes there.
+Without them every call here is a no-op apart from the stage duration log line.
+"""
+import os
+import time
+import logging
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+try:
+    from opentelemetry import trace, context as otel_context
+    from opentelemetry.trace import NonRecordingSpan, SpanContext, SpanKind, Status, StatusCode, TraceFlags
+except ImportError:
+    trace = None
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Histogram
+except ImportError:
+    prometheus_client = None
+
+logger = logging.getLogger(__name__)
+
+TRACER_NAME = "salvage.transpiler"
+
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+MODEL_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+
+if prometheus_client is not None:
+    STAGE_DURATION = Histogram(
+        "salvage_stage_duration_seconds", "Wall time of a pipeline task.",
+        ["stage", "outcome"], buckets=STAGE_BUCKETS,
+    )
+    MODEL_REQUEST_DURATION = Histogram(
+        "salvage_model_request_duration_seconds", "Model request latency, including retries.",
+        ["outcome"], buckets=MODEL_BUCKETS,
+    )
+    MODEL_REQUEST_SEGMENTS = Histogram(
+        "salvage_model_request_segments", "Segments translated by one model request.",
+        buckets=(1, 2, 4, 8, 12, 16, 20, 32),
+    )
+    MODEL_TOKENS = Counter("salvage_model_tokens_total", "Tokens reported by the model.", ["kind"])
+
+# Open spans of running tasks: task id -> (span, context token, start time)
+_task_spans: Dict[str, tuple] = {}
+
+
+def setup_tracing(service_name: str) -> None:
+    """Installs an OTLP-exporting tracer provider when the SDK and an endpoint are available."""
+    if trace is None or not os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        return
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    except ImportError as e:
+        logger.warning(f"Tracing not exported, OpenTelemetry SDK unavailable: {str(e)}")
+        return
+    provider = TracerProvider(resource=Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", service_name)}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+
+
+def _job_context(job_id: Optional[str]):
+    """
+    A parent context whose trace id is the job id (a uuid4 hex string is exactly a
+    128-bit trace id), so every task of a job lands in the same trace.
+    """
+    if not job_id:
+        return None
+    try:
+        trace_id = int(job_id, 16)
+    except ValueError:
+        return None
+    parent = SpanContext(
+        trace_id=trace_id,
+        span_id=trace_id & 0xFFFFFFFFFFFFFFFF or 1,
+        is_remote=True,
+        trace_flags=TraceFlags(TraceFlags.SAMPLED),
+    )
+    return trace.set_span_in_context(NonRecordingSpan(parent))
+
+
+def start_task_span(task_id: str, stage: str, job_id: Optional[str]) -> None:
+    """Opens the span of a pipeline task and makes it current until end_task_span."""
+    span = token = None
+    if trace is not None:
+        span = trace.get_tracer(TRACER_NAME).start_span(
+            f"salvage.{stage}", context=_job_context(job_id), kind=SpanKind.CONSUMER,
+            attributes={"salvage.job_id": job_id or "", "salvage.stage": stage, "celery.task_id": task_id},
+        )
+        token = otel_context.attach(trace.set_span_in_context(span))
+    _task_spans[task_id] = (span, token, time.perf_counter())
+
+
+def end_task_span(task_id: str, stage: str, job_id: Optional[str], state: Optional[str], exception=None) -> None:
+    """Closes the span opened by start_task_span and records the task's duration."""
+    entry = _task_spans.pop(task_id, None)
+    if entry is None:
+        return
+    span, token, started = entry
+    duration = time.perf_counter() - started
+    outcome = "error" if exception is not None or state == "FAILURE" else "ok"
+    if span is not None:
+        if exception is not None:
+            span.record_exception(exception)
+            span.set_status(Status(StatusCode.ERROR, str(exception)))
+        span.end()
+        otel_context.detach(token)
+    if prometheus_client is not None:
+        STAGE_DURATION.labels(stage=stage, outcome=outcome).observe(duration)
+    logger.info(f"Job {job_id or '-'}: {stage} {outcome} in {duration:.3f}s")
+
+
+class _NoopSpan:
+    def set_attribute(self, key, value):
+        pass
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """A child span of the current one; yields an object with set_attribute."""
+    if trace is None:
+        yield _NoopSpan()
+        return
+    with trace.get_tracer(TRACER_NAME).start_as_current_span(name, attributes=attributes) as current:
+        yield current
+
+
+def record_model_request(duration: float, segments: int, outcome: str, usage=None) -> None:
+    """Records one model request; `usage` is the response's usage_metadata, if any."""
+    if prometheus_client is None:
+        return
+    MODEL_REQUEST_DURATION.labels(outcome=outcome).observe(duration)
+    MODEL_REQUEST_SEGMENTS.observe(segments)
+    for kind, attribute in (("prompt", "prompt_token_count"), ("response", "candidates_token_count")):
+        count = getattr(usage, attribute, None)
+        if count:
+            MODEL_TOKENS.labels(kind=kind).inc(count)
+
+
+def mark_process_dead(pid: int) -> None:
+    """Lets the multiprocess collector drop the live metrics of an exited worker process."""
+    if prometheus_client is not None and os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
+
+
+def render_metrics() -> Optional[tuple]:
+    """
+    Returns the Prometheus exposition as (body, content_type), aggregated over worker
+    processes in multiprocess mode; None if prometheus_client is not installed.
+    """
+    if prometheus_client is None:
+        return None
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
@@ -0,0 +1,102 @@
+import os
+import re
+from typing import Any, List, Optional, Sequence, Tuple
+
+# Rough characters-per-token ratio used to budget prompts without a tokenizer round trip.
+CHARS_PER_TOKEN = 4
+
+# Upper bound on the C input packed into a single batched request.
+BATCH_TOKEN_BUDGET = int(os.getenv("TRANSLATION_BATCH_TOKEN_BUDGET", 6000))
+# Segments larger than this are always translated on their own.
+BATCH_MAX_SEGMENT_TOKENS = int(os.getenv("TRANSLATION_BATCH_MAX_SEGMENT_TOKENS", 500))
+# Hard cap on segments per request, so one malformed response cannot cost too many retries.
+BATCH_MAX_SEGMENTS = int(os.getenv("TRANSLATION_BATCH_MAX_SEGMENTS", 20))
+
+SEGMENT_MARKER = "// @@SALVAGE_SEGMENT {index}@@"
+MARKER_PATTERN = re.compile(r'^[ \t]*//[ \t]*@@SALVAGE_SEGMENT[ \t]+(\d+)[ \t]*@@[ \t]*$', re.MULTILINE)
+FENCE_PATTERN = re.compile(r'^[ \t]*```[\w+-]*[ \t]*$', re.MULTILINE)
+
+
+def estimate_tokens(char_count: int) -> int:
+    """Estimates the number of prompt tokens needed for `char_count` characters of code."""
+    return char_count // CHARS_PER_TOKEN + 1
+
+
+def pack_batches(
+    segments: Sequence[Tuple[Any, int]],
+    token_budget: int = BATCH_TOKEN_BUDGET,
+    max_segment_tokens: int = BATCH_MAX_SEGMENT_TOKENS,
+    max_segments: int = BATCH_MAX_SEGMENTS,
+) -> List[List[Any]]:
+    """
+    Packs small segments into batches that fit a token budget, preserving their order.
+    Segments above `max_segment_tokens` get a batch of their own.
+
+    :param segments: Sequence of (key, estimated_tokens) pairs.
+    :param token_budget: Maximum estimated tokens of C input per batch.
+    :param max_segment_tokens: Largest segment that may share a batch with others.
+    :param max_segments: Maximum number of segments per batch.
+    :return: A list of batches, each a list of segment keys.
+    """
+    batches: List[List[Any]] = []
+    current: List[Any] = []
+    current_tokens = 0
+
+    for key, tokens in segments:
+        if tokens > max_segment_tokens:
+            # Close the pending batch first so batches stay in input order
+            if current:
+                batches.append(current)
+                current, current_tokens = [], 0
+            batches.append([key])
+            continue
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_segments):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(key)
+        current_tokens += tokens
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def format_batch(c_segments: Sequence[str]) -> str:
+    """Joins C segments into one prompt body, each preceded by its numbered marker line."""
+    parts = []
+    for index, c_code in enumerate(c_segments):
+        parts.append(SEGMENT_MARKER.format(index=index))
+        parts.append(c_code.strip("\n"))
+    return "\n".join(parts)
+
+
+def _strip_fences(text: str) -> str:
+    return FENCE_PATTERN.sub("", text).strip()
+
+
+def split_batch_output(text: str, count: int) -> List[Optional[str]]:
+    """
+    Splits a batched model response back into per-segment Rust code.
+
+    :param text: The raw model response.
+    :param count: The number of segments sent in the batch.
+    :return: A list of length `count`; entries whose marker is missing, duplicated
+             or empty are None so the caller can translate them individually.
+    """
+    results: List[Optional[str]] = [None] * count
+    seen = set()
+    matches = list(MARKER_PATTERN.finditer(text))
+
+    for position, match in enumerate(matches):
+        index = int(match.group(1))
+        end = matches[position + 1].start() if position + 1 < len(matches) else len(text)
+        if index >= count:
+            continue
+        if index in seen:
+            results[index] = None
+            continue
+        seen.add(index)
+        body = _strip_fences(text[match.end():end])
+        results[index] = body or None
+
+    return results
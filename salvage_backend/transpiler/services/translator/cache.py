@@ -0,0 +1,100 @@
+import re
+import hashlib
+import logging
+from typing import List, Optional
+from django.conf import settings
+from django.core.cache import caches
+
+from .translator import MODEL_NAME, PROMPT_VERSION
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = "translations"
+
+# Outputs starting with these markers are failures reported by Transpiler and
+# must never be served from the cache.
+ERROR_MARKERS = ("// Error:", "// Transpilation Error:", "// Safety Error:")
+
+# gcc linemarkers (e.g. `# 12 "/tmp/tmpab12cd.c"`) embed temp file names that
+# differ between uploads of the same source.
+LINEMARKER_PATTERN = re.compile(r'^#\s*\d+\s+".*"')
+
+
+def normalize_segment(c_code: str) -> str:
+    """
+    Normalizes a C segment so that formatting-only differences map to the same cache entry.
+    Strips linemarkers, surrounding whitespace on each line and blank lines.
+
+    :param c_code: The C source of a single segment.
+    :return: The normalized segment text.
+    """
+    lines = []
+    for line in c_code.splitlines():
+        line = line.strip()
+        if not line or LINEMARKER_PATTERN.match(line):
+            continue
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def translation_digest(c_code: str, context: Optional[List[str]] = None) -> str:
+    """
+    Hashes a segment together with the callee signatures of its prompt.
+
+    :param c_code: The C source of a single segment.
+    :param context: Callee signatures included in the segment's prompt, if any.
+    :return: The sha256 hex digest of the normalized segment and context.
+    """
+    content = normalize_segment(c_code)
+    if context:
+        content += "\0" + "\n".join(sorted(context))
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def translation_key(
+    c_code: str,
+    context: Optional[List[str]] = None,
+    model_name: str = MODEL_NAME,
+    prompt_version: str = PROMPT_VERSION,
+) -> str:
+    """
+    Builds the content-addressed cache key for a segment.
+
+    :param c_code: The C source of a single segment.
+    :param context: Callee signatures included in the segment's prompt, if any.
+    :param model_name: The model used for the translation.
+    :param prompt_version: The version of the prompt template used for the translation.
+    :return: A cache key unique to the normalized segment, context, model and prompt.
+    """
+    return f"rust:{model_name}:{prompt_version}:{translation_digest(c_code, context)}"
+
+
+def get_cached_translation(c_code: str, context: Optional[List[str]] = None) -> Optional[str]:
+    """Returns the cached Rust translation of a segment, or None on a miss."""
+    try:
+        rust_code = caches[CACHE_ALIAS].get(translation_key(c_code, context))
+    except Exception as e:
+        logger.warning(f"Translation cache lookup failed: {e}")
+        return None
+    if rust_code is not None:
+        logger.info("Translation cache hit")
+    return rust_code
+
+
+def store_translation(c_code: str, rust_code: str, context: Optional[List[str]] = None) -> bool:
+    """
+    Stores a successful translation in the cache.
+    Failed translations and entries above TRANSLATION_CACHE_MAX_ENTRY_BYTES are not cached.
+
+    :return: True if the translation was stored.
+    """
+    if not rust_code or rust_code.startswith(ERROR_MARKERS):
+        return False
+    if len(rust_code.encode("utf-8")) > settings.TRANSLATION_CACHE_MAX_ENTRY_BYTES:
+        return False
+    try:
+        caches[CACHE_ALIAS].set(translation_key(c_code, context), rust_code)
+    except Exception as e:
+        logger.warning(f"Translation cache store failed: {e}")
+        return False
+    return True
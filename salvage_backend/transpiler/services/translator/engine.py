@@ -0,0 +1,279 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+import contextvars
+from typing import Callable, List, Optional
+from google.api_core import exceptions as google_exceptions
+
+from .batching import estimate_tokens
+from .. import telemetry
+from .translator import Transpiler, get_transpiler
+
+logger = logging.getLogger(__name__)
+
+# Limits apply per worker process; divide the account quota by the number of processes.
+MAX_IN_FLIGHT = int(os.getenv("TRANSLATION_MAX_IN_FLIGHT", 64))
+REQUESTS_PER_MINUTE = int(os.getenv("TRANSLATION_REQUESTS_PER_MINUTE", 1000))
+TOKENS_PER_MINUTE = int(os.getenv("TRANSLATION_TOKENS_PER_MINUTE", 1000000))
+MAX_RETRIES = int(os.getenv("TRANSLATION_MAX_RETRIES", 6))
+BASE_BACKOFF = float(os.getenv("TRANSLATION_BASE_BACKOFF", 1.0))
+MAX_BACKOFF = float(os.getenv("TRANSLATION_MAX_BACKOFF", 60.0))
+
+RATE_LIMIT_ERRORS = (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)
+TRANSIENT_ERRORS = RATE_LIMIT_ERRORS + (
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+)
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, amount: float = 1):
+        """Waits until `amount` tokens are available and takes them."""
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def adjust(self, amount: float):
+        """Corrects the balance once the real cost of a request is known; may go negative."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class TranslationEngine:
+    """
+    Keeps up to MAX_IN_FLIGHT model requests running concurrently on one event loop.
+    Requests and tokens are throttled by token buckets. Rate-limit responses raise a
+    shared backoff that pauses every request, and successes gradually lower it again.
+    """
+
+    def __init__(
+        self,
+        transpiler: Transpiler,
+        max_in_flight: int = MAX_IN_FLIGHT,
+        requests_per_minute: int = REQUESTS_PER_MINUTE,
+        tokens_per_minute: int = TOKENS_PER_MINUTE,
+    ):
+        self.transpiler = transpiler
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.backoff = 0.0
+        self.paused_until = 0.0
+
+    async def _wait_for_cooldown(self):
+        delay = self.paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _on_rate_limited(self) -> float:
+        self.backoff = min(MAX_BACKOFF, max(BASE_BACKOFF, self.backoff * 2))
+        # Jitter keeps the paused requests from retrying in lockstep.
+        delay = random.uniform(self.backoff / 2, self.backoff)
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+        return delay
+
+    def _on_success(self):
+        self.backoff = self.backoff / 2 if self.backoff > BASE_BACKOFF else 0.0
+
+    async def _generate(self, prompt: str, expected_tokens: int, segments: int = 1) -> str:
+        started = time.monotonic()
+        outcome, usage = "error", None
+        with telemetry.span("salvage.model_request", **{"salvage.segments": segments, "salvage.expected_tokens": expected_tokens}) as request_span:
+            try:
+                for attempt in range(MAX_RETRIES + 1):
+                    await self._wait_for_cooldown()
+                    await self.request_bucket.acquire()
+                    await self.token_bucket.acquire(expected_tokens)
+                    try:
+                        async with self.semaphore:
+                            response = await self.transpiler.generate_async(prompt)
+                    except TRANSIENT_ERRORS as e:
+                        if attempt == MAX_RETRIES:
+                            raise
+                        if isinstance(e, RATE_LIMIT_ERRORS):
+                            delay = self._on_rate_limited()
+                        else:
+                            delay = random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt))
+                        logger.warning("Model request failed (%s), retrying in %.1fs", type(e).__name__, delay)
+                        await asyncio.sleep(delay)
+                        continue
+
+                    self._on_success()
+                    usage = getattr(response, "usage_metadata", None)
+                    if usage is not None and getattr(usage, "total_token_count", None):
+                        self.token_bucket.adjust(usage.total_token_count - expected_tokens)
+                        request_span.set_attribute("salvage.prompt_tokens", getattr(usage, "prompt_token_count", 0) or 0)
+                        request_span.set_attribute("salvage.response_tokens", getattr(usage, "candidates_token_count", 0) or 0)
+                    request_span.set_attribute("salvage.attempts", attempt + 1)
+                    outcome = "ok"
+                    return response.text
+            finally:
+                telemetry.record_model_request(time.monotonic() - started, segments, outcome, usage)
+
+    async def translate(self, c_segments: List[str], context: Optional[List[str]] = None) -> List[str]:
+        """Translates one batch of segments; segments lost from a batch response are retried alone."""
+        if len(c_segments) == 1 and not c_segments[0].strip():
+            return ["// Error: Empty input code"]
+
+        prompt = self.transpiler.build_prompt(c_segments, context)
+        # Budget for the prompt plus a Rust answer about as long as the C input.
+        expected_tokens = estimate_tokens(len(prompt)) + estimate_tokens(sum(len(c) for c in c_segments))
+        try:
+            text = await self._generate(prompt, expected_tokens, len(c_segments))
+            pieces = self.transpiler.parse_response(text, len(c_segments))
+        except Exception as e:
+            logger.error("Transpilation failed: %s", str(e))
+            return [f"// Transpilation Error: {str(e)}"] * len(c_segments)
+
+        missing = [i for i, piece in enumerate(pieces) if piece is None]
+        if missing:
+            logger.warning("%d segment(s) missing from batch response, retranslating them alone", len(missing))
+            retried = await asyncio.gather(*(self.translate([c_segments[i]], context) for i in missing))
+            for i, result in zip(missing, retried):
+                pieces[i] = result[0]
+        return pieces
+
+    async def translate_batches(
+        self,
+        batches: List[List[str]],
+        contexts: Optional[List[List[str]]] = None,
+        on_batch: Optional[Callable[[int, List[str]], None]] = None,
+    ) -> List[List[str]]:
+        """
+        Translates every batch concurrently, returning results in input order.
+        `on_batch(index, results)` is called as soon as each batch finishes; it runs in
+        the loop's executor so a blocking callback does not stall the other requests.
+        """
+        contexts = contexts or [None] * len(batches)
+
+        async def run(index: int, batch: List[str], context: Optional[List[str]]) -> List[str]:
+            results = await self.translate(batch, context)
+            if on_batch:
+                try:
+                    await asyncio.get_running_loop().run_in_executor(None, on_batch, index, results)
+                except Exception as e:
+                    logger.warning("Batch callback failed: %s", str(e))
+            return results
+
+        return list(await asyncio.gather(*(run(i, batch, context) for i, (batch, context) in enumerate(zip(batches, contexts)))))
+
+
+class _EngineRunner:
+    """Owns a background event loop so synchronous Celery tasks can share one engine."""
+
+    def __init__(self, transpiler: Optional[Transpiler] = None, **engine_options):
+        # Resolved before the loop starts, so a failing initialization leaves no thread behind
+        transpiler = transpiler or get_transpiler()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="translation-engine", daemon=True)
+        self.thread.start()
+        try:
+            self.engine = asyncio.run_coroutine_threadsafe(self._create_engine(transpiler, engine_options), self.loop).result()
+        except Exception:
+            self.stop()
+            raise
+
+    async def _create_engine(self, transpiler: Transpiler, engine_options: dict) -> TranslationEngine:
+        return TranslationEngine(transpiler, **engine_options)
+
+    def stop(self):
+        """Stops the event loop and waits for its thread to exit."""
+        if self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join(timeout=5)
+        # After a fork the loop still looks running, but its thread is gone; leave it be
+        if not self.loop.is_running():
+            self.loop.close()
+
+    def run(self, coroutine_factory):
+        """
+        Runs `coroutine_factory(engine)` on the engine loop and blocks until it completes.
+        The caller's context variables, including the current trace span, carry over.
+        """
+        caller_context = contextvars.copy_context()
+
+        async def in_caller_context():
+            # The task runs in its own copy of the loop's context, so this stays local to it
+            for variable, value in caller_context.items():
+                variable.set(value)
+            return await coroutine_factory(self.engine)
+
+        return asyncio.run_coroutine_threadsafe(in_caller_context(), self.loop).result()
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_engine_runner() -> _EngineRunner:
+    """Returns the process-wide engine runner, starting its event loop on first use."""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = _EngineRunner()
+        return _runner
+
+
+def start_engine_runner(transpiler: Optional[Transpiler] = None, **engine_options) -> _EngineRunner:
+    """
+    Replaces the process-wide engine runner with one driving `transpiler`, e.g. a local
+    stub for benchmarks. `engine_options` are passed on to TranslationEngine.
+    """
+    global _runner
+    reset_engine_runner()
+    runner = _EngineRunner(transpiler, **engine_options)
+    with _runner_lock:
+        _runner = runner
+    return runner
+
+
+def reset_engine_runner():
+    """Stops the process-wide engine loop, e.g. in a freshly forked worker."""
+    global _runner
+    with _runner_lock:
+        if _runner is not None:
+            _runner.stop()
+        _runner = None
+
+
+def translate_batches(
+    batches: List[List[str]],
+    contexts: Optional[List[List[str]]] = None,
+    on_batch: Optional[Callable[[int, List[str]], None]] = None,
+) -> List[List[str]]:
+    """
+    Synchronous entry point: translates batches of C segments on the shared engine.
+
+    :param batches: Lists of C segments, one model request per list.
+    :param contexts: Optional callee signatures to include in each batch's prompt.
+    :param on_batch: Called with a batch's index and results as soon as it is translated.
+    :return: Rust code for every segment, in the same shape as `batches`.
+    """
+    if not batches:
+        return []
+    return get_engine_runner().run(lambda engine: engine.translate_batches(batches, contexts, on_batch))
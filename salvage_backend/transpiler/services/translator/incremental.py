@@ -0,0 +1,74 @@
+import hashlib
+from typing import Dict, List, Optional
+
+from .cache import ERROR_MARKERS, normalize_segment
+from .translator import MODEL_NAME, PROMPT_VERSION
+
+
+def compute_fingerprints(
+    c_codes: Dict[str, str],
+    dependencies: Dict[str, List[str]],
+    waves: List[List[str]],
+) -> Dict[str, str]:
+    """
+    Computes a fingerprint per segment covering its own text and the fingerprints of the
+    segments it depends on, so a change to a callee also changes all of its callers.
+
+    :param c_codes: Mapping of segment names to C code.
+    :param dependencies: Mapping of segment names to the names they depend on.
+    :param waves: Segment names grouped by dependency level, callees first.
+    :return: Mapping of segment names to hex digests.
+    """
+    text_hashes = {
+        name: hashlib.sha256(normalize_segment(code).encode("utf-8")).hexdigest()
+        for name, code in c_codes.items()
+    }
+    ordered = [name for wave in waves for name in wave if name in c_codes]
+    scheduled = set(ordered)
+    ordered += [name for name in c_codes if name not in scheduled]
+
+    fingerprints: Dict[str, str] = {}
+    for name in ordered:
+        digest = hashlib.sha256(text_hashes[name].encode("utf-8"))
+        for dependency in sorted(set(dependencies.get(name, []))):
+            if dependency == name or dependency not in c_codes:
+                continue
+            # A dependency not fingerprinted yet (e.g. inside a cycle) contributes its text hash.
+            digest.update(fingerprints.get(dependency, text_hashes[dependency]).encode("utf-8"))
+        fingerprints[name] = digest.hexdigest()
+    return fingerprints
+
+
+def reusable_translations(fingerprints: Dict[str, str], manifest: Optional[dict]) -> Dict[str, str]:
+    """
+    Selects the translations of a previous run that are still valid.
+
+    :param fingerprints: Fingerprints of the current run's segments.
+    :param manifest: The manifest stored by the previous run, if any.
+    :return: Mapping of segment names to previously translated Rust code.
+    """
+    if not manifest:
+        return {}
+    if manifest.get("model") != MODEL_NAME or manifest.get("prompt_version") != PROMPT_VERSION:
+        return {}
+
+    previous = manifest.get("segments", {})
+    reused = {}
+    for name, fingerprint in fingerprints.items():
+        entry = previous.get(name)
+        if entry and entry.get("fingerprint") == fingerprint:
+            reused[name] = entry["rust"]
+    return reused
+
+
+def build_manifest(fingerprints: Dict[str, str], rust_codes: Dict[str, str]) -> dict:
+    """Builds the manifest stored for the next incremental run; failed segments are left out."""
+    return {
+        "model": MODEL_NAME,
+        "prompt_version": PROMPT_VERSION,
+        "segments": {
+            name: {"fingerprint": fingerprints[name], "rust": rust_code}
+            for name, rust_code in rust_codes.items()
+            if name in fingerprints and not rust_code.startswith(ERROR_MARKERS)
+        },
+    }
@@ -0,0 +1,130 @@
+import os
+import logging
+from typing import Callable, Dict, List, Optional
+
+from .batching import estimate_tokens, pack_batches
+from .cache import ERROR_MARKERS, get_cached_translation, store_translation
+from .engine import translate_batches
+from .store import TranslationStore
+
+logger = logging.getLogger(__name__)
+
+# Caps the callee signatures added to a single prompt.
+MAX_CONTEXT_SIGNATURES = int(os.getenv("TRANSLATION_MAX_CONTEXT_SIGNATURES", 40))
+
+
+def _callee_context(name: str, dependencies: Dict[str, List[str]], signatures: Dict[str, List[str]]) -> List[str]:
+    context = []
+    for dependency in dependencies.get(name, []):
+        for signature in signatures.get(dependency, []):
+            if signature not in context:
+                context.append(signature)
+    return context[:MAX_CONTEXT_SIGNATURES]
+
+
+def _merge_contexts(contexts: List[List[str]]) -> List[str]:
+    merged = []
+    for context in contexts:
+        for signature in context:
+            if signature not in merged:
+                merged.append(signature)
+    return merged[:MAX_CONTEXT_SIGNATURES]
+
+
+def translate_in_waves(
+    c_codes: Dict[str, str],
+    dependencies: Dict[str, List[str]],
+    waves: List[List[str]],
+    reuse: Optional[Dict[str, str]] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    on_segment: Optional[Callable[[str, str], None]] = None,
+    units: Optional[List[List[List[str]]]] = None,
+    store: Optional[TranslationStore] = None,
+) -> Dict[str, str]:
+    """
+    Translates segments wave by wave so callers are prompted with the Rust signatures
+    of callees translated in earlier waves. Segments within a wave run concurrently.
+    When `units` is given, the segments of each unit (a dependency cycle) always share
+    one request, so the model sees the whole cycle at once.
+
+    :param c_codes: Mapping of segment names to C code.
+    :param dependencies: Mapping of segment names to the names they depend on.
+    :param waves: Segment names grouped by dependency level, callees first.
+    :param reuse: Rust code from a previous run for segments known to be unchanged.
+    :param on_progress: Called after every wave with the number of segments done and the total.
+    :param on_segment: Called with a segment's name and Rust code as soon as it is available,
+                       which for translated segments is when their batch completes.
+    :param units: The waves split into units of segments to translate together, overriding `waves`.
+    :param store: Persistent translations to consult after cache misses; new translations
+                  are added to it, to be written when the caller flushes it.
+    :return: Mapping of segment names to Rust code.
+    """
+    from transpiler.services.postprocessor.postprocess import extract_function_signatures
+
+    if units is None:
+        units = [[[name] for name in wave] for wave in waves]
+    scheduled = {name for level in units for unit in level for name in unit}
+    leftover = [name for name in c_codes if name not in scheduled]
+    if leftover:
+        units = units + [[[name] for name in leftover]]
+
+    reuse = reuse or {}
+    rust_codes: Dict[str, str] = {}
+    signatures: Dict[str, List[str]] = {}
+
+    for level, wave_units in enumerate(units):
+        names = [name for unit in wave_units for name in unit if name in c_codes]
+        contexts = {name: _callee_context(name, dependencies, signatures) for name in names}
+
+        pending = set()
+        for name in names:
+            rust_code = reuse.get(name)
+            if rust_code is None:
+                rust_code = get_cached_translation(c_codes[name], contexts[name])
+            if rust_code is None:
+                pending.add(name)
+                continue
+            rust_codes[name] = rust_code
+            if on_segment:
+                on_segment(name, rust_code)
+
+        if store and pending:
+            stored = store.lookup({name: (c_codes[name], contexts[name]) for name in pending})
+            for name, rust_code in stored.items():
+                pending.discard(name)
+                rust_codes[name] = rust_code
+                store_translation(c_codes[name], rust_code, contexts[name])
+                if on_segment:
+                    on_segment(name, rust_code)
+
+        pending_units = [[name for name in unit if name in pending] for unit in wave_units]
+        unit_batches = pack_batches([
+            (unit, estimate_tokens(sum(len(c_codes[name]) for name in unit)))
+            for unit in pending_units if unit
+        ])
+        batches = [[name for unit in batch for name in unit] for batch in unit_batches]
+
+        def batch_done(index: int, translated: List[str]):
+            for name, rust_code in zip(batches[index], translated):
+                store_translation(c_codes[name], rust_code, contexts[name])
+                if store:
+                    store.add(c_codes[name], rust_code, contexts[name])
+                if on_segment:
+                    on_segment(name, rust_code)
+
+        results = translate_batches(
+            [[c_codes[name] for name in batch] for batch in batches],
+            [_merge_contexts([contexts[name] for name in batch]) for batch in batches],
+            on_batch=batch_done,
+        )
+        for batch, translated in zip(batches, results):
+            rust_codes.update(zip(batch, translated))
+
+        for name in names:
+            if not rust_codes[name].startswith(ERROR_MARKERS):
+                signatures[name] = extract_function_signatures(rust_codes[name])
+        logger.info(f"Translated wave {level + 1}/{len(units)}: {len(names)} segments in {len(wave_units)} units, {len(pending)} requested")
+        if on_progress:
+            on_progress(len(rust_codes), len(c_codes))
+
+    return rust_codes
@@ -0,0 +1,81 @@
+import os
+import logging
+from typing import Dict, List, Optional, Tuple
+from django.db import DatabaseError
+
+from .cache import ERROR_MARKERS, translation_digest
+from .translator import MODEL_NAME, PROMPT_VERSION
+
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT, and content hashes per lookup query.
+STORE_BATCH_SIZE = int(os.getenv("TRANSLATION_STORE_BATCH_SIZE", 500))
+
+
+class TranslationStore:
+    """
+    Segment translations persisted in the SegmentTranslation table, shared across users.
+    Lookups query the table directly; new translations are buffered during a job and
+    written by flush() in one bulk insert, skipping rows another job already stored.
+    """
+
+    def __init__(self, model_name: str = MODEL_NAME, prompt_version: str = PROMPT_VERSION):
+        self.model_name = model_name
+        self.prompt_version = prompt_version
+        self.pending: Dict[str, str] = {}
+
+    def lookup(self, segments: Dict[str, Tuple[str, Optional[List[str]]]]) -> Dict[str, str]:
+        """
+        Finds stored translations.
+
+        :param segments: Mapping of segment names to (C code, prompt context).
+        :return: Mapping of the names found to their Rust code.
+        """
+        from api.models import SegmentTranslation
+
+        digests = {name: translation_digest(c_code, context) for name, (c_code, context) in segments.items()}
+        unique = list(set(digests.values()))
+        found: Dict[str, str] = {}
+        try:
+            for i in range(0, len(unique), STORE_BATCH_SIZE):
+                found.update(SegmentTranslation.objects.filter(
+                    content_hash__in=unique[i:i + STORE_BATCH_SIZE],
+                    model_name=self.model_name,
+                    prompt_version=self.prompt_version,
+                ).values_list("content_hash", "rust_code"))
+        except DatabaseError as e:
+            logger.warning(f"Translation store lookup failed: {str(e)}")
+            return {}
+        return {name: found[digest] for name, digest in digests.items() if digest in found}
+
+    def add(self, c_code: str, rust_code: str, context: Optional[List[str]] = None) -> None:
+        """Buffers a successful translation for the next flush(); failures are never stored."""
+        if rust_code and not rust_code.startswith(ERROR_MARKERS):
+            self.pending[translation_digest(c_code, context)] = rust_code
+
+    def flush(self) -> int:
+        """
+        Inserts the buffered translations.
+
+        :return: The number of translations written (or already present).
+        """
+        from api.models import SegmentTranslation
+
+        if not self.pending:
+            return 0
+        rows = [
+            SegmentTranslation(
+                content_hash=digest,
+                model_name=self.model_name,
+                prompt_version=self.prompt_version,
+                rust_code=rust_code,
+            )
+            for digest, rust_code in self.pending.items()
+        ]
+        try:
+            SegmentTranslation.objects.bulk_create(rows, batch_size=STORE_BATCH_SIZE, ignore_conflicts=True)
+        except DatabaseError as e:
+            logger.warning(f"Translation store insert failed: {str(e)}")
+            return 0
+        self.pending = {}
+        return len(rows)
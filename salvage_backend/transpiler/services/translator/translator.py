@@ -1,13 +1,84 @@
 import google.generativeai as genai
 import os
+import time
+import hashlib
 import logging
+import threading
+from typing import List, Optional
 from dotenv import load_dotenv
 
+from .batching import format_batch, split_batch_output
+
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+MODEL_NAME = "gemini-1.5-flash-latest"
+
+# How long (in seconds) a successful model availability check stays valid.
+MODEL_VERIFY_TTL = int(os.getenv("MODEL_VERIFY_TTL", 3600))
+# How long to wait before retrying a refresh of that check that failed.
+MODEL_VERIFY_RETRY = int(os.getenv("MODEL_VERIFY_RETRY", 60))
+
+PROMPT_TEMPLATE = """Convert the following C code to Rust, ensuring complete safety:
+
+        {c_code}
+
+        STRICT REQUIREMENTS:
+        - Maintain **all functionality** of the original C code.
+        - Use **Rust's ownership model** to handle memory safely.
+        - **NO UNSAFE BLOCKS OR RAW POINTERS.** (e.g., `unsafe {{ }}` is forbidden)
+        - Replace manual memory allocation (`malloc`, `free`) with **Rust's `Box`, `Vec`, or Rc/Arc` as appropriate.
+        - Use **Result, Option, or meaningful error handling** instead of returning `NULL` or `-1`.
+        - Avoid **manual memory management**, favor **RAII principles**.
+        - Use **borrowed references (`&T`, `&mut T`) when applicable** instead of raw pointers (`*mut T`, `*const T`).
+        - Convert loops (`for`, `while`) idiomatically, using **iterators instead of indexed loops** where appropriate.
+        - Use **Rust's standard library features** (e.g., `String`, `Vec<T>`, `HashMap`) instead of C-style arrays and manual memory allocation.
+        - Ensure **thread safety** if applicable by using **Arc, Mutex, or RwLock** where necessary.
+        - NO extra comments or explanations in the output.
+        - Output **only** the Rust code.
+
+        ### BAD EXAMPLES (REJECT):
+        - Usage of `unsafe {{ ... }}`.
+        - Raw pointer manipulation (`*mut`, `*const`).
+        - Manual memory allocation (`std::alloc::alloc`, `std::alloc::dealloc`).
+        - Null pointer handling (`std::ptr::null_mut()`).
+
+        ### GOOD EXAMPLES:
+        - Using `Box::new(...)` instead of `malloc/free`.
+        - Using `Vec<T>` instead of C-style arrays.
+        - Using `Option<T>` instead of `NULL`.
+        - Using `Result<T, E>` for proper error handling.
+
+        **STRICTLY FOLLOW THESE RULES. Any deviation will result in incorrect output.**"""
+
+BATCH_INSTRUCTIONS = """
+
+        BATCH FORMAT:
+        - The C code above contains {count} independent segments. Each one starts with a line of the form `// @@SALVAGE_SEGMENT <n>@@`.
+        - Translate every segment separately and in the same order.
+        - Before the Rust code of each segment, output its marker line exactly as given, e.g. `// @@SALVAGE_SEGMENT 0@@`.
+        - Marker lines are the only comments allowed in the output."""
+
+CONTEXT_INSTRUCTIONS = """
+
+        ALREADY TRANSLATED DEPENDENCIES:
+        - The following Rust signatures were produced for functions this code calls.
+        - Call them with exactly these names, parameter types and return types; do not redefine them.
+{signatures}"""
+
+# Changes whenever the prompt wording changes, so cached translations produced
+# by an older prompt are never served for a newer one.
+PROMPT_VERSION = hashlib.sha256(
+    (PROMPT_TEMPLATE + BATCH_INSTRUCTIONS + CONTEXT_INSTRUCTIONS).encode("utf-8")
+).hexdigest()[:12]
+
 
 class Transpiler:
+    # Shared by every instance in the process, so the model listing round trip
+    # happens at most once per MODEL_VERIFY_TTL.
+    _verified_at = None
+    _verify_lock = threading.Lock()
+
     def __init__(self):
         self.api_key = os.getenv("GEMINI_API_KEY")
         if not self.api_key:
@@ -17,26 +88,55 @@ class Transpiler:
         try:
             genai.configure(api_key=self.api_key)
             self._verify_model()
-            self.model = genai.GenerativeModel("gemini-1.5-flash-latest")
+            self.model = genai.GenerativeModel(MODEL_NAME)
         except Exception as e:
             logger.error("Initialization failed: %s", str(e))
             raise
 
+    @staticmethod
+    def _verification_expired() -> bool:
+        verified_at = Transpiler._verified_at
+        return verified_at is None or time.monotonic() - verified_at >= MODEL_VERIFY_TTL
+
     def _verify_model(self):
-        """Verify model availability and capabilities"""
-        models = genai.list_models()
-        if not any(m.name == "models/gemini-1.5-flash-latest" for m in models):
+        """Verify model availability and capabilities, reusing a recent result"""
+        with Transpiler._verify_lock:
+            if self._verification_expired():
+                self._check_model()
+
+    def _check_model(self):
+        models = list(genai.list_models())
+        if not any(m.name == f"models/{MODEL_NAME}" for m in models):
             available_models = [m.name for m in models]
             logger.error("Requested model not available. Available models: %s", available_models)
             raise ValueError(f"Model not found. Available models: {available_models}")
+        Transpiler._verified_at = time.monotonic()
+
+    def refresh_verification(self):
+        """
+        Repeats the model availability check once MODEL_VERIFY_TTL has elapsed.
+        Callers never wait for a refresh another thread is already running, and a failed
+        refresh is only logged: the client keeps working on the last successful check,
+        and the next attempt is made after MODEL_VERIFY_RETRY seconds.
+        """
+        if not self._verification_expired() or not Transpiler._verify_lock.acquire(blocking=False):
+            return
+        try:
+            if self._verification_expired():
+                self._check_model()
+        except Exception as e:
+            logger.error("Model verification refresh failed, keeping the previous result: %s", str(e))
+            Transpiler._verified_at = time.monotonic() - MODEL_VERIFY_TTL + MODEL_VERIFY_RETRY
+        finally:
+            Transpiler._verify_lock.release()
 
-    def transpile(self, c_code: str) -> str:
+    def transpile(self, c_code: str, context: Optional[List[str]] = None) -> str:
         """Convert C code to safe Rust code"""
         try:
             if not c_code.strip():
                 return "// Error: Empty input code"
 
-            prompt = self._create_prompt(c_code)
+            prompt = self._create_prompt(c_code, context)
             response = self.model.generate_content(prompt)
             return self._validate_output(response.text)
 
@@ -44,39 +144,32 @@ class Transpiler:
             logger.error("Transpilation failed: %s", str(e))
             return f"// Transpilation Error: {str(e)}"
 
-    def _create_prompt(self, c_code: str) -> str:
-        """Constructs a strict prompt enforcing safety in Rust transpilation"""
-        return f"""Convert the following C code to Rust, ensuring complete safety:
-
-        {c_code}
+    async def generate_async(self, prompt: str):
+        """Send a prompt without blocking the event loop; errors are raised to the caller"""
+        return await self.model.generate_content_async(prompt)
 
-        STRICT REQUIREMENTS:
-        - Maintain **all functionality** of the original C code.
-        - Use **Rust's ownership model** to handle memory safely.
-        - **NO UNSAFE BLOCKS OR RAW POINTERS.** (e.g., `unsafe {{ }}` is forbidden)
-        - Replace manual memory allocation (`malloc`, `free`) with **Rust's `Box`, `Vec`, or Rc/Arc` as appropriate.
-        - Use **Result, Option, or meaningful error handling** instead of returning `NULL` or `-1`.
-        - Avoid **manual memory management**, favor **RAII principles**.
-        - Use **borrowed references (`&T`, `&mut T`) when applicable** instead of raw pointers (`*mut T`, `*const T`).
-        - Convert loops (`for`, `while`) idiomatically, using **iterators instead of indexed loops** where appropriate.
-        - Use **Rust's standard library features** (e.g., `String`, `Vec<T>`, `HashMap`) instead of C-style arrays and manual memory allocation.
-        - Ensure **thread safety** if applicable by using **Arc, Mutex, or RwLock** where necessary.
-        - NO extra comments or explanations in the output.
-        - Output **only** the Rust code.
+    def build_prompt(self, c_segments: List[str], context: Optional[List[str]] = None) -> str:
+        """Builds the prompt for one segment, or a delimited batch of several"""
+        if len(c_segments) == 1:
+            return self._create_prompt(c_segments[0], context)
+        return self._create_batch_prompt(c_segments, context)
 
-        ### BAD EXAMPLES (REJECT):
-        - Usage of `unsafe {{ ... }}`.
-        - Raw pointer manipulation (`*mut`, `*const`).
-        - Manual memory allocation (`std::alloc::alloc`, `std::alloc::dealloc`).
-        - Null pointer handling (`std::ptr::null_mut()`).
+    def parse_response(self, text: str, count: int) -> List[Optional[str]]:
+        """Splits and validates a model response; None marks segments missing from a batch"""
+        pieces = [text] if count == 1 else split_batch_output(text, count)
+        return [None if piece is None else self._validate_output(piece) for piece in pieces]
 
-        ### GOOD EXAMPLES:
-        - Using `Box::new(...)` instead of `malloc/free`.
-        - Using `Vec<T>` instead of C-style arrays.
-        - Using `Option<T>` instead of `NULL`.
-        - Using `Result<T, E>` for proper error handling.
+    def _create_prompt(self, c_code: str, context: Optional[List[str]] = None) -> str:
+        """Constructs a strict prompt enforcing safety in Rust transpilation"""
+        prompt = PROMPT_TEMPLATE.format(c_code=c_code)
+        if context:
+            signatures = "\n".join(f"        {signature}" for signature in context)
+            prompt += CONTEXT_INSTRUCTIONS.format(signatures=signatures)
+        return prompt
 
-        **STRICTLY FOLLOW THESE RULES. Any deviation will result in incorrect output.**"""
+    def _create_batch_prompt(self, c_segments: List[str], context: Optional[List[str]] = None) -> str:
+        """Constructs one prompt covering several delimited segments"""
+        return self._create_prompt(format_batch(c_segments), context) + BATCH_INSTRUCTIONS.format(count=len(c_segments))
 
     def _validate_output(self, rust_code: str) -> str:
         """Validate generated code for unsafe keywords"""
@@ -92,4 +185,32 @@ class Transpiler:
                 logger.warning("Safety violation: %s", message)
                 return f"// Safety Error: {message}\n// Please try different input code"
 
-        return rust_code
\ No newline at end of file
+        return rust_code
+
+
+_transpiler = None
+_transpiler_lock = threading.Lock()
+
+
+def get_transpiler() -> Transpiler:
+    """
+    Returns the Transpiler shared by the current process, creating it on first use.
+    The model availability check is refreshed once MODEL_VERIFY_TTL has elapsed, outside
+    the lock, so a slow or failing refresh neither blocks nor fails other callers.
+    """
+    global _transpiler
+    with _transpiler_lock:
+        if _transpiler is None:
+            _transpiler = Transpiler()
+            return _transpiler
+        transpiler = _transpiler
+    transpiler.refresh_verification()
+    return transpiler
+
+
+def reset_transpiler():
+    """Drops the process-wide Transpiler, e.g. after a fork or a credentials change."""
+    global _transpiler
+    with _transpiler_lock:
+        _transpiler = None
+        Transpiler._verified_at = None
@@ -0,0 +1,223 @@
+import os
+import re
+import hashlib
+import logging
+import tarfile
+import zipfile
+from typing import IO, Iterator, List, Optional, Tuple
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+
+from .workspace import JobWorkspace
+
+logger = logging.getLogger(__name__)
+
+# Size of the reads when copying request bodies and archive members.
+UPLOAD_CHUNK_BYTES = 256 * 1024
+
+SOURCE_EXTENSIONS = (".c", ".h")
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+
+class UploadError(Exception):
+    """Raised for uploads that cannot be turned into a C source."""
+
+
+class UploadTooLarge(UploadError):
+    """Raised when an upload or the source assembled from it exceeds its size limit."""
+
+
+def _safe_name(name: str) -> str:
+    name = os.path.basename(name.replace("\\", "/")) or "upload"
+    return re.sub(r"[^A-Za-z0-9._-]", "_", name)
+
+
+class HashingWriter:
+    """
+    Writes a file in chunks while computing its sha256 and size, so content is hashed
+    as it arrives instead of being read back afterwards.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hash = hashlib.sha256()
+        self.file = open(path, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(f"Upload exceeds the limit of {self.max_bytes} bytes")
+        self.hash.update(chunk)
+        self.file.write(chunk)
+
+    def close(self) -> None:
+        self.file.close()
+
+    def discard(self) -> None:
+        self.file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    @property
+    def digest(self) -> str:
+        return self.hash.hexdigest()
+
+
+class WorkspaceUploadedFile(UploadedFile):
+    """An uploaded file already stored in the job workspace, with its sha256."""
+
+    def __init__(self, path: str, name: str, content_type: str, size: int, charset: Optional[str], sha256: str):
+        super().__init__(None, name, content_type, size, charset)
+        self.path = path
+        self.sha256 = sha256
+
+
+class WorkspaceUploadHandler(FileUploadHandler):
+    """
+    Multipart upload handler that streams every file part straight into the job
+    workspace's uploads directory, hashing it on the way. Nothing is buffered in memory
+    beyond one chunk, and nothing is written to a temporary file first.
+    """
+    chunk_size = UPLOAD_CHUNK_BYTES
+
+    def __init__(self, workspace: JobWorkspace, request=None):
+        super().__init__(request)
+        self.workspace = workspace
+        self.writer: Optional[HashingWriter] = None
+        self.count = 0
+        self.error: Optional[UploadError] = None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.count += 1
+        path = os.path.join(upload_dir(self.workspace), f"{self.count:04d}-{_safe_name(self.file_name)}")
+        self.writer = HashingWriter(path, settings.UPLOAD_MAX_BYTES)
+
+    def receive_data_chunk(self, raw_data, start):
+        try:
+            self.writer.write(raw_data)
+        except UploadError as e:
+            self.writer.discard()
+            self.error = e
+            logger.warning(f"Upload to job {self.workspace.job_id} stopped: {str(e)}")
+            raise StopUpload(connection_reset=True)
+        return None
+
+    def file_complete(self, file_size):
+        self.writer.close()
+        return WorkspaceUploadedFile(
+            self.writer.path, self.file_name, self.content_type, self.writer.size,
+            self.charset, self.writer.digest,
+        )
+
+    def upload_interrupted(self):
+        if self.writer is not None:
+            self.writer.discard()
+
+
+def upload_dir(workspace: JobWorkspace) -> str:
+    return os.path.join(workspace.path, "uploads")
+
+
+def receive_stream(workspace: JobWorkspace, stream: IO[bytes], name: str) -> WorkspaceUploadedFile:
+    """
+    Copies a raw (e.g. chunked) request body into the workspace chunk by chunk.
+
+    :param workspace: The job's workspace.
+    :param stream: A readable binary stream, such as the request itself.
+    :param name: File name of the upload; its extension decides whether it is an archive.
+    :return: The stored upload with its size and sha256.
+    """
+    writer = HashingWriter(os.path.join(upload_dir(workspace), f"0001-{_safe_name(name)}"), settings.UPLOAD_MAX_BYTES)
+    try:
+        for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_BYTES), b""):
+            writer.write(chunk)
+    except Exception:
+        writer.discard()
+        raise
+    writer.close()
+    return WorkspaceUploadedFile(writer.path, name, "application/octet-stream", writer.size, None, writer.digest)
+
+
+def is_archive(name: str) -> bool:
+    return name.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def _is_source(name: str) -> bool:
+    return name.lower().endswith(SOURCE_EXTENSIONS)
+
+
+def _archive_members(path: str, name: str) -> Iterator[Tuple[str, IO[bytes]]]:
+    """Yields (member name, binary stream) for the C sources and headers in an archive."""
+    count = 0
+
+    def counted(member_name):
+        nonlocal count
+        count += 1
+        if count > settings.UPLOAD_ARCHIVE_MAX_MEMBERS:
+            raise UploadError(f"Archive has more than {settings.UPLOAD_ARCHIVE_MAX_MEMBERS} members")
+        return member_name
+
+    if name.lower().endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and _is_source(counted(info.filename)):
+                    with archive.open(info) as member:
+                        yield info.filename, member
+        return
+    with tarfile.open(path, "r:*") as archive:
+        for info in archive:
+            if info.isfile() and _is_source(counted(info.name)):
+                member = archive.extractfile(info)
+                if member is not None:
+                    with member:
+                        yield info.name, member
+
+
+def _sources(upload: WorkspaceUploadedFile) -> Iterator[Tuple[str, IO[bytes]]]:
+    if is_archive(upload.name):
+        yield from _archive_members(upload.path, upload.name)
+    elif _is_source(upload.name):
+        with open(upload.path, "rb") as f:
+            yield upload.name, f
+
+
+def assemble_source(workspace: JobWorkspace, uploads: List[WorkspaceUploadedFile]) -> dict:
+    """
+    Turns the stored uploads into the single C source the pipeline translates.
+    One plain source is used as it is, without another copy. Several files or archives
+    are concatenated, headers first, into the workspace's source.c by streaming each file
+    or archive member; archives are never extracted to disk.
+
+    :return: A source reference {"upload": path, "sha256": digest, "size": n, "files": [names]}
+             accepted by preprocess_task.
+    :raises UploadError: If no C source was found or the combined source is too large.
+    """
+    if len(uploads) == 1 and not is_archive(uploads[0].name):
+        upload = uploads[0]
+        return {"upload": upload.path, "sha256": upload.sha256, "size": upload.size, "files": [upload.name]}
+
+    writer = HashingWriter(os.path.join(workspace.path, "source.c"), settings.UPLOAD_ARCHIVE_MAX_BYTES)
+    names = []
+    try:
+        # Headers first, so declarations precede the code that uses them
+        for headers in (True, False):
+            for upload in uploads:
+                for name, stream in _sources(upload):
+                    if name.lower().endswith(".h") != headers:
+                        continue
+                    names.append(name)
+                    writer.write(f"\n/* {name} */\n".encode("utf-8"))
+                    for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_BYTES), b""):
+                        writer.write(chunk)
+        if not names:
+            raise UploadError("No .c or .h files found in the upload")
+    except Exception:
+        writer.discard()
+        raise
+    writer.close()
+    return {"upload": writer.path, "sha256": writer.digest, "size": writer.size, "files": names}
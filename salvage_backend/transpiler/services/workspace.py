@@ -0,0 +1,198 @@
+import os
+import time
+import uuid
+import shutil
+import logging
+from typing import Any, Callable, Dict, List, Optional, Set
+import msgpack
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class JobWorkspace:
+    """
+    Directory owned by a single transpilation job. Every task of the job receives the
+    job id and rebuilds the same paths, so concurrent jobs never share files.
+    """
+
+    def __init__(self, job_id: str, root: Optional[str] = None):
+        self.job_id = job_id
+        self.root = os.path.abspath(root or settings.TRANSPILER_WORKSPACE_ROOT)
+        self.path = os.path.join(self.root, job_id)
+
+    @classmethod
+    def create(cls, job_id: Optional[str] = None) -> "JobWorkspace":
+        """Creates a workspace for a new job, generating a job id if none is given."""
+        workspace = cls(job_id or uuid.uuid4().hex)
+        os.makedirs(workspace.path, exist_ok=True)
+        return workspace
+
+    @property
+    def blobs_dir(self) -> str:
+        return os.path.join(self.path, "blobs")
+
+    @property
+    def output_path(self) -> str:
+        return os.path.join(self.path, "final_output.rs")
+
+    def put(self, name: str, text: str) -> dict:
+        """
+        Wraps `text` in a reference that can travel in a task payload.
+        Text up to PIPELINE_INLINE_MAX_BYTES is carried inline; anything larger is
+        written to the workspace and referenced by path.
+
+        :param name: File name to use if the text has to be written out.
+        :param text: The text to store.
+        :return: Either {"inline": text} or {"path": path}.
+        """
+        data = text.encode("utf-8")
+        if len(data) <= settings.PIPELINE_INLINE_MAX_BYTES:
+            return {"inline": text}
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        path = os.path.join(self.blobs_dir, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return {"path": path}
+
+    def put_many(self, name: str, texts: Dict[str, str]) -> Dict[str, dict]:
+        """
+        Wraps many texts at once. If together they fit PIPELINE_INLINE_MAX_BYTES they are
+        carried inline; otherwise all of them are written into a single packed file and
+        each reference holds its offset and length, so thousands of segments cost one
+        file instead of thousands.
+
+        :param name: File name of the pack, if one has to be written.
+        :param texts: Mapping of keys to texts.
+        :return: Mapping of the same keys to {"inline": text} or {"pack": path, "offset": o, "length": n}.
+        """
+        encoded = {key: text.encode("utf-8") for key, text in texts.items()}
+        if sum(len(data) for data in encoded.values()) <= settings.PIPELINE_INLINE_MAX_BYTES:
+            return {key: {"inline": text} for key, text in texts.items()}
+
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        path = os.path.join(self.blobs_dir, name)
+        refs = {}
+        offset = 0
+        with open(path, "wb") as f:
+            for key, data in encoded.items():
+                f.write(data)
+                refs[key] = {"pack": path, "offset": offset, "length": len(data)}
+                offset += len(data)
+        return refs
+
+    def put_data(self, name: str, data: Any) -> dict:
+        """
+        Wraps structured data (symbols, graphs, metadata) for a task payload. Data whose
+        msgpack encoding fits PIPELINE_INLINE_MAX_BYTES travels inline; larger data is
+        written to the workspace in msgpack form and referenced by path.
+
+        :param name: File name to use if the data has to be written out.
+        :param data: msgpack-serializable data.
+        :return: Either {"data": data} or {"packed": path}.
+        """
+        packed = msgpack.packb(data, use_bin_type=True)
+        if len(packed) <= settings.PIPELINE_INLINE_MAX_BYTES:
+            return {"data": data}
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        path = os.path.join(self.blobs_dir, name)
+        with open(path, "wb") as f:
+            f.write(packed)
+        return {"packed": path}
+
+    def exists(self) -> bool:
+        return os.path.isdir(self.path)
+
+    def cleanup(self) -> None:
+        """Removes the workspace and everything in it."""
+        shutil.rmtree(self.path, ignore_errors=True)
+        logger.info(f"Removed workspace for job {self.job_id}")
+
+
+def load_blob(ref: dict) -> str:
+    """Returns the text behind a reference produced by JobWorkspace.put or put_many."""
+    if "inline" in ref:
+        return ref["inline"]
+    if "pack" in ref:
+        with open(ref["pack"], "rb") as f:
+            f.seek(ref["offset"])
+            return f.read(ref["length"]).decode("utf-8")
+    with open(ref["path"], "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def load_data(ref: dict) -> Any:
+    """Returns the data behind a reference produced by JobWorkspace.put_data."""
+    if "data" in ref:
+        return ref["data"]
+    with open(ref["packed"], "rb") as f:
+        return msgpack.unpackb(f.read(), raw=False)
+
+
+def load_blobs(refs: Dict[str, dict]) -> Dict[str, str]:
+    """
+    Returns the texts behind many references, opening each packed file only once
+    and reading its entries in offset order.
+    """
+    texts = {}
+    packs: Dict[str, List[str]] = {}
+    for key, ref in refs.items():
+        if "pack" in ref:
+            packs.setdefault(ref["pack"], []).append(key)
+        else:
+            texts[key] = load_blob(ref)
+    for path, keys in packs.items():
+        with open(path, "rb") as f:
+            for key in sorted(keys, key=lambda k: refs[k]["offset"]):
+                f.seek(refs[key]["offset"])
+                texts[key] = f.read(refs[key]["length"]).decode("utf-8")
+    return {key: texts[key] for key in refs}
+
+
+def _last_modified(path: str) -> float:
+    """Newest mtime of a directory and everything below it; writes deep in the tree do not touch the top."""
+    newest = os.stat(path).st_mtime
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                newest = max(newest, _last_modified(entry.path))
+            else:
+                newest = max(newest, entry.stat(follow_symlinks=False).st_mtime)
+    return newest
+
+
+def purge_stale_workspaces(
+    max_age: Optional[int] = None,
+    root: Optional[str] = None,
+    active: Optional[Callable[[List[str]], Set[str]]] = None,
+) -> int:
+    """
+    Removes job workspaces in which nothing was modified for more than `max_age` seconds.
+
+    :param max_age: Age in seconds, defaults to TRANSPILER_WORKSPACE_TTL.
+    :param root: Workspace root, defaults to TRANSPILER_WORKSPACE_ROOT.
+    :param active: Given the ids of stale workspaces, returns those whose job is still
+                   running; their workspaces are kept however old they are.
+    :return: The number of workspaces removed.
+    """
+    max_age = settings.TRANSPILER_WORKSPACE_TTL if max_age is None else max_age
+    root = os.path.abspath(root or settings.TRANSPILER_WORKSPACE_ROOT)
+    if not os.path.isdir(root):
+        return 0
+
+    cutoff = time.time() - max_age
+    stale = []
+    with os.scandir(root) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False) and _last_modified(entry.path) < cutoff:
+                    stale.append(entry.name)
+            except FileNotFoundError:
+                # Removed by its own job while we were looking
+                continue
+    if stale and active is not None:
+        running = active(stale)
+        stale = [job_id for job_id in stale if job_id not in running]
+    for job_id in stale:
+        JobWorkspace(job_id, root).cleanup()
+    return len(stale)
@@ -1,3 +1,938 @@
-from django.test import TestCase
+import io
+import os
+import re
+import json
+import functools
+import hashlib
+import time
+import shutil
+import subprocess
+import tempfile
+import zipfile
+import asyncio
+import threading
+from types import SimpleNamespace
+from unittest import mock
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from google.api_core import exceptions as google_exceptions
+from rest_framework_simplejwt.tokens import AccessToken
+import fakeredis
+
+from .services.translator.batching import MARKER_PATTERN, format_batch, pack_batches, split_batch_output
+from .services.preprocessor.preprocess import CACHE_ALIAS as PREPROCESS_CACHE_ALIAS, PREPROCESSOR_FLAGS, preprocess_c_code
+from .services.preprocessor.graph import DependencyGraph
+from .services.preprocessor.metadata import build_metadata
+from .services.preprocessor.segmentation import extract_symbols
+from .services.postprocessor.postprocess import INDEX_SUFFIX, analyze_segment, read_segment, remove_duplicate_items, write_rust_output
+from api.models import SegmentTranslation, User
+from .services import jobs
+from .services.translator import engine, scheduler
+from .services.translator.cache import (
+    CACHE_ALIAS,
+    get_cached_translation,
+    normalize_segment,
+    store_translation,
+    translation_digest,
+    translation_key,
+)
+from .services.translator.engine import TokenBucket, TranslationEngine
+from .services.translator.incremental import build_manifest, compute_fingerprints, reusable_translations
+from .services.translator.store import TranslationStore
+from .services.translator.translator import MODEL_NAME, PROMPT_VERSION, Transpiler
+from .services.uploads import HashingWriter, UploadError, UploadTooLarge, assemble_source, receive_stream
+from .services.workspace import JobWorkspace, load_blob, load_blobs
+
+
+# Keeps translations of one test from being served to another
+LOCAL_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    CACHE_ALIAS: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'translation-tests'},
+    PREPROCESS_CACHE_ALIAS: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'preprocess-tests'},
+}
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class TranslationCacheTests(SimpleTestCase):
+    code = "int twice(int x) {\n    return 2 * x;\n}\n"
+
+    def setUp(self):
+        caches[CACHE_ALIAS].clear()
+
+    def test_linemarkers_and_whitespace_do_not_change_the_key(self):
+        variant = '# 1 "/tmp/tmpab12cd.c"\n\n  int twice(int x) {\n\treturn 2 * x;   \n}\n# 4 "/tmp/tmpab12cd.c" 2\n'
+        self.assertEqual(normalize_segment(variant), normalize_segment(self.code))
+        self.assertEqual(translation_key(variant), translation_key(self.code))
+
+    def test_code_model_and_prompt_version_change_the_key(self):
+        key = translation_key(self.code)
+        self.assertNotEqual(translation_key(self.code.replace("2 *", "3 *")), key)
+        self.assertNotEqual(translation_key(self.code, model_name="another-model"), key)
+        self.assertNotEqual(translation_key(self.code, prompt_version="another-prompt"), key)
+
+    def test_callee_context_changes_the_key_but_not_its_order(self):
+        context = ["fn half(x: i32) -> i32", "fn add(a: i32, b: i32) -> i32"]
+        self.assertNotEqual(translation_key(self.code, context), translation_key(self.code))
+        self.assertEqual(translation_key(self.code, context), translation_key(self.code, context[::-1]))
+        self.assertEqual(translation_key(self.code, []), translation_key(self.code))
+
+    def test_digest_is_shared_by_every_model_and_prompt_version(self):
+        # The digest is what the database store is keyed on, next to the model and prompt columns
+        digest = translation_digest(self.code)
+        self.assertTrue(translation_key(self.code).endswith(digest))
+        self.assertTrue(translation_key(self.code, model_name="another-model").endswith(digest))
+        self.assertEqual(translation_digest("\n  " + self.code), digest)
+
+    def test_stored_translations_are_served(self):
+        self.assertIsNone(get_cached_translation(self.code))
+        self.assertTrue(store_translation(self.code, "fn twice(x: i32) -> i32 { 2 * x }"))
+        self.assertEqual(get_cached_translation("\n" + self.code), "fn twice(x: i32) -> i32 { 2 * x }")
+
+    def test_failures_are_not_stored(self):
+        for rust_code in ("", "// Transpilation Error: quota", "// Safety Error: unsafe block", "// Error: no model"):
+            self.assertFalse(store_translation(self.code, rust_code), rust_code)
+        self.assertIsNone(get_cached_translation(self.code))
+
+    @override_settings(TRANSLATION_CACHE_MAX_ENTRY_BYTES=16)
+    def test_oversized_translations_are_not_stored(self):
+        self.assertFalse(store_translation(self.code, "fn twice(x: i32) -> i32 { 2 * x }"))
+        self.assertIsNone(get_cached_translation(self.code))
+
+
+class BatchingTests(SimpleTestCase):
+    def test_markers_round_trip(self):
+        batch = format_batch(["int a(void) { return 1; }\n", "int b(void) { return 2; }"])
+        self.assertEqual([int(m.group(1)) for m in MARKER_PATTERN.finditer(batch)], [0, 1])
+
+    def test_split_batch_output(self):
+        text = (
+            "// @@SALVAGE_SEGMENT 0@@\n```rust\nfn a() -> i32 { 1 }\n```\n"
+            "//@@SALVAGE_SEGMENT 1@@\nfn b() -> i32 { 2 }\n"
+        )
+        self.assertEqual(split_batch_output(text, 2), ["fn a() -> i32 { 1 }", "fn b() -> i32 { 2 }"])
+
+    def test_split_batch_output_marks_lost_segments(self):
+        text = (
+            "// @@SALVAGE_SEGMENT 0@@\nfn a() {}\n"
+            "// @@SALVAGE_SEGMENT 1@@\nfn b() {}\n"
+            "// @@SALVAGE_SEGMENT 1@@\nfn b2() {}\n"
+            "// @@SALVAGE_SEGMENT 3@@\n\n"
+            "// @@SALVAGE_SEGMENT 7@@\nfn out_of_range() {}\n"
+        )
+        # 1 is duplicated, 2 is missing and 3 is empty
+        self.assertEqual(split_batch_output(text, 4), ["fn a() {}", None, None, None])
+
+    def test_pack_batches_respects_budget_and_count(self):
+        segments = [(name, 40) for name in "abcde"]
+        self.assertEqual(pack_batches(segments, token_budget=100, max_segment_tokens=50, max_segments=10),
+                         [["a", "b"], ["c", "d"], ["e"]])
+        self.assertEqual(pack_batches(segments, token_budget=1000, max_segment_tokens=50, max_segments=3),
+                         [["a", "b", "c"], ["d", "e"]])
+
+    def test_pack_batches_keeps_order_around_large_segments(self):
+        segments = [("a", 10), ("b", 10), ("big", 900), ("c", 10)]
+        self.assertEqual(pack_batches(segments, token_budget=100, max_segment_tokens=50),
+                         [["a", "b"], ["big"], ["c"]])
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_acquire_waits_for_refill(self):
+        async def run():
+            bucket = TokenBucket(rate_per_minute=600, capacity=2)  # 10 tokens per second
+            started = time.monotonic()
+            await bucket.acquire(2)
+            immediate = time.monotonic() - started
+            await bucket.acquire(1)
+            return immediate, time.monotonic() - started
+
+        immediate, waited = asyncio.run(run())
+        self.assertLess(immediate, 0.05)
+        self.assertGreaterEqual(waited, 0.09)
+
+    def test_adjust_can_run_into_debt(self):
+        bucket = TokenBucket(rate_per_minute=60, capacity=10)
+        bucket.adjust(15)
+        self.assertLess(bucket.tokens, 0)
+        bucket.adjust(-100)
+        self.assertEqual(bucket.tokens, 10)
+
+    def test_requests_larger_than_capacity_do_not_block_forever(self):
+        async def run():
+            bucket = TokenBucket(rate_per_minute=6000, capacity=5)
+            await asyncio.wait_for(bucket.acquire(50), timeout=1)
+            return bucket.tokens
+
+        self.assertLess(asyncio.run(run()), 1)
+
+
+class StubTranspiler(Transpiler):
+    """Answers every prompt with one Rust function, after raising the queued errors in order."""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.calls = []
+
+    async def generate_async(self, prompt: str):
+        self.calls.append(time.monotonic())
+        if self.errors:
+            raise self.errors.pop(0)
+        return SimpleNamespace(text="fn f() -> i32 { 1 }", usage_metadata=None)
+
+
+@mock.patch.multiple(engine, BASE_BACKOFF=0.05, MAX_BACKOFF=0.2, MAX_RETRIES=3)
+class TranslationEngineTests(SimpleTestCase):
+    def translate(self, transpiler, batches):
+        async def run():
+            translation_engine = TranslationEngine(transpiler)
+            return translation_engine, await translation_engine.translate_batches(batches)
+        return asyncio.run(run())
+
+    def test_rate_limit_pauses_every_request(self):
+        async def run():
+            translation_engine = TranslationEngine(StubTranspiler())
+            delay = translation_engine._on_rate_limited()
+            started = time.monotonic()
+            await translation_engine.translate(["int f(void) { return 1; }"])
+            return delay, translation_engine.transpiler.calls[0] - started
+
+        delay, waited = asyncio.run(run())
+        self.assertGreaterEqual(waited, delay - 0.01)
+
+    def test_rate_limits_double_the_backoff_and_successes_lower_it(self):
+        errors = [google_exceptions.ResourceExhausted("quota")] * 3
+        translation_engine, results = self.translate(StubTranspiler(errors), [["int f(void) { return 1; }"]])
+        self.assertEqual(results, [["fn f() -> i32 { 1 }"]])
+        self.assertEqual(len(translation_engine.transpiler.calls), 4)
+        # 0.05 -> 0.1 -> 0.2, then halved by the successful attempt
+        self.assertAlmostEqual(translation_engine.backoff, 0.1)
+
+    def test_transient_errors_are_retried_until_the_limit(self):
+        errors = [google_exceptions.ServiceUnavailable("down")] * 4
+        translation_engine, results = self.translate(StubTranspiler(errors), [["int f(void) { return 1; }"]])
+        self.assertEqual(len(translation_engine.transpiler.calls), 4)
+        self.assertTrue(results[0][0].startswith("// Transpilation Error:"))
+
+    def test_other_errors_are_not_retried(self):
+        translation_engine, results = self.translate(StubTranspiler([ValueError("bad prompt")]), [["int f(void);"]])
+        self.assertEqual(len(translation_engine.transpiler.calls), 1)
+        self.assertEqual(results, [["// Transpilation Error: bad prompt"]])
+
+    def test_segments_lost_from_a_batch_are_translated_alone(self):
+        # The stub answers without markers, so both segments are retried on their own
+        translation_engine, results = self.translate(StubTranspiler(), [["int a(void);", "int b(void);"]])
+        self.assertEqual(len(translation_engine.transpiler.calls), 3)
+        self.assertEqual(results, [["fn f() -> i32 { 1 }", "fn f() -> i32 { 1 }"]])
+
+
+class EngineRunnerTests(SimpleTestCase):
+    def engine_threads(self):
+        return [thread for thread in threading.enumerate() if thread.name == "translation-engine"]
+
+    def test_failed_initialization_leaves_no_loop_behind(self):
+        before = len(self.engine_threads())
+        with mock.patch.object(engine, "get_transpiler", side_effect=ValueError("no model")):
+            for _ in range(3):
+                with self.assertRaises(ValueError):
+                    engine._EngineRunner()
+        self.assertEqual(len(self.engine_threads()), before)
+
+    def test_stop_joins_the_loop_thread(self):
+        with mock.patch.object(engine, "get_transpiler", return_value=StubTranspiler()):
+            runner = engine._EngineRunner()
+        self.assertEqual(runner.run(lambda e: e.translate(["int f(void);"])), ["fn f() -> i32 { 1 }"])
+        runner.stop()
+        self.assertFalse(runner.thread.is_alive())
+        self.assertTrue(runner.loop.is_closed())
+
+
+class EchoTranspiler(Transpiler):
+    """Translates `int name(void)` C functions to Rust stubs, recording the segments and context of each prompt."""
+
+    def __init__(self):
+        self.requests = []
+
+    def build_prompt(self, c_segments, context=None):
+        self.requests.append((list(c_segments), list(context or [])))
+        return c_segments[0] if len(c_segments) == 1 else format_batch(c_segments)
+
+    async def generate_async(self, prompt: str):
+        text = re.sub(r"int (\w+)\(void\).*", r"fn \1() -> i32 { 0 }", prompt)
+        return SimpleNamespace(text=text, usage_metadata=None)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class TranslateInWavesTests(SimpleTestCase):
+    def setUp(self):
+        caches[CACHE_ALIAS].clear()
+        self.transpiler = EchoTranspiler()
+        patcher = mock.patch.object(engine, "get_transpiler", return_value=self.transpiler)
+        patcher.start()
+        engine.reset_engine_runner()
+        self.addCleanup(engine.reset_engine_runner)
+        self.addCleanup(patcher.stop)
+
+    def requested(self):
+        return [(sorted(c[4:c.index("(")] for c in c_segments), context) for c_segments, context in self.transpiler.requests]
+
+    def test_callers_are_prompted_with_callee_signatures(self):
+        c_codes = {name: f"int {name}(void) {{ return 0; }}" for name in ("top", "mid", "leaf", "other")}
+        dependencies = {"top": ["mid"], "mid": ["leaf"], "leaf": [], "other": []}
+        rust_codes = scheduler.translate_in_waves(c_codes, dependencies, [["leaf", "other"], ["mid"], ["top"]])
+
+        self.assertEqual(rust_codes["top"], "fn top() -> i32 { 0 }")
+        self.assertEqual(self.requested(), [
+            (["leaf", "other"], []),
+            (["mid"], ["fn leaf() -> i32"]),
+            (["top"], ["fn mid() -> i32"]),
+        ])
+
+    def test_segments_outside_the_waves_run_last(self):
+        c_codes = {"a": "int a(void) { return 0; }", "stray": "int stray(void) { return a(); }"}
+        rust_codes = scheduler.translate_in_waves(c_codes, {"a": [], "stray": ["a"]}, [["a"]])
+        self.assertEqual(set(rust_codes), {"a", "stray"})
+        self.assertEqual(self.requested()[-1], (["stray"], ["fn a() -> i32"]))
+
+    @mock.patch.object(scheduler, "MAX_CONTEXT_SIGNATURES", 2)
+    def test_context_is_capped(self):
+        leaves = ["x", "y", "z"]
+        c_codes = {name: f"int {name}(void) {{ return 0; }}" for name in leaves + ["caller"]}
+        dependencies = {"caller": leaves, "x": [], "y": [], "z": []}
+        scheduler.translate_in_waves(c_codes, dependencies, [leaves, ["caller"]])
+        self.assertEqual(self.requested()[-1], (["caller"], ["fn x() -> i32", "fn y() -> i32"]))
+
+    def test_cached_segments_are_not_requested_again(self):
+        c_codes = {"a": "int a(void) { return 0; }"}
+        scheduler.translate_in_waves(c_codes, {"a": []}, [["a"]])
+        self.assertEqual(scheduler.translate_in_waves(c_codes, {"a": []}, [["a"]]), {"a": "fn a() -> i32 { 0 }"})
+        self.assertEqual(len(self.transpiler.requests), 1)
+
+    def test_reused_and_cached_segments_are_reported_before_requests(self):
+        c_codes = {name: f"int {name}(void) {{ return 0; }}" for name in ("kept", "cached", "fresh")}
+        scheduler.translate_in_waves({"cached": c_codes["cached"]}, {"cached": []}, [["cached"]])
+        self.transpiler.requests.clear()
+
+        reported = []
+
+        def on_segment(name, rust_code):
+            reported.append((name, rust_code, len(self.transpiler.requests)))
+
+        scheduler.translate_in_waves(
+            c_codes, {name: [] for name in c_codes}, [list(c_codes)],
+            reuse={"kept": "fn kept() {}"}, on_segment=on_segment,
+        )
+        self.assertEqual(reported, [
+            ("kept", "fn kept() {}", 0),
+            ("cached", "fn cached() -> i32 { 0 }", 0),
+            ("fresh", "fn fresh() -> i32 { 0 }", 1),
+        ])
+
+
+    def test_cycle_units_share_one_request(self):
+        c_codes = {name: f"int {name}(void) {{ return 0; }}" for name in ("even", "odd", "main")}
+        dependencies = {"even": ["odd"], "odd": ["even"], "main": ["even"]}
+        units = [[["even", "odd"]], [["main"]]]
+        # One segment per batch, so only the unit can keep a cycle together
+        with mock.patch.object(scheduler, "pack_batches", functools.partial(pack_batches, max_segments=1)):
+            scheduler.translate_in_waves(c_codes, dependencies, [["even", "odd"], ["main"]], units=units)
+        self.assertEqual(self.requested(), [(["even", "odd"], []), (["main"], ["fn even() -> i32"])])
+
+
+class DependencyGraphTests(SimpleTestCase):
+    def setUp(self):
+        # a and b call each other, c calls a, d stands alone, e uses c and d
+        self.graph = DependencyGraph.from_symbols([
+            {"name": "a", "dependencies": ["b"]},
+            {"name": "b", "dependencies": ["a", "a"]},
+            {"name": "c", "dependencies": ["a"]},
+            {"name": "d", "dependencies": []},
+            {"name": "e", "dependencies": ["c", "d"]},
+        ])
+
+    def names(self, nodes, graph=None):
+        return [(graph or self.graph).names[node] for node in nodes]
+
+    def test_duplicate_edges_are_dropped(self):
+        self.assertEqual(self.graph.successors("b"), ["a"])
+        self.assertEqual(self.graph.successors("e"), ["c", "d"])
+
+    def test_strongly_connected_components_come_dependencies_first(self):
+        components = [sorted(self.names(c)) for c in self.graph.strongly_connected_components()]
+        self.assertIn(["a", "b"], components)
+        position = {name: i for i, component in enumerate(components) for name in component}
+        self.assertLess(position["a"], position["c"])
+        self.assertLess(position["c"], position["e"])
+        self.assertLess(position["d"], position["e"])
+
+    def test_topological_order_rejects_cycles(self):
+        with self.assertRaises(ValueError):
+            self.graph.topological_order()
+
+    def test_condensed_graph_orders_and_levels(self):
+        condensed, components = self.graph.condense()
+        members = [sorted(self.names(c)) for c in components]
+        order = [members[node] for node in condensed.topological_order()]
+        # Every node comes before the nodes it depends on
+        self.assertLess(order.index(["e"]), order.index(["c"]))
+        self.assertLess(order.index(["c"]), order.index(["a", "b"]))
+
+        levels = {tuple(members[node]): level for node, level in enumerate(condensed.dependency_levels())}
+        self.assertEqual(levels, {("a", "b"): 0, ("d",): 0, ("c",): 1, ("e",): 2})
+
+    def test_to_dict_round_trip(self):
+        restored = DependencyGraph.from_dict(self.graph.to_dict())
+        self.assertEqual(restored.names, self.graph.names)
+        self.assertEqual(list(restored.offsets), list(self.graph.offsets))
+        self.assertEqual(list(restored.targets), list(self.graph.targets))
+        self.assertEqual(restored.successors("e"), ["c", "d"])
+
+    def test_dependents_follow_the_reverse_edges(self):
+        self.assertEqual(self.graph.dependents("a"), ["b", "c"])
+        self.assertEqual(self.graph.dependents("d"), ["e"])
+        self.assertEqual(self.graph.dependents("e"), [])
+        self.assertIs(self.graph.reverse(), self.graph.reverse())
+        self.assertEqual(self.graph.reverse().edge_count, self.graph.edge_count)
+
+
+class MetadataTests(SimpleTestCase):
+    def test_cycles_become_single_units(self):
+        symbols = [
+            {"name": "main", "dependencies": ["even", "log"]},
+            {"name": "even", "dependencies": ["odd"]},
+            {"name": "odd", "dependencies": ["even"]},
+            {"name": "log", "dependencies": []},
+        ]
+        metadata = build_metadata(symbols, {"main", "even", "odd", "log"})
+        self.assertEqual(metadata["units"], [[["even", "odd"], ["log"]], [["main"]]])
+        self.assertEqual(metadata["waves"], [["even", "log", "odd"], ["main"]])
+        self.assertEqual(metadata["level_widths"], [2, 1])
+        self.assertEqual(metadata["cycles"], [["even", "odd"]])
+
+
+class PostprocessTests(SimpleTestCase):
+    def test_analyze_segment(self):
+        analysis = analyze_segment(
+            "use std::io;\n#[derive(Debug)]\nstruct P { x: i32 }\nfn twice(x: i32) -> i32 {\n    x * 2\n}\n"
+        )
+        self.assertEqual(analysis["signatures"], ["fn twice(x: i32) -> i32"])
+        self.assertEqual(analysis["imports"], ["use std::io;"])
+        self.assertEqual([item[0] for item in analysis["items"]], ["use_declaration", "struct_item", "function_item"])
+        # The derive attribute belongs to the struct's item span
+        self.assertTrue(analysis["items"][1][1] < analysis["items"][1][2])
+
+    def test_items_differing_only_in_formatting_hash_alike(self):
+        first = analyze_segment("fn a(x: i32) -> i32 { x }")["items"][0][3]
+        second = analyze_segment("fn a(\n    x: i32,\n) -> i32 {\n    // same\n    x\n}")["items"][0][3]
+        self.assertEqual(first, second)
+
+    def test_remove_duplicate_items(self):
+        segments = {
+            "one": "use std::io;\nfn helper() -> i32 { 1 }\nfn one() -> i32 { helper() }",
+            "two": "use std::io;\nfn helper() -> i32 {\n    1\n}\nfn two() -> i32 { helper() }",
+            "three": "use std::io;\nfn helper() -> i32 { 1 }",
+        }
+        analyses = {name: analyze_segment(code) for name, code in segments.items()}
+        cleaned, imports = remove_duplicate_items(segments, ["one", "two", "three"], analyses)
+
+        self.assertEqual(imports, ["use std::io;"])
+        self.assertEqual(list(cleaned), ["one", "two"])
+        self.assertEqual(cleaned["one"], "fn helper() -> i32 { 1 }\nfn one() -> i32 { helper() }")
+        self.assertEqual(cleaned["two"], "fn two() -> i32 { helper() }")
+
+    def test_duplicates_are_removed_with_their_comments(self):
+        segments = {
+            "one": "/// Returns one.\n#[inline]\nfn helper() -> i32 { 1 }",
+            "two": (
+                "// Section notes.\n\n"
+                "/// Returns one.\n// Copied from one.\n#[inline]\nfn helper() -> i32 { 1 } // trailing\n"
+                "/// Calls the helper.\nfn two() -> i32 { helper() }"
+            ),
+        }
+        analyses = {name: analyze_segment(code) for name, code in segments.items()}
+        cleaned, _ = remove_duplicate_items(segments, ["one", "two"], analyses)
+
+        self.assertEqual(cleaned["one"], segments["one"])
+        self.assertEqual(cleaned["two"], "// Section notes.\n\n\n/// Calls the helper.\nfn two() -> i32 { helper() }")
+
+    def test_write_rust_output(self):
+        segments = {
+            "one": "use std::io;\nfn one() -> i32 { 1 }",
+            "copy": "use std::io;\nfn one() -> i32 {\n    1\n}",
+            "two": "use std::fmt;\nuse std::io;\nfn two() -> String { format!(\"é{}\", one()) }",
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            output_path = os.path.join(tmp, "output.rs")
+            index = write_rust_output(segments, ["two", "one", "copy"], output_path)
+            with open(output_path, "rb") as f:
+                merged = f.read()
+            self.assertTrue(os.path.exists(output_path + INDEX_SUFFIX))
+
+            self.assertEqual(index["size"], len(merged))
+            self.assertEqual(list(index["segments"]), ["two", "one"])
+            self.assertEqual(merged.decode().count("use std::io;"), 1)
+            for name, (start, end) in index["segments"].items():
+                self.assertEqual(merged[start:end].decode(), read_segment(output_path, name))
+            self.assertEqual(read_segment(output_path, "two"), 'fn two() -> String { format!("é{}", one()) }')
+            self.assertIsNone(read_segment(output_path, "copy", index))
+
+
+class IncrementalTests(SimpleTestCase):
+    c_codes = {
+        "leaf": "int leaf(void) { return 1; }",
+        "mid": "int mid(void) { return leaf(); }",
+        "top": "int top(void) { return mid(); }",
+        "other": "int other(void) { return 0; }",
+    }
+    dependencies = {"leaf": [], "mid": ["leaf"], "top": ["mid"], "other": []}
+    waves = [["leaf", "other"], ["mid"], ["top"]]
+
+    def test_callee_changes_reach_every_caller(self):
+        before = compute_fingerprints(self.c_codes, self.dependencies, self.waves)
+        changed = dict(self.c_codes, leaf="int leaf(void) { return 2; }")
+        after = compute_fingerprints(changed, self.dependencies, self.waves)
+        self.assertEqual([name for name in before if before[name] != after[name]], ["leaf", "mid", "top"])
+
+    def test_formatting_changes_keep_fingerprints(self):
+        before = compute_fingerprints(self.c_codes, self.dependencies, self.waves)
+        reformatted = dict(self.c_codes, mid="\n    int mid(void) { return leaf(); }  \n\n")
+        self.assertEqual(compute_fingerprints(reformatted, self.dependencies, self.waves), before)
+
+    def test_segments_outside_the_waves_are_fingerprinted(self):
+        fingerprints = compute_fingerprints(dict(self.c_codes, stray="int stray(void) { return top(); }"),
+                                            dict(self.dependencies, stray=["top"]), self.waves)
+        self.assertEqual(list(fingerprints), ["leaf", "other", "mid", "top", "stray"])
+
+    def test_reusable_translations(self):
+        fingerprints = compute_fingerprints(self.c_codes, self.dependencies, self.waves)
+        rust = {name: f"fn {name}() {{}}" for name in self.c_codes}
+        rust["other"] = "// Transpilation Error: quota"
+        manifest = build_manifest(fingerprints, rust)
+        self.assertNotIn("other", manifest["segments"])
+
+        changed = compute_fingerprints(dict(self.c_codes, mid="int mid(void) { return 3; }"), self.dependencies, self.waves)
+        self.assertEqual(reusable_translations(changed, manifest), {"leaf": "fn leaf() {}"})
+        self.assertEqual(reusable_translations(fingerprints, dict(manifest, model="another-model")), {})
+        self.assertEqual(reusable_translations(fingerprints, None), {})
+
+
+class ExtractSymbolsTests(SimpleTestCase):
+    source = """
+struct point { int x; int y; };
+
+static int scale(int v) { return v * 2; }
+
+int norm(struct point *p, int factor) {
+    int local = factor;
+    if (p) {
+        while (local > 0) {
+            local = scale(scale(p->x)) + undeclared_helper(local);
+        }
+    }
+    return local > 100 ? norm(p, local - 1) : local;
+}
+"""
+
+    def setUp(self):
+        self.symbols = {symbol["name"]: symbol for symbol in extract_symbols("sample.c", source=self.source)}
+
+    def test_top_level_symbols_with_their_lines(self):
+        self.assertEqual(list(self.symbols), ["point", "scale", "norm"])
+        self.assertEqual(self.symbols["point"]["kind"], "STRUCT_DECL")
+        self.assertEqual((self.symbols["norm"]["start_line"], self.symbols["norm"]["end_line"]), (6, 14))
+
+    def test_nested_references_are_dependencies(self):
+        # The struct type of a parameter and calls nested in loops and arguments, each once;
+        # locals, parameters and the recursive call are not dependencies
+        self.assertEqual(self.symbols["norm"]["dependencies"], ["point", "scale", "undeclared_helper"])
+        self.assertEqual(self.symbols["scale"]["dependencies"], [])
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class PreprocessCacheTests(SimpleTestCase):
+    source = '#include <stdio.h>\n#define TWICE(x) (2 * (x))\nint twice(int x) { return TWICE(x); }\n'
+
+    def setUp(self):
+        caches[PREPROCESS_CACHE_ALIAS].clear()
+        patcher = mock.patch.object(subprocess, "run", wraps=subprocess.run)
+        self.run = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_repeated_sources_skip_gcc(self):
+        first = preprocess_c_code(self.source)
+        self.assertIn("return (2 * (x));", first)
+        self.assertEqual(preprocess_c_code(self.source), first)
+        self.assertEqual(self.run.call_count, 1)
+
+    def test_sources_differing_only_in_includes_skip_gcc(self):
+        first = preprocess_c_code(self.source)
+        self.assertEqual(preprocess_c_code(self.source.replace("<stdio.h>", '"local.h"')), first)
+        self.assertEqual(self.run.call_count, 1)
+
+    def test_other_flags_or_code_run_gcc_again(self):
+        preprocess_c_code(self.source)
+        preprocess_c_code(self.source, flags=PREPROCESSOR_FLAGS + ["-DEXTRA=1"])
+        preprocess_c_code(self.source.replace("2 *", "3 *"))
+        self.assertEqual(self.run.call_count, 3)
+
+
+class WorkspaceTestCase(SimpleTestCase):
+    """Runs every test against a fresh workspace root in a temporary directory."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="salvage-test-")
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        settings_override = override_settings(TRANSPILER_WORKSPACE_ROOT=self.root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.workspace = JobWorkspace.create()
+
+
+class HashingWriterTests(WorkspaceTestCase):
+    def test_hashes_and_counts_while_writing(self):
+        path = os.path.join(self.workspace.path, "uploads", "a.c")
+        writer = HashingWriter(path, max_bytes=100)
+        writer.write(b"int main(void) ")
+        writer.write(b"{ return 0; }\n")
+        writer.close()
+
+        content = b"int main(void) { return 0; }\n"
+        self.assertEqual(writer.size, len(content))
+        self.assertEqual(writer.digest, hashlib.sha256(content).hexdigest())
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), content)
+
+    def test_rejects_data_over_the_limit(self):
+        writer = HashingWriter(os.path.join(self.workspace.path, "big.c"), max_bytes=8)
+        writer.write(b"12345678")
+        with self.assertRaises(UploadTooLarge):
+            writer.write(b"9")
+        writer.discard()
+        self.assertFalse(os.path.exists(writer.path))
+
+
+class AssembleSourceTests(WorkspaceTestCase):
+    def receive(self, name, data):
+        return receive_stream(self.workspace, io.BytesIO(data), name)
+
+    def test_single_raw_source_is_used_in_place(self):
+        code = b"int twice(int x) { return 2 * x; }\n"
+        upload = self.receive("twice.c", code)
+        source = assemble_source(self.workspace, [upload])
+
+        self.assertEqual(source["upload"], upload.path)
+        self.assertEqual(source["sha256"], hashlib.sha256(code).hexdigest())
+        self.assertEqual(source["size"], len(code))
+        self.assertEqual(source["files"], ["twice.c"])
+
+    def test_zip_members_are_concatenated_headers_first(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as z:
+            z.writestr("proj/main.c", "int main(void) { return twice(1); }\n")
+            z.writestr("proj/util.h", "int twice(int);\n")
+            z.writestr("proj/README", "not C")
+        source = assemble_source(self.workspace, [self.receive("proj.zip", archive.getvalue())])
+
+        self.assertEqual(source["files"], ["proj/util.h", "proj/main.c"])
+        with open(source["upload"], "r", encoding="utf-8") as f:
+            text = f.read()
+        self.assertLess(text.index("int twice(int);"), text.index("int main(void)"))
+        self.assertEqual(source["sha256"], hashlib.sha256(text.encode("utf-8")).hexdigest())
+
+    def test_upload_without_sources_is_rejected(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as z:
+            z.writestr("notes.txt", "nothing to translate")
+        with self.assertRaises(UploadError):
+            assemble_source(self.workspace, [self.receive("notes.zip", archive.getvalue())])
+        self.assertFalse(os.path.exists(os.path.join(self.workspace.path, "source.c")))
+
+    def test_empty_upload_list_is_rejected(self):
+        with self.assertRaises(UploadError):
+            assemble_source(self.workspace, [])
+
+    @override_settings(UPLOAD_ARCHIVE_MAX_BYTES=64)
+    def test_combined_source_over_the_limit_is_rejected(self):
+        uploads = [self.receive(f"part{i}.c", b"int f%d(void) { return %d; }\n" % (i, i)) for i in range(4)]
+        with self.assertRaises(UploadTooLarge):
+            assemble_source(self.workspace, uploads)
+        self.assertFalse(os.path.exists(os.path.join(self.workspace.path, "source.c")))
+
+    @override_settings(UPLOAD_MAX_BYTES=16)
+    def test_raw_body_over_the_limit_is_rejected(self):
+        with self.assertRaises(UploadTooLarge):
+            self.receive("big.c", b"x" * 17)
+        self.assertEqual(os.listdir(os.path.join(self.workspace.path, "uploads")), [])
+
+
+class JobWorkspaceTests(WorkspaceTestCase):
+    texts = {"b": "int b(void);\n", "a": "int a(void) { return 'é'; }\n", "c": ""}
+
+    def test_small_payloads_travel_inline(self):
+        refs = self.workspace.put_many("segments.c.pack", self.texts)
+        self.assertTrue(all("inline" in ref for ref in refs.values()))
+        self.assertEqual(load_blobs(refs), self.texts)
+
+    @override_settings(PIPELINE_INLINE_MAX_BYTES=8)
+    def test_large_payloads_share_one_pack(self):
+        refs = self.workspace.put_many("segments.c.pack", self.texts)
+        self.assertEqual({ref["pack"] for ref in refs.values()}, {os.path.join(self.workspace.blobs_dir, "segments.c.pack")})
+        self.assertEqual(os.listdir(self.workspace.blobs_dir), ["segments.c.pack"])
+
+        loaded = load_blobs(refs)
+        self.assertEqual(loaded, self.texts)
+        self.assertEqual(list(loaded), list(self.texts))
+        self.assertEqual(load_blob(refs["a"]), self.texts["a"])
+
+
+class BenchmarkPipelineTests(WorkspaceTestCase):
+    def benchmark(self, **options):
+        stdout = io.StringIO()
+        call_command('benchmark_pipeline', sizes=[3], repeat=1, latency=0, stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def test_runs_every_stage_and_saves_a_baseline(self):
+        path = os.path.join(self.root, "baseline.json")
+        output = self.benchmark(save_baseline=path)
+        self.assertIn("synthetic-3", output)
+
+        with open(path) as f:
+            report = json.load(f)
+        [entry] = report["results"]
+        self.assertEqual(set(entry["stages"]), {"preprocess", "extract", "segment", "translate", "postprocess"})
+        self.assertGreater(entry["segments"], 0)
+        self.assertGreater(entry["output_bytes"], 0)
+        self.assertIn("No regressions", self.benchmark(baseline=path, tolerance=1000))
+
+    def test_regressions_fail_the_command(self):
+        path = os.path.join(self.root, "baseline.json")
+        stages = dict.fromkeys(["preprocess", "extract", "segment", "translate", "postprocess"], 1e-9)
+        with open(path, "w") as f:
+            json.dump({"results": [{"name": "synthetic-3", "stages": stages}]}, f)
+        with self.assertRaisesRegex(CommandError, "Performance regressions"):
+            self.benchmark(baseline=path, min_seconds=0)
+
+
+class TranslationStoreTests(TestCase):
+    def test_lookup_finds_flushed_translations(self):
+        store = TranslationStore()
+        store.add("int a(void) { return 1; }", "fn a() -> i32 { 1 }")
+        store.add("int b(void) { return 2; }", "fn b() -> i32 { 2 }", context=["fn a() -> i32"])
+        store.add("int c(void);", "// Transpilation Error: quota")
+        self.assertEqual(store.flush(), 2)
+        self.assertEqual(store.flush(), 0)
+
+        found = TranslationStore().lookup({
+            # Indentation and blank lines do not change the hash
+            "a": ("\n  int a(void) { return 1; }\n\n", None),
+            "b": ("int b(void) { return 2; }", ["fn a() -> i32"]),
+            "b_without_context": ("int b(void) { return 2; }", None),
+            "c": ("int c(void);", None),
+        })
+        self.assertEqual(found, {"a": "fn a() -> i32 { 1 }", "b": "fn b() -> i32 { 2 }"})
+
+    def test_rows_are_scoped_by_prompt_version(self):
+        store = TranslationStore(prompt_version="old")
+        store.add("int a(void) { return 1; }", "fn a() -> i32 { 1 }")
+        store.flush()
+        self.assertEqual(TranslationStore().lookup({"a": ("int a(void) { return 1; }", None)}), {})
+
+    def test_concurrent_jobs_storing_the_same_segment(self):
+        for _ in range(2):
+            store = TranslationStore()
+            store.add("int a(void) { return 1; }", "fn a() -> i32 { 1 }")
+            store.flush()
+        self.assertEqual(
+            SegmentTranslation.objects.filter(model_name=MODEL_NAME, prompt_version=PROMPT_VERSION).count(), 1
+        )
+
+
+class FakeRedisMixin:
+    """Points the job store's sync and async clients at one in-memory Redis server."""
+
+    def setUp(self):
+        super().setUp()
+        server = fakeredis.FakeServer()
+        self.redis = fakeredis.FakeRedis(server=server, decode_responses=True)
+        patchers = [
+            mock.patch.object(jobs, "get_redis", return_value=self.redis),
+            mock.patch.object(
+                jobs, "get_async_redis",
+                side_effect=lambda decode_responses=True: fakeredis.FakeAsyncRedis(
+                    server=server, decode_responses=decode_responses
+                ),
+            ),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class CompleteJobTests(FakeRedisMixin, WorkspaceTestCase):
+    segments = {
+        "one": "fn one() -> i32 { 1 }",
+        "two": 'fn two() -> String { format!("é€{}", one()) }',
+        "empty": "",
+    }
+
+    def complete(self):
+        output_path = os.path.join(self.workspace.path, "output.rs")
+        index = write_rust_output(self.segments, ["two", "one", "empty"], output_path)
+        jobs.complete_job("job-1", output_path, index)
+        with open(output_path, "r", encoding="utf-8") as f:
+            return output_path, f.read()
+
+    def test_segment_offsets_match_the_file_and_getrange(self):
+        output_path, _ = self.complete()
+
+        async def segments():
+            client = jobs.get_async_redis()
+            try:
+                return {name: await jobs.aget_segment(client, "job-1", name) for name in self.segments}
+            finally:
+                await client.aclose()
+
+        stored = asyncio.run(segments())
+        for name, code in self.segments.items():
+            self.assertEqual(read_segment(output_path, name), code or None)
+            self.assertEqual(stored[name], code or None)
+
+    def test_result_is_streamed_in_chunks(self):
+        _, merged = self.complete()
+
+        async def read(chunk_bytes):
+            return [text async for text in jobs.aiter_result("job-1", chunk_bytes=chunk_bytes)]
+
+        # Chunks of 3 bytes cut through the two- and three-byte characters
+        chunks = asyncio.run(read(3))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunks), merged)
+        self.assertEqual(asyncio.run(read(1024 * 1024)), [merged])
+
+    def test_small_results_travel_in_the_result_event(self):
+        _, merged = self.complete()
+        events = [jobs.decode_event(*entry) for entry in self.redis.xrange(jobs.EVENTS_KEY.format(job_id="job-1"))]
+        self.assertEqual([event["type"] for event in events], ["result", "done"])
+        self.assertEqual(events[0]["data"]["rust_code"], merged)
+        # Segments left without code are not part of the output
+        self.assertEqual(events[0]["data"]["segments"], ["two", "one"])
+
+    @override_settings(PIPELINE_INLINE_MAX_BYTES=8)
+    def test_large_results_are_left_out_of_the_result_event(self):
+        self.complete()
+        result = jobs.decode_event(*self.redis.xrange(jobs.EVENTS_KEY.format(job_id="job-1"))[0])
+        self.assertNotIn("rust_code", result["data"])
+
+
+class JobViewTests(FakeRedisMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pw")
+        self.headers = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+        self.other_headers = {
+            "Authorization": f"Bearer {AccessToken.for_user(User.objects.create_user(username='bob', password='pw'))}"
+        }
+        jobs.create_job("job-1", self.user.id)
+
+    async def test_result_is_streamed_as_json(self):
+        rust_code = 'fn main() { println!("é \\ \\"quoted\\""); }\n'
+        self.redis.append(jobs.RESULT_KEY.format(job_id="job-1"), rust_code.encode("utf-8"))
+        self.redis.hset(jobs.JOB_KEY.format(job_id="job-1"), "status", "done")
+
+        response = await self.async_client.get("/transpiler/jobs/job-1/result/", headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        body = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(json.loads(body), {"job_id": "job-1", "rust_code": rust_code})
+
+    async def test_result_of_an_unfinished_or_expired_job(self):
+        response = await self.async_client.get("/transpiler/jobs/job-1/result/", headers=self.headers)
+        self.assertEqual(response.status_code, 202)
+
+        self.redis.hset(jobs.JOB_KEY.format(job_id="job-1"), "status", "done")
+        response = await self.async_client.get("/transpiler/jobs/job-1/result/", headers=self.headers)
+        self.assertEqual(response.status_code, 410)
+
+    async def get(self, path, headers=None, **params):
+        return await self.async_client.get(f"/transpiler/jobs/job-1/{path}", params, headers=self.headers if headers is None else headers)
+
+    async def test_status_returns_the_job_and_its_events(self):
+        jobs.update_job("job-1", "translate", done=1, total=2)
+        response = await self.get("")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data["job"]["status"], data["job"]["stage"]), ("running", "translate"))
+        self.assertEqual([event["data"].get("status") for event in data["events"]], ["queued", "running"])
+
+        resumed = (await self.get("", since=data["events"][0]["id"])).json()
+        self.assertEqual([event["id"] for event in resumed["events"]], [data["last_event_id"]])
+        self.assertEqual(resumed["last_event_id"], data["last_event_id"])
+
+    async def test_status_rejects_malformed_event_ids(self):
+        for since in ("abc", "1-", "-1", "1-2-3"):
+            self.assertEqual((await self.get("", since=since)).status_code, 400, since)
+        self.assertEqual((await self.get("events/", since="abc")).status_code, 400)
+
+    async def test_long_poll_returns_when_an_event_arrives(self):
+        last_id = (await self.get("")).json()["last_event_id"]
+
+        async def publish_later():
+            await asyncio.sleep(0.2)
+            await asyncio.to_thread(jobs.update_job, "job-1", "parse")
+
+        started = time.monotonic()
+        publisher = asyncio.create_task(publish_later())
+        response = await self.get("", since=last_id, wait=5)
+        await publisher
+        self.assertLess(time.monotonic() - started, 4)
+        self.assertEqual([event["data"]["stage"] for event in response.json()["events"]], ["parse"])
+
+    async def test_long_poll_on_a_finished_job_does_not_wait(self):
+        await asyncio.to_thread(jobs.fail_job, "job-1", "boom")
+        last_id = (await self.get("")).json()["last_event_id"]
+        started = time.monotonic()
+        response = await self.get("", since=last_id, wait=5)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(response.json()["events"], [])
+
+    async def test_event_stream_ends_with_the_terminal_event(self):
+        jobs.publish_segment("job-1", "main", "fn main() {}")
+        jobs.fail_job("job-1", "boom")
+        response = await self.get("events/")
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        body = b"".join([chunk async for chunk in response.streaming_content]).decode()
+        events = [block for block in body.split("\n\n") if block]
+        self.assertEqual([block.split("\n")[1] for block in events], ["event: status", "event: segment", "event: failed"])
+
+        # A reconnecting client resumes after the last event it saw
+        last_seen = events[1].split("\n")[0][len("id: "):]
+        response = await self.get("events/", headers={**self.headers, "Last-Event-ID": last_seen})
+        body = b"".join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(body.count("event: "), 1)
+        self.assertIn("event: failed", body)
+
+    async def test_event_stream_accepts_a_query_token(self):
+        jobs.fail_job("job-1", "boom")
+        token = self.headers["Authorization"][len("Bearer "):]
+        self.assertEqual((await self.get("events/", headers={}, token=token)).status_code, 200)
+        # Other endpoints do not, so the token stays out of their access logs
+        self.assertEqual((await self.get("", headers={}, token=token)).status_code, 401)
+
+    async def test_jobs_of_other_users_are_not_found(self):
+        for path in ("", "events/", "result/", "segments/main/"):
+            self.assertEqual((await self.get(path, headers=self.other_headers)).status_code, 404, path)
+        self.assertEqual((await self.get("", headers={})).status_code, 401)
+
+    async def test_segments_are_served_from_the_stored_result(self):
+        self.assertEqual((await self.get("segments/main/")).status_code, 202)
+
+        output_path = os.path.join(tempfile.mkdtemp(prefix="salvage-test-"), "output.rs")
+        self.addCleanup(shutil.rmtree, os.path.dirname(output_path), ignore_errors=True)
+        segments = {"main": "fn main() { helper(); }", "helper": "fn helper() {}"}
+        index = write_rust_output(segments, ["main", "helper"], output_path)
+        await asyncio.to_thread(jobs.complete_job, "job-1", output_path, index)
+
+        response = await self.get("segments/helper/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["rust_code"], "fn helper() {}")
+        self.assertEqual((await self.get("segments/missing/")).status_code, 404)
 
-# Create your tests here.
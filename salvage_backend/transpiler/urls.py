@@ -1,17 +1,28 @@
+from django.conf import settings
 from django.urls import path
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
 from .services.translator.translator import Transpiler
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from services.transpiler_workflow import run_transpilation_workflow
-from celery.result import AsyncResult
+from services.transpiler_workflow import submit_transpilation_job
+from api.views import owned_file_id
+from .job_views import job_status, job_events, job_result, job_segment
+from .services import telemetry
 
 @api_view(['POST'])
 def transpile_code(request):
     input_code = request.data.get('code', '')
-    # Start the Celery workflow
-    result = run_transpilation_workflow(input_code)
-    # Return the task ID to the client
-    return Response({'task_id': result.id})
+    if not input_code or not isinstance(input_code, str):
+        return Response({'error': 'No input code provided'}, status=400)
+    # Re-running a saved file only re-translates the segments that changed
+    file_id, error = owned_file_id(request, request.data.get('file_id'))
+    if error:
+        return error
+    # Start the Celery workflow in a fresh job workspace
+    job_id, result = submit_transpilation_job(input_code, request.user.id, file_id=file_id)
+    # Return the IDs to the client; progress is read from the job endpoints
+    return Response({'task_id': result.id, 'job_id': job_id}, status=202)
 
 # def transpile_code(request):
 #     c_code = request.data.get('code', '')
@@ -19,17 +30,27 @@ def transpile_code(request):
 #     rust_code = transpiler.transpile(c_code)
 #     return Response({'rust_code': rust_code})
 
-@api_view(['GET'])
-def get_task_status(request, task_id):
-    result = AsyncResult(task_id)
-    response_data = {
-        'task_id': task_id,
-        'status': result.status,
-        'result': result.result if result.ready() else None
-    }
-    return Response(response_data)
+def metrics(request):
+    """
+    Prometheus scrape endpoint for the pipeline histograms. The scraper authenticates
+    with `Authorization: Bearer <METRICS_TOKEN>`; without a configured token the
+    endpoint is disabled.
+    """
+    header = request.headers.get("Authorization", "")
+    token = header[len("Bearer "):] if header.startswith("Bearer ") else ""
+    if not settings.METRICS_TOKEN or not constant_time_compare(token, settings.METRICS_TOKEN):
+        return HttpResponse("Forbidden\n", status=403, content_type="text/plain")
+    rendered = telemetry.render_metrics()
+    if rendered is None:
+        return HttpResponse("prometheus_client is not installed\n", status=501, content_type="text/plain")
+    body, content_type = rendered
+    return HttpResponse(body, content_type=content_type)
 
 urlpatterns = [
     path('transpile/', transpile_code, name='transpile'),
-    # path('task-status/<str:task_id>/', get_task_status, name='task_status'),
+    path('jobs/<str:job_id>/', job_status, name='job_status'),
+    path('jobs/<str:job_id>/events/', job_events, name='job_events'),
+    path('jobs/<str:job_id>/result/', job_result, name='job_result'),
+    path('jobs/<str:job_id>/segments/<str:segment>/', job_segment, name='job_segment'),
+    path('metrics/', metrics, name='metrics'),
 ]